@@ -0,0 +1,78 @@
+"""
+Prompt history size and recall: summary mode vs retrieval over past turns
+
+    PYTHONPATH=src python -m evals.conversation_memory_benchmark
+"""
+
+import argparse
+import time
+
+from evals.test_data import compaction_conversations
+from evals.summarizer_benchmark import compact
+from controller.context_packer import count_tokens
+from controller.conversation_memory import ConversationMemory
+from controller.messages import Message
+from controller.summarizers import create_summarizer
+
+
+def history_text(messages: list[dict]) -> str:
+    return "\n".join(f"{m['role'].capitalize()}: {m['content']}" for m in messages)
+
+
+def summary_history(messages: list[dict], max_tokens: int) -> str:
+    history, _ = compact(messages, create_summarizer("extractive"), max_tokens)
+    return history_text(history)
+
+
+def retrieval_history(messages: list[dict], query: str, token_budget: int) -> tuple[str, float]:
+    memory = ConversationMemory(token_budget=token_budget)
+    for message in messages:
+        memory.add(Message(message["role"], message["content"], count_tokens(message["content"])))
+    start = time.perf_counter()
+    selected = memory.select(query)
+    return history_text(selected), (time.perf_counter() - start) * 1_000_000
+
+
+def run_benchmark(max_tokens: int, token_budget: int) -> dict:
+    session = [message for conversation in compaction_conversations for message in conversation["messages"]]
+    summary_tokens, retrieval_tokens, select_latencies = [], [], []
+    for end in range(1, len(session) + 1):
+        summary_tokens.append(count_tokens(summary_history(session[:end], max_tokens)))
+        text, latency = retrieval_history(session[:end], session[end - 1]["content"], token_budget)
+        retrieval_tokens.append(count_tokens(text))
+        select_latencies.append(latency)
+
+    summary_found, retrieval_found, questions = 0, 0, 0
+    for conversation in compaction_conversations:
+        compacted = summary_history(conversation["messages"], max_tokens).lower()
+        for question in conversation["questions"]:
+            questions += 1
+            expected = question["expected"].lower()
+            summary_found += expected in compacted
+            retrieved, _ = retrieval_history(conversation["messages"], question["question"], token_budget)
+            retrieval_found += expected in retrieved.lower()
+
+    select_latencies.sort()
+    results = {
+        "summary": {"max_tokens": max(summary_tokens), "final_tokens": summary_tokens[-1], "recall": summary_found / questions},
+        "retrieval": {"max_tokens": max(retrieval_tokens), "final_tokens": retrieval_tokens[-1], "recall": retrieval_found / questions,
+                      "select_p50_us": select_latencies[len(select_latencies) // 2]},
+    }
+
+    print(f"\n=== CONVERSATION HISTORY IN PROMPTS ({len(session)} messages, {questions} questions) ===")
+    for name, result in results.items():
+        print(f"{name:<10} max {result['max_tokens']:5d} tokens  final {result['final_tokens']:5d} tokens  answer recall {result['recall']:.2f}")
+    print(f"retrieval select p50 {results['retrieval']['select_p50_us']:.1f}us")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare summary and retrieval conversation memory")
+    parser.add_argument("--max-tokens", type=int, default=300, help="Summary mode history limit (manage_token_limit's default)")
+    parser.add_argument("--token-budget", type=int, default=300, help="Retrieval mode history budget")
+    args = parser.parse_args()
+    run_benchmark(args.max_tokens, args.token_budget)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Entity extractor throughput and key-fact recall: domain gazetteer vs BERT-large NER
+
+    PYTHONPATH=src python -m evals.entity_benchmark --extractors domain bert both
+"""
+
+import argparse
+import importlib.util
+import time
+
+from evals.test_data import compaction_conversations, discovery_scripts
+from controller.entity_extractor import create_entity_extractor
+
+
+def messages() -> list[str]:
+    texts = [message["content"] for conversation in compaction_conversations for message in conversation["messages"]]
+    texts += [turn["user"] for script in discovery_scripts for turn in script["turns"]]
+    return texts
+
+
+def measure_throughput(extractor, texts: list[str], repeats: int) -> dict:
+    latencies = []
+    for _ in range(repeats):
+        for text in texts:
+            start = time.perf_counter()
+            extractor.extract(text)
+            latencies.append((time.perf_counter() - start) * 1_000_000)
+    latencies.sort()
+    chars = sum(len(text) for text in texts) * repeats
+    return {
+        "p50_us": latencies[len(latencies) // 2],
+        "p99_us": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "chars_per_s": chars / (sum(latencies) / 1_000_000),
+    }
+
+
+def measure_recall(extractor) -> dict:
+    facts_found, facts_total = 0, 0
+    for conversation in compaction_conversations:
+        entities = [entity for message in conversation["messages"] for entity in extractor.extract(message["content"])]
+        found = " | ".join(f"{entity['text']} {entity.get('value', '')}" for entity in entities).lower()
+        facts_found += sum(1 for fact in conversation["facts"] if fact.lower() in found)
+        facts_total += len(conversation["facts"])
+
+    slots_found, slots_total = 0, 0
+    for script in discovery_scripts:
+        entities = [entity for turn in script["turns"] for entity in extractor.extract(turn["user"])]
+        values = {str(entity.get("value", entity["text"])).lower() for entity in entities}
+        for slot in ("business_size", "location"):
+            # Scripts where the user never gives the slot have nothing to recall
+            if script["expected"][slot] is None:
+                continue
+            slots_total += 1
+            if str(script["expected"][slot]).lower() in values:
+                slots_found += 1
+
+    return {"fact_recall": facts_found / facts_total, "slot_recall": slots_found / slots_total}
+
+
+def run_benchmark(extractor_names: list[str], repeats: int) -> dict:
+    texts = messages()
+    results = {}
+    for name in extractor_names:
+        if name in ("bert", "both") and importlib.util.find_spec("transformers") is None:
+            print(f"Skipping {name}: transformers is not installed")
+            continue
+        extractor = create_entity_extractor(name, gazetteer_path="src/models/insurance_models.py")
+        # BERT-large on CPU is orders of magnitude slower, one pass is enough to compare
+        results[name] = {**measure_throughput(extractor, texts, repeats if name == "domain" else 1), **measure_recall(extractor)}
+
+    print(f"\n=== ENTITY EXTRACTION ({len(texts)} messages) ===")
+    for name, result in results.items():
+        print(f"{name:<8} p50 {result['p50_us']:10.1f}us  p99 {result['p99_us']:10.1f}us  {result['chars_per_s']:12,.0f} chars/s  "
+              f"fact recall {result['fact_recall']:.2f}  slot recall {result['slot_recall']:.2f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare entity extractors on recorded conversations")
+    parser.add_argument("--extractors", nargs="+", default=["domain", "bert"], choices=["domain", "bert", "both"])
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+    run_benchmark(args.extractors, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
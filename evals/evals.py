@@ -1,4 +1,11 @@
-from deepeval.test_case import Turn
+import asyncio
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from deepeval.test_case import Turn, ConversationalTestCase
 from deepeval.simulator import ConversationSimulator
 from deepeval.dataset import ConversationalGolden
 from deepeval import evaluate
@@ -6,6 +13,9 @@ from deepeval.metrics import ConversationalGEval
 from evals.test_data import *
 from controller.insurance_agent import plan_discovery_node, SessionState
 
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", "8"))
+SIMULATION_CACHE_DIR = Path(os.getenv("SIMULATION_CACHE_DIR", "evals/simulation_cache"))
+
 
 # PLAN DISCOVERY TESTING PIPELINE
 def simulate_profile_building_goldens():
@@ -14,7 +24,7 @@ def simulate_profile_building_goldens():
     Each golden uses the same scenario and profile_eo but different user profiles.
     """
     goldens = []
-    
+
     # Loop through each user profile and create a golden
     for user_profile in profile_users:
         golden = ConversationalGolden(
@@ -23,62 +33,204 @@ def simulate_profile_building_goldens():
             user_description=user_profile
         )
         goldens.append(golden)
-    
+
     return goldens
 
-# Define callback function for plan discovery
-async def plan_discovery_callback(input):
-    session = SessionState()
-    response = plan_discovery_node(input, session)
-    return Turn(role="assistant", content=response)
+
+def golden_key(scenario: str, expected_outcome: str, user_description: str) -> str:
+    return hashlib.sha256(f"{scenario}\n{expected_outcome}\n{user_description}".encode()).hexdigest()[:16]
+
+
+class ConversationRunner:
+    """
+    Runs simulated conversations against a chat node.
+    Each conversation keeps its own SessionState for all of its turns, conversations run concurrently
+    on a bounded worker pool, and every assistant turn records its latency and token usage.
+    Simulated user turns are cached per golden, so later runs replay the same user side against the
+    current code without calling the simulator model.
+    """
+
+    def __init__(self, node=plan_discovery_node, name: str = "plan_discovery", workers: int = EVAL_WORKERS,
+                 cache_dir: Path = SIMULATION_CACHE_DIR):
+        self.node = node
+        self.workers = workers
+        self.cache_path = Path(cache_dir) / f"{name}.json"
+        self.sessions: dict[str, SessionState] = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eval-conversation")
+
+    def load_cache(self) -> dict:
+        if not self.cache_path.exists():
+            return {}
+        with open(self.cache_path) as f:
+            return json.load(f)
+
+    def save_cache(self, cache: dict):
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_path, "w") as f:
+            json.dump(cache, f, indent=2)
+
+    def run_turn(self, user_input: str, session: SessionState) -> Turn:
+        start = time.perf_counter()
+        response = self.node(user_input, session)
+        latency_ms = (time.perf_counter() - start) * 1000
+        usage = session.last_usage or {}
+        return Turn(role="assistant", content=response, additional_metadata={
+            "latency_ms": latency_ms,
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "model_call": bool(usage)
+        })
+
+    async def callback(self, input: str, turns: list[Turn], thread_id: str) -> Turn:
+        """ConversationSimulator callback: one session per simulated conversation"""
+        session = self.sessions.setdefault(thread_id, SessionState())
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.run_turn, input, session)
+
+    async def replay(self, golden: ConversationalGolden, user_turns: list[str], semaphore: asyncio.Semaphore) -> ConversationalTestCase:
+        """Replay cached user turns in order through a fresh session"""
+        async with semaphore:
+            session = SessionState()
+            loop = asyncio.get_running_loop()
+            turns = []
+            for user_input in user_turns:
+                turns.append(Turn(role="user", content=user_input))
+                turns.append(await loop.run_in_executor(self.executor, self.run_turn, user_input, session))
+        return ConversationalTestCase(
+            turns=turns,
+            scenario=golden.scenario,
+            expected_outcome=golden.expected_outcome,
+            user_description=golden.user_description
+        )
+
+    async def replay_all(self, pending: list[tuple[ConversationalGolden, list[str]]]) -> list[ConversationalTestCase]:
+        semaphore = asyncio.Semaphore(self.workers)
+        return await asyncio.gather(*[self.replay(golden, user_turns, semaphore) for golden, user_turns in pending])
+
+    def simulate(self, goldens: list[ConversationalGolden], max_user_simulations: int = 10, use_cache: bool = True) -> list[ConversationalTestCase]:
+        """Test cases in golden order: cached goldens are replayed, the rest are simulated and cached"""
+        cache = self.load_cache() if use_cache else {}
+        keys = [golden_key(g.scenario, g.expected_outcome, g.user_description) for g in goldens]
+
+        cached = [(i, golden, cache[key]) for i, (golden, key) in enumerate(zip(goldens, keys)) if key in cache]
+        uncached = [(i, golden) for i, (golden, key) in enumerate(zip(goldens, keys)) if key not in cache]
+        print(f"Replaying {len(cached)} cached conversations, simulating {len(uncached)}")
+
+        test_cases: list[ConversationalTestCase | None] = [None] * len(goldens)
+        if cached:
+            replayed = asyncio.run(self.replay_all([(golden, user_turns) for _, golden, user_turns in cached]))
+            for (i, _, _), test_case in zip(cached, replayed):
+                test_cases[i] = test_case
+
+        if uncached:
+            simulator = ConversationSimulator(model_callback=self.callback, max_concurrent=self.workers)
+            simulated = simulator.simulate(
+                conversational_goldens=[golden for _, golden in uncached],
+                max_user_simulations=max_user_simulations
+            )
+            # Simulated conversations may finish in any order
+            by_golden = {golden_key(tc.scenario, tc.expected_outcome, tc.user_description): tc for tc in simulated}
+            for i, golden in uncached:
+                test_case = by_golden.get(keys[i])
+                if test_case is None:
+                    print(f"No simulated conversation for golden {i}")
+                    continue
+                test_cases[i] = test_case
+                cache[keys[i]] = [turn.content for turn in test_case.turns if turn.role == "user"]
+            self.save_cache(cache)
+
+        return [test_case for test_case in test_cases if test_case is not None]
+
+
+def turn_stats(test_case: ConversationalTestCase) -> dict:
+    """Latency and token usage over a conversation's assistant turns"""
+    metadata = [turn.additional_metadata or {} for turn in test_case.turns if turn.role == "assistant"]
+    latencies = sorted(m.get("latency_ms", 0.0) for m in metadata)
+    return {
+        "turns": len(metadata),
+        "model_calls": sum(1 for m in metadata if m.get("model_call")),
+        "p50_latency_ms": latencies[len(latencies) // 2] if latencies else 0.0,
+        "max_latency_ms": latencies[-1] if latencies else 0.0,
+        "total_latency_ms": sum(latencies),
+        "input_tokens": sum(m.get("input_tokens", 0) for m in metadata),
+        "output_tokens": sum(m.get("output_tokens", 0) for m in metadata),
+    }
+
+
+def build_report(test_cases: list[ConversationalTestCase], evaluation_result) -> list[dict]:
+    """One row per conversation with its GEval scores next to its latency and token usage"""
+    scores = {}
+    for position, test_result in enumerate(evaluation_result.test_results):
+        index = test_result.index if test_result.index is not None else position
+        scores[index] = {metric.name: metric.score for metric in (test_result.metrics_data or [])}
+
+    report = []
+    for index, test_case in enumerate(test_cases):
+        report.append({
+            "user_description": test_case.user_description,
+            "scores": scores.get(index, {}),
+            **turn_stats(test_case)
+        })
+
+    print("\n=== PLAN DISCOVERY EVAL REPORT ===")
+    for row in report:
+        score_text = ", ".join(f"{name}: {score:.2f}" for name, score in row["scores"].items() if score is not None)
+        print(f"- {row['user_description'][:70]}")
+        print(f"    {score_text}")
+        print(f"    {row['turns']} turns, {row['model_calls']} model calls, p50 {row['p50_latency_ms']:.0f}ms, "
+              f"max {row['max_latency_ms']:.0f}ms, {row['input_tokens']} in / {row['output_tokens']} out tokens")
+    return report
 
 
 # Generate plan discovery test cases
-def gen_plan_discovery_test_cases():
-    plan_discovery_simulator = ConversationSimulator(model_callback=plan_discovery_callback)
+def gen_plan_discovery_test_cases(use_cache: bool = True):
+    runner = ConversationRunner()
     plan_discovery_goldens = simulate_profile_building_goldens()
-    return plan_discovery_simulator.simulate(conversational_goldens=plan_discovery_goldens)
+    return runner.simulate(plan_discovery_goldens, use_cache=use_cache)
 
 # Evaluate plan discovery conversations
-def evaluate_plan_discovery():
+def evaluate_plan_discovery(use_cache: bool = True):
     """
     Evaluates plan discovery test cases using ConversationalGEval metrics
     """
     # Generate test cases
-    test_cases = gen_plan_discovery_test_cases()
-    
+    start = time.perf_counter()
+    test_cases = gen_plan_discovery_test_cases(use_cache)
+    print(f"Generated {len(test_cases)} conversations in {time.perf_counter() - start:.1f}s")
+
     # Define evaluation metrics
     information_extraction_metric = ConversationalGEval(
         name="Information Extraction",
         criteria="Determine whether the assistant accurately captures business size, location, and coverage preference from the user's responses. The assistant should correctly identify and record these three key pieces of information."
     )
-    
+
     conversational_style_metric = ConversationalGEval(
-        name="Conversational Style", 
+        name="Conversational Style",
         criteria="Evaluate whether the assistant uses natural, friendly questioning without revealing rigid data categories. The conversation should feel organic and not like a form-filling exercise."
     )
-    
+
     completeness_metric = ConversationalGEval(
         name="Completeness",
         criteria="Assess whether the assistant successfully collects all required profile data (business size, location, coverage preference) before declaring the information gathering phase is complete."
     )
-    
+
     flow_management_metric = ConversationalGEval(
         name="Flow Management",
         criteria="Evaluate whether the assistant asks one question at a time with logical progression. The conversation should flow naturally from one topic to the next without overwhelming the user."
     )
-    
+
     metrics = [
         information_extraction_metric,
-        conversational_style_metric, 
+        conversational_style_metric,
         completeness_metric,
         flow_management_metric
     ]
-    
+
     # Run evaluation
-    evaluate(test_cases=test_cases, metrics=metrics)
-    
-    return test_cases, metrics
+    evaluation_result = evaluate(test_cases=test_cases, metrics=metrics)
+    report = build_report(test_cases, evaluation_result)
+
+    return test_cases, metrics, report
 
 
 if __name__ == "__main__":
@@ -0,0 +1,92 @@
+import time
+import tiktoken
+from data_processing.generate_insurance_plans import (
+    generate_page_metadata,
+    generate_document_summary,
+    generate_page_extraction,
+    model_registry,
+    plan_links
+)
+import data_processing.smart_scraper as smart_scraper
+
+
+# A/B HARNESS: TWO-CALL VS SINGLE-CALL PLAN EXTRACTION
+tokenizer = tiktoken.get_encoding("o200k_base")
+
+
+def field_agreement(a: dict, b: dict) -> dict:
+    """Per-field agreement, list fields are compared as sets"""
+    agreement = {}
+    for field in a.keys() | b.keys():
+        left, right = a.get(field), b.get(field)
+        if isinstance(left, list) and isinstance(right, list):
+            agreement[field] = set(left) == set(right)
+        else:
+            agreement[field] = left == right
+    return agreement
+
+
+def run_extraction_ab(urls: list[str] = plan_links, limit: int | None = None):
+    """
+    Runs both extraction paths on the same scraped pages without uploading anything.
+    Reports metadata field agreement, summary lengths, wall time and input tokens per page.
+    """
+    models = model_registry.get()
+    pages = smart_scraper.scrape_and_store_if_not_exists(urls)[:limit]
+
+    with open("prompts/metadata.txt") as f:
+        metadata_prompt = f.read()
+    with open("prompts/plan_summary.txt") as f:
+        summary_prompt = f.read()
+    with open("prompts/plan_extraction.txt") as f:
+        extraction_prompt = f.read()
+
+    field_matches = {}
+    totals = {"separate_s": 0.0, "combined_s": 0.0, "separate_tokens": 0, "combined_tokens": 0}
+
+    for doc in pages:
+        url = doc.metadata.get("source", "")
+        content_tokens = len(tokenizer.encode(doc.page_content))
+
+        start = time.perf_counter()
+        separate_metadata = generate_page_metadata(doc.page_content, url, models)
+        separate_summary = generate_document_summary(doc.page_content, separate_metadata.get("Plan Type", "Unknown Plan"))
+        separate_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        combined_metadata, combined_summary = generate_page_extraction(doc.page_content, url, models)
+        combined_s = time.perf_counter() - start
+
+        separate_tokens = 2 * content_tokens + len(tokenizer.encode(metadata_prompt)) + len(tokenizer.encode(summary_prompt))
+        combined_tokens = content_tokens + len(tokenizer.encode(extraction_prompt))
+
+        totals["separate_s"] += separate_s
+        totals["combined_s"] += combined_s
+        totals["separate_tokens"] += separate_tokens
+        totals["combined_tokens"] += combined_tokens
+
+        agreement = field_agreement(separate_metadata, combined_metadata)
+        for field, matched in agreement.items():
+            field_matches.setdefault(field, []).append(matched)
+
+        print(f"\n{url}")
+        print(f"  separate: {separate_s:.1f}s, ~{separate_tokens} input tokens, summary {len(separate_summary)} chars")
+        print(f"  combined: {combined_s:.1f}s, ~{combined_tokens} input tokens, summary {len(combined_summary or '')} chars")
+        print(f"  fields agreeing: {sum(agreement.values())}/{len(agreement)}")
+        for field, matched in agreement.items():
+            if not matched:
+                print(f"    {field}: {separate_metadata.get(field)!r} vs {combined_metadata.get(field)!r}")
+
+    print("\n=== EXTRACTION A/B SUMMARY ===")
+    print(f"Pages: {len(pages)}")
+    for key, value in totals.items():
+        print(f"{key}: {value:.1f}" if isinstance(value, float) else f"{key}: {value}")
+    print("Field agreement:")
+    for field, matches in sorted(field_matches.items()):
+        print(f"  {field}: {sum(matches) / len(matches):.0%}")
+
+    return totals, field_matches
+
+
+if __name__ == "__main__":
+    run_extraction_ab()
@@ -0,0 +1,297 @@
+"""Local stand-ins for the OpenAI Responses and Pinecone record APIs, with seeded latency and simulated prefix caching"""
+
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MODEL_PROFILES = {
+    "default": {"latency_ms": 300, "latency_sigma": 0.35, "output_tokens": 120, "output_sigma": 0.4},
+    "gpt-4.1": {"latency_ms": 900, "latency_sigma": 0.35, "output_tokens": 250, "output_sigma": 0.4},
+    "gpt-4o-mini": {"latency_ms": 450, "latency_sigma": 0.3, "output_tokens": 120, "output_sigma": 0.4},
+    "o4-mini": {"latency_ms": 2500, "latency_sigma": 0.4, "output_tokens": 400, "output_sigma": 0.4},
+    "pinecone-search": {"latency_ms": 60, "latency_sigma": 0.3},
+    "pinecone-upsert": {"latency_ms": 80, "latency_sigma": 0.3},
+}
+
+FILLER_WORDS = ("plan coverage network employer deductible provider benefit premium member care "
+                "claims pharmacy wellness referral option").split()
+
+
+class LatencyModel:
+    """Samples per-request latency and output length, scaled so CI runs stay short"""
+
+    def __init__(self, profiles: dict | None = None, latency_scale: float = 1.0, seed: int = 0):
+        self.profiles = {**DEFAULT_MODEL_PROFILES, **(profiles or {})}
+        self.latency_scale = latency_scale
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def profile(self, name: str) -> dict:
+        return {**self.profiles["default"], **self.profiles.get(name, {})}
+
+    def _lognormal(self, median: float, sigma: float) -> float:
+        with self.lock:
+            return self.random.lognormvariate(math.log(max(median, 1e-9)), sigma)
+
+    def latency(self, name: str) -> float:
+        profile = self.profile(name)
+        return self._lognormal(profile["latency_ms"], profile["latency_sigma"]) / 1000 * self.latency_scale
+
+    def output_tokens(self, name: str) -> int:
+        profile = self.profile(name)
+        return max(1, int(self._lognormal(profile["output_tokens"], profile["output_sigma"])))
+
+
+def filler_text(tokens: int) -> str:
+    """Roughly `tokens` tokens of plausible words"""
+    words = max(1, int(tokens * 0.75))
+    return " ".join(FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(words))
+
+
+def instance_from_schema(schema: dict, root: dict, text_tokens: int):
+    """Smallest valid value for a JSON schema, with free-text strings sized to text_tokens"""
+    if "$ref" in schema:
+        name = schema["$ref"].split("/")[-1]
+        return instance_from_schema(root.get("$defs", {})[name], root, text_tokens)
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"] or schema["anyOf"]
+        return instance_from_schema(options[0], root, text_tokens)
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "const" in schema:
+        return schema["const"]
+
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != "null"), "null")
+    if kind == "object":
+        return {name: instance_from_schema(prop, root, text_tokens) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [instance_from_schema(schema.get("items", {}), root, text_tokens)]
+    if kind == "integer":
+        return 1
+    if kind == "number":
+        return 1.0
+    if kind == "boolean":
+        return False
+    if kind == "null":
+        return None
+    return filler_text(text_tokens)
+
+
+class _Server:
+    """Runs a ThreadingHTTPServer on a free localhost port in a daemon thread"""
+
+    def __init__(self, handler_class):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+        self.httpd.fake = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.request_counts = Counter()
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _OpenAIHandler(_JSONHandler):
+    def do_POST(self):
+        fake: FakeOpenAIServer = self.server.fake
+        if not self.path.rstrip("/").endswith("/responses"):
+            self.send_json({"error": {"message": f"Unsupported path {self.path}"}}, 404)
+            return
+        request = json.loads(self.read_body() or b"{}")
+        fake.request_counts[request.get("model", "unknown")] += 1
+        response = fake.respond(request)
+        time.sleep(fake.latency.latency(request.get("model", "default")))
+        self.send_json(response)
+
+
+class FakeOpenAIServer(_Server):
+    """
+    OpenAI-compatible Responses API. Point the SDK at it with OPENAI_BASE_URL=<url>/v1.
+    overrides maps a structured-output schema name to values merged into the generated document.
+    """
+
+    def __init__(self, latency: LatencyModel | None = None, overrides: dict | None = None,
+                 cache_block_tokens: int = 128, cache_min_tokens: int = 1024):
+        super().__init__(_OpenAIHandler)
+        self.latency = latency or LatencyModel()
+        self.overrides = overrides or {}
+        self.cache_block_tokens = cache_block_tokens
+        self.cache_min_tokens = cache_min_tokens
+        self.cached_prefixes: set[str] = set()
+        self.cache_lock = threading.Lock()
+
+    def cached_tokens(self, model: str, input_text: str) -> int:
+        """Tokens covered by the longest previously seen block-aligned prefix; remembers this request's prefixes"""
+        if len(input_text) // 4 < self.cache_min_tokens:
+            return 0
+        block_chars = self.cache_block_tokens * 4
+        digest = hashlib.sha256(model.encode())
+        cached_blocks, matching = 0, True
+        with self.cache_lock:
+            for start in range(0, len(input_text) - block_chars + 1, block_chars):
+                digest.update(input_text[start:start + block_chars].encode())
+                prefix = digest.hexdigest()
+                if matching and prefix in self.cached_prefixes:
+                    cached_blocks += 1
+                else:
+                    matching = False
+                    self.cached_prefixes.add(prefix)
+        cached = cached_blocks * self.cache_block_tokens
+        return cached if cached >= self.cache_min_tokens else 0
+
+    def respond(self, request: dict) -> dict:
+        model = request.get("model", "default")
+        output_tokens = self.latency.output_tokens(model)
+        input_text = json.dumps(request.get("input", ""))
+        input_tokens = max(1, len(input_text) // 4)
+        cached_tokens = self.cached_tokens(model, input_text)
+
+        text_format = (request.get("text") or {}).get("format") or {}
+        if text_format.get("type") == "json_schema":
+            schema = text_format.get("schema", {})
+            document = instance_from_schema(schema, schema, output_tokens)
+            document = {**document, **self.overrides.get(text_format.get("name"), {})}
+            text = json.dumps(document)
+        else:
+            text = filler_text(output_tokens)
+
+        return {
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "status": "completed",
+            "model": model,
+            "output": [{
+                "type": "message",
+                "id": f"msg_{uuid.uuid4().hex}",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": text, "annotations": []}]
+            }],
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": [],
+            "usage": {
+                "input_tokens": input_tokens,
+                "input_tokens_details": {"cached_tokens": cached_tokens},
+                "output_tokens": output_tokens,
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": input_tokens + output_tokens
+            }
+        }
+
+
+SEARCH_PATH = re.compile(r"/records/namespaces/([^/]+)/search$")
+UPSERT_PATH = re.compile(r"/records/namespaces/([^/]+)/upsert$")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class _PineconeHandler(_JSONHandler):
+    def do_POST(self):
+        fake: FakePineconeServer = self.server.fake
+        path = self.path.split("?")[0]
+        body = self.read_body()
+
+        match = UPSERT_PATH.search(path)
+        if match:
+            fake.request_counts["upsert"] += 1
+            records = [json.loads(line) for line in body.decode().splitlines() if line.strip()]
+            fake.upsert(match.group(1), records)
+            time.sleep(fake.latency.latency("pinecone-upsert"))
+            self.send_response(201)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        match = SEARCH_PATH.search(path)
+        if match:
+            fake.request_counts["search"] += 1
+            request = json.loads(body or b"{}")
+            hits = fake.search(match.group(1), request)
+            time.sleep(fake.latency.latency("pinecone-search"))
+            self.send_json({"result": {"hits": hits}, "usage": {"read_units": 1, "embed_total_tokens": 10}})
+            return
+
+        self.send_json({"error": {"message": f"Unsupported path {self.path}"}}, 404)
+
+
+class FakePineconeServer(_Server):
+    """Integrated inference index host. Point the app at it with PINECONE_INDEX_HOST=<url>."""
+
+    def __init__(self, latency: LatencyModel | None = None):
+        super().__init__(_PineconeHandler)
+        self.latency = latency or LatencyModel()
+        self.namespaces: dict[str, dict[str, dict]] = {}
+        self.lock = threading.Lock()
+
+    def upsert(self, namespace: str, records: list[dict]):
+        with self.lock:
+            store = self.namespaces.setdefault(namespace, {})
+            for record in records:
+                record_id = record.get("_id") or record.get("id")
+                store[record_id] = {key: value for key, value in record.items() if key not in ("_id", "id")}
+
+    def search(self, namespace: str, request: dict) -> list[dict]:
+        query = request.get("query", {})
+        top_k = (request.get("rerank") or {}).get("top_n") or query.get("top_k", 5)
+        terms = set(TOKEN_PATTERN.findall(query.get("inputs", {}).get("text", "").lower()))
+        fields = request.get("fields")
+
+        with self.lock:
+            records = list(self.namespaces.get(namespace, {}).items())
+
+        scored = []
+        for record_id, record in records:
+            tokens = TOKEN_PATTERN.findall(str(record.get("chunk_text", "")).lower())
+            overlap = sum(1 for token in tokens if token in terms)
+            scored.append((overlap / (len(tokens) + 1), record_id, record))
+        scored.sort(key=lambda item: item[0], reverse=True)
+
+        return [
+            {"_id": record_id, "_score": score,
+             "fields": {key: value for key, value in record.items() if fields is None or key in fields}}
+            for score, record_id, record in scored[:top_k]
+        ]
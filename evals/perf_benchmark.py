@@ -0,0 +1,362 @@
+"""
+Offline performance benchmarks against local service stand-ins. Only counters per call (model calls,
+Pinecone requests, router and fast path stats) and allocations are gated; latency is reported.
+
+    python -m evals.perf_benchmark [--update-baseline]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parents[1]
+BASELINE_PATH = ROOT / "evals" / "baselines" / "perf_baseline.json"
+
+# Absolute slack on top of the relative tolerance, so small benchmarks are not flaky
+LATENCY_SLACK_MS = 5.0
+ALLOCATION_SLACK_KB = 64.0
+
+RAG_QUERIES = [
+    "What is an HMO?",
+    "How is a PPO different from an HMO?",
+    "Does the LocalPlus plan cover out of network care?",
+    "Can I pair an HSA with a high deductible plan?",
+    "How do copays, deductibles and coinsurance work?",
+]
+
+PROFILES = [
+    {"business_size": 40, "location": "TX", "coverage_preference": "National"},
+    {"business_size": 250, "location": "MA", "coverage_preference": "Local"},
+    {"business_size": 1200, "location": "NJ", "coverage_preference": "National"},
+]
+
+
+def start_services(latency_scale: float, seed: int):
+    """Start the fake servers and point the app configuration at them; must run before app imports"""
+    from evals.fake_services import FakeOpenAIServer, FakePineconeServer, LatencyModel
+
+    with open(ROOT / "src" / "models" / "insurance_models.py") as f:
+        insurance_models = json.load(f)
+
+    overrides = {
+        "SmartQueries": {"clarify": False, "queryDB": True, "queries": ["HMO PPO network differences", "out of network coverage"]},
+        "PlanDiscoveryResponse": {
+            "plan_discovery_answers": {"business_size": 40, "location": "TX", "coverage_preference": "National"},
+            "response": "Thanks! I have everything I need and will move on to plan discovery."
+        },
+        "PlanAnalysis": {"required_fields": insurance_models["required_fields"], "key_differences": insurance_models["key_differences"]},
+    }
+    openai_server = FakeOpenAIServer(LatencyModel(latency_scale=latency_scale, seed=seed), overrides).start()
+    pinecone_server = FakePineconeServer(LatencyModel(latency_scale=latency_scale, seed=seed + 1)).start()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="perf-benchmark-"))
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{openai_server.url}/v1",
+        "PINECONE_API_KEY": "benchmark",
+        "PINECONE_INDEX_HOST": pinecone_server.url,
+        "NAMESPACE": "benchmark",
+        "RETRIEVAL_BACKEND": "pinecone",
+        "HYBRID_RETRIEVAL": "false",
+        # The BERT-large NER model would be downloaded on import and its cost measured in every turn
+        "ENTITY_EXTRACTOR": "domain",
+        "HTML_CACHE_DIR": str(work_dir / "html"),
+        "MODEL_CACHE_DIR": str(work_dir / "model_cache"),
+        "BATCH_DIR": str(work_dir / "batches"),
+        "MONGODB_URI": os.getenv("BENCH_MONGODB_URI", "mongodb://localhost:27017"),
+    })
+
+    patcher = None
+    if not os.getenv("BENCH_MONGODB_URI"):
+        import mongomock
+
+        # Every module creates its own MongoClient; they must share one in-memory server
+        shared_client = mongomock.MongoClient()
+        patcher = mock.patch("pymongo.mongo_client.MongoClient", lambda *args, **kwargs: shared_client)
+        patcher.start()
+
+    sys.path[:0] = [str(ROOT), str(ROOT / "src"), str(ROOT / "src" / "controller")]
+    # Prompts are read relative to src/
+    os.chdir(ROOT / "src")
+
+    return openai_server, pinecone_server, patcher, insurance_models
+
+
+def seed_data(insurance_models: dict, plan_links: list[str], pages: int):
+    """Plan documents, the insurance models definition, scraped pages and indexed chunks"""
+    from controller.insurance_agent import collection, retrieval_backend
+    from data_processing.generate_insurance_plans import models_collection
+    from data_processing.smart_scraper import scraped_collection
+
+    differences = {values[0]: values[1:] for values in insurance_models["key_differences"]}
+    words = "plan coverage network employer deductible provider benefit premium member care".split()
+
+    collection.delete_many({})
+    plans = []
+    for i, plan_type in enumerate(differences["Plan Type"]):
+        plan = {field: values[(i + j) % len(values)] for j, (field, values) in enumerate(differences.items())}
+        plan.update({
+            "Plan Type": plan_type,
+            "Business Size Eligibility": "All sizes",
+            "location_availability": ["All states"],
+            "summary": " ".join(words[(i + k) % len(words)] for k in range(150)),
+            "raw_text": " ".join(words[(i + k) % len(words)] for k in range(2000)),
+        })
+        plans.append(plan)
+    for coverage in ("National", "Local"):
+        collection.insert_many([{**plan, "Network Type": coverage} for plan in plans])
+
+    models_collection.delete_many({})
+    models_collection.insert_one({"model_type": "insurance_models", "version": 1, **insurance_models})
+
+    scraped_collection.delete_many({})
+    for url in plan_links[:pages]:
+        scraped_collection.insert_one({"url": url, "cleaned_content": " ".join(words * 300), "scraped_at": "2025-01-01"})
+
+    chunks = [
+        {"id": f"chunk-{i}", "chunk_text": f"{RAG_QUERIES[i % len(RAG_QUERIES)]} " + " ".join(words[i % len(words):] * 20),
+         "source": f"https://www.cigna.com/knowledge-center/page-{i}"}
+        for i in range(200)
+    ]
+    retrieval_backend.upsert(chunks)
+    return chunks
+
+
+def counter_snapshot(pinecone_server) -> dict:
+    """
+    Counters that only change with the code: logical model calls per node (hedged duplicates are not
+    counted), Pinecone requests and the agent's routing stats
+    """
+    from controller.insurance_agent import router_stats, discovery_stats, speculative_stats
+    from controller.llm_gateway import get_gateway_stats
+
+    counts = {f"model_calls.{node}": stats["calls"] for node, stats in get_gateway_stats()["nodes"].items()}
+    counts.update({f"pinecone.{operation}": count for operation, count in pinecone_server.request_counts.items()})
+    for prefix, counters in (("router", router_stats), ("discovery", discovery_stats), ("speculative", speculative_stats)):
+        counts.update({f"{prefix}.{name}": count for name, count in counters.snapshot().items()})
+    return counts
+
+
+def measure(name: str, call, iterations: int, concurrency: int, counters, warmup: int = 2) -> dict:
+    """Sequential latency percentiles and counters, concurrent throughput and traced allocations for one call"""
+    for i in range(warmup):
+        call(i)
+
+    # Counted over the sequential calls only; under concurrency single-flight coalescing depends on timing
+    before = counters()
+    latencies = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        call(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    after = counters()
+    per_call = {key: round((count - before.get(key, 0)) / iterations, 3) for key, count in after.items() if count != before.get(key, 0)}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(call, range(iterations)))
+    throughput = iterations / (time.perf_counter() - start)
+
+    # Allocations are traced separately because tracemalloc slows every call down
+    peaks, retained = [], []
+    tracemalloc.start()
+    for i in range(min(iterations, 10)):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        call(i)
+        after, peak = tracemalloc.get_traced_memory()
+        peaks.append((peak - before) / 1024)
+        retained.append((after - before) / 1024)
+    tracemalloc.stop()
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    result = {
+        "iterations": iterations,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "throughput_per_s": throughput,
+        "peak_alloc_kb": sum(peaks) / len(peaks),
+        "retained_kb": sum(retained) / len(retained),
+        "counters_per_call": per_call,
+    }
+    print(f"{name:<24} p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  p99 {result['p99_ms']:8.2f}ms  "
+          f"{result['throughput_per_s']:8.1f}/s  peak {result['peak_alloc_kb']:9.1f}KB  retained {result['retained_kb']:8.1f}KB")
+    print(f"{'':<24} per call: {', '.join(f'{key} {count:g}' for key, count in sorted(per_call.items())) or '-'}")
+    return result
+
+
+def run_benchmarks(iterations: int, concurrency: int, pages: int, insurance_models: dict, only: list[str] | None,
+                   counters) -> dict:
+    from controller.insurance_agent import (
+        SessionState,
+        ask_rag_bot,
+        plan_discovery_node,
+        search_eligible_plans,
+        search_eligible_plan_documents,
+        summaries_by_plan,
+        reason_about_plans,
+        retrieval_backend,
+    )
+    from data_processing.generate_insurance_plans import plan_links, plan_analysis, analysis_cache_collection
+    from evals.test_data import discovery_scripts
+    from models.schemas import PlanDiscoveryAnswers
+    from server.api import _process_task
+    from controller.session_manager import create_job
+
+    chunks = seed_data(insurance_models, plan_links, pages)
+    answers = [PlanDiscoveryAnswers(**profile) for profile in PROFILES]
+    documents = [search_eligible_plan_documents(profile) for profile in answers]
+    discovery_turns = [turn["user"] for script in discovery_scripts for turn in script["turns"]]
+
+    def rag_turn(i):
+        ask_rag_bot(RAG_QUERIES[i % len(RAG_QUERIES)], SessionState())
+
+    def discovery_turn(i):
+        plan_discovery_node(discovery_turns[i % len(discovery_turns)], SessionState())
+
+    def plan_search(i):
+        search_eligible_plans(answers[i % len(answers)])
+
+    def plan_reasoning(i):
+        plan_documents = documents[i % len(documents)]
+        reason_about_plans(summaries_by_plan(plan_documents), answers[i % len(answers)], plan_documents)
+
+    def pinecone_upsert(i):
+        retrieval_backend.upsert(chunks[:96])
+
+    def schema_discovery(i):
+        # Clear the per-page cache so every iteration analyzes the pages
+        analysis_cache_collection.delete_many({})
+        from data_processing.smart_scraper import scrape_and_store_if_not_exists
+        plan_analysis(scrape_and_store_if_not_exists(plan_links[:pages]))
+
+    def data_process(i):
+        _process_task(create_job("benchmark"))
+
+    benchmarks = {
+        "ask_rag_bot": (rag_turn, iterations),
+        "plan_discovery_node": (discovery_turn, iterations),
+        "search_eligible_plans": (plan_search, iterations),
+        "reason_about_plans": (plan_reasoning, iterations),
+        "pinecone_upsert": (pinecone_upsert, max(3, iterations // 5)),
+        "data_plan_analysis": (schema_discovery, max(3, iterations // 10)),
+        "data_process": (data_process, max(3, iterations // 10)),
+    }
+
+    print(f"\n=== OFFLINE PERFORMANCE BENCHMARKS (concurrency {concurrency}) ===")
+    results = {}
+    for name, (call, count) in benchmarks.items():
+        if only and name not in only:
+            continue
+        results[name] = measure(name, call, count, concurrency, counters)
+    return results
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> tuple[list[str], list[str]]:
+    """
+    Regressions that fail the run (counters above the baseline, allocations beyond the tolerance) and
+    changes that are only reported (latency and throughput, counters below the baseline)
+    """
+    regressions, notes = [], []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if not expected:
+            continue
+
+        expected_counters = expected.get("counters_per_call", {})
+        for key in sorted(set(result["counters_per_call"]) | set(expected_counters)):
+            count, expected_count = result["counters_per_call"].get(key, 0), expected_counters.get(key, 0)
+            if count > expected_count:
+                regressions.append(f"{name} {key}: {count:g} per call (baseline {expected_count:g})")
+            elif count < expected_count:
+                notes.append(f"{name} {key}: {count:g} per call (baseline {expected_count:g}); re-record the baseline")
+
+        limit = expected["peak_alloc_kb"] * (1 + tolerance) + ALLOCATION_SLACK_KB
+        if result["peak_alloc_kb"] > limit:
+            regressions.append(f"{name} peak_alloc_kb: {result['peak_alloc_kb']:.1f} > {limit:.1f} (baseline {expected['peak_alloc_kb']:.1f})")
+
+        for metric in ("p95_ms", "p99_ms"):
+            limit = expected[metric] * (1 + tolerance) + LATENCY_SLACK_MS
+            if result[metric] > limit:
+                notes.append(f"{name} {metric}: {result[metric]:.2f} > {limit:.2f} (baseline {expected[metric]:.2f})")
+        limit = expected["throughput_per_s"] / (1 + tolerance)
+        if result["throughput_per_s"] < limit:
+            notes.append(f"{name} throughput_per_s: {result['throughput_per_s']:.1f} < {limit:.1f} (baseline {expected['throughput_per_s']:.1f})")
+    return regressions, notes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks against local service stand-ins")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=5, help="Scraped plan pages used by the data pipeline benchmarks")
+    parser.add_argument("--latency-scale", type=float, default=0.05, help="Multiplier on the fake services' latency distributions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression of allocations (and reported latency)")
+    parser.add_argument("--only", nargs="*", help="Run only these benchmarks")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    openai_server, pinecone_server, patcher, insurance_models = start_services(args.latency_scale, args.seed)
+    try:
+        results = run_benchmarks(args.iterations, args.concurrency, args.pages, insurance_models, args.only,
+                                 lambda: counter_snapshot(pinecone_server))
+        print(f"Fake OpenAI requests: {dict(openai_server.request_counts)}")
+        print(f"Fake Pinecone requests: {dict(pinecone_server.request_counts)}")
+    finally:
+        openai_server.stop()
+        pinecone_server.stop()
+        if patcher:
+            patcher.stop()
+
+    config = {"concurrency": args.concurrency, "pages": args.pages, "latency_scale": args.latency_scale, "seed": args.seed}
+
+    if args.update_baseline:
+        baseline = {}
+        if BASELINE_PATH.exists():
+            with open(BASELINE_PATH) as f:
+                baseline = json.load(f)
+        baseline = {"config": config, "results": {**baseline.get("results", {}), **results}}
+        BASELINE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline written to {BASELINE_PATH}")
+        return 0
+
+    if not BASELINE_PATH.exists():
+        print(f"No baseline at {BASELINE_PATH}; record one with --update-baseline")
+        return 1
+
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != config:
+        print(f"Baseline was recorded with {baseline.get('config')}, this run used {config}")
+        return 1
+
+    regressions, notes = compare_with_baseline(results, baseline["results"], args.tolerance)
+    if notes:
+        print("\nCHANGES AGAINST THE BASELINE (reported, not gating):")
+        for note in notes:
+            print(f"  {note}")
+    if regressions:
+        print("\nPERFORMANCE REGRESSIONS:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nNo regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
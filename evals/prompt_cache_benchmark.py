@@ -0,0 +1,75 @@
+"""
+Cached-prefix ratio per node against the local OpenAI stand-in
+
+    python -m evals.prompt_cache_benchmark --conversations 5 --turns 6
+"""
+
+import argparse
+import os
+import sys
+
+from evals.perf_benchmark import RAG_QUERIES, start_services, seed_data
+
+DISCOVERY_TURNS = [
+    "Hi, I'm looking at health plans for my company",
+    "We're a small design studio",
+    "About 40 people right now, maybe more next year",
+    "We're based in Austin, Texas",
+    "Most of the team stays local but a few travel for clients",
+    "I think national coverage would be safer",
+]
+
+
+def run_conversations(conversations: int, turns: int) -> dict:
+    from controller.insurance_agent import SessionState, ask_rag_bot, plan_discovery_node
+    from controller.prompt_layout import get_prompt_cache_stats
+
+    # cached ratio per turn position, to show how history growth feeds the cacheable prefix
+    by_turn: dict[str, list[list[float]]] = {"ask_rag_bot": [[] for _ in range(turns)], "plan_discovery_node": [[] for _ in range(turns)]}
+
+    for c in range(conversations):
+        rag_session, discovery_session = SessionState(), SessionState()
+        for t in range(turns):
+            ask_rag_bot(RAG_QUERIES[(c + t) % len(RAG_QUERIES)], rag_session)
+            plan_discovery_node(DISCOVERY_TURNS[t % len(DISCOVERY_TURNS)], discovery_session)
+            for node, session in (("ask_rag_bot", rag_session), ("plan_discovery_node", discovery_session)):
+                usage = session.last_usage or {}
+                if usage.get("input_tokens"):
+                    by_turn[node][t].append(usage["cached_tokens"] / usage["input_tokens"])
+
+    stats = get_prompt_cache_stats()
+    print(f"\n=== PROMPT CACHE ({conversations} conversations x {turns} turns) ===")
+    for node, node_stats in stats.items():
+        print(f"{node:<22} {node_stats['calls']:4d} calls  {node_stats['input_tokens']:8d} input tokens  "
+              f"{node_stats['cached_tokens']:8d} cached  ratio {node_stats['cached_ratio']:.2f}")
+    for node, ratios in by_turn.items():
+        per_turn = "  ".join(f"t{t + 1} {sum(r) / len(r):.2f}" if r else f"t{t + 1} -" for t, r in enumerate(ratios))
+        print(f"{node:<22} by turn: {per_turn}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cached-prefix ratio per node against the local OpenAI stand-in")
+    parser.add_argument("--conversations", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--latency-scale", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Every turn should reach the model
+    os.environ.update({"QUERY_ROUTER": "false", "SLOT_FAST_PATH": "false", "SINGLE_FLIGHT": "false"})
+    openai_server, pinecone_server, patcher, insurance_models = start_services(args.latency_scale, args.seed)
+    try:
+        from data_processing.generate_insurance_plans import plan_links
+        seed_data(insurance_models, plan_links, pages=1)
+        run_conversations(args.conversations, args.turns)
+    finally:
+        openai_server.stop()
+        pinecone_server.stop()
+        if patcher:
+            patcher.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import os
+import time
+from evals.test_data import retrieval_questions
+from controller.lexical_index import BM25Index, reciprocal_rank_fusion
+
+
+# RETRIEVAL RECALL AND LATENCY BENCHMARK
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "lexical_index")
+
+
+def is_relevant(hit: dict, relevant_sources: list[str]) -> bool:
+    source = hit["fields"].get("source", "") or ""
+    return any(fragment in source for fragment in relevant_sources)
+
+
+def benchmark_retriever(name: str, search, questions: list[dict] = retrieval_questions, k_values=(1, 3, 5, 10)):
+    """Recall@k (any relevant chunk in the top k) and per-query latency for one retriever"""
+    max_k = max(k_values)
+    hits_at = {k: 0 for k in k_values}
+    latencies = []
+
+    for item in questions:
+        start = time.perf_counter()
+        hits = search(item["question"], max_k)
+        latencies.append(time.perf_counter() - start)
+
+        for k in k_values:
+            if any(is_relevant(hit, item["relevant_sources"]) for hit in hits[:k]):
+                hits_at[k] += 1
+
+    latencies.sort()
+    report = {f"recall@{k}": hits_at[k] / len(questions) for k in k_values}
+    report["p50_ms"] = latencies[len(latencies) // 2] * 1000
+    report["p95_ms"] = latencies[int(len(latencies) * 0.95)] * 1000
+
+    print(f"\n=== {name.upper()} ===")
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}")
+    return report
+
+
+def run_retrieval_benchmark(include_dense: bool = True):
+    lexical_index = BM25Index.load(LEXICAL_INDEX_DIR)
+    print(f"Loaded BM25 index with {len(lexical_index.records)} chunks from {LEXICAL_INDEX_DIR}")
+
+    reports = {"bm25": benchmark_retriever("bm25", lexical_index.search)}
+
+    if include_dense:
+        # Importing the agent connects to the configured retrieval backend
+        from controller.insurance_agent import retrieval_backend
+
+        def dense(query, top_k):
+            return retrieval_backend.search(query, top_k)
+
+        def dense_no_rerank(query, top_k):
+            return retrieval_backend.search(query, top_k, rerank=False)
+
+        def hybrid_no_rerank(query, top_k):
+            return reciprocal_rank_fusion([dense_no_rerank(query, top_k), lexical_index.search(query, top_k)], top_k)
+
+        reports["dense"] = benchmark_retriever("dense + rerank", dense)
+        reports["dense_no_rerank"] = benchmark_retriever("dense, no rerank", dense_no_rerank)
+        reports["hybrid_no_rerank"] = benchmark_retriever("hybrid rrf, no rerank", hybrid_no_rerank)
+
+    return reports
+
+
+if __name__ == "__main__":
+    run_retrieval_benchmark(include_dense=os.getenv("BENCHMARK_DENSE", "true").lower() == "true")
@@ -0,0 +1,62 @@
+import time
+from collections import Counter
+from evals.test_data import router_turns
+from controller.query_router import route_query, NEEDS_REWRITE, CONFIDENCE_THRESHOLD
+
+
+# QUERY ROUTER OFFLINE EVALUATION
+def evaluate_router(turns: list[dict] = router_turns, threshold: float = CONFIDENCE_THRESHOLD, repeats: int = 200):
+    """
+    Replays recorded chat turns through the local router.
+    Turns the router is not confident about fall through to the LLM rewrite, so they count as
+    NEEDS_REWRITE. A mistake is only costly when a confident short-circuit skips a turn that needed retrieval.
+    """
+    confusion = Counter()
+    short_circuited = 0
+    unsafe_skips = 0
+    correct = 0
+
+    for turn in turns:
+        route, confidence = route_query(turn["query"], turn["has_history"])
+        effective = route if route != NEEDS_REWRITE and confidence >= threshold else NEEDS_REWRITE
+
+        confusion[(turn["route"], effective)] += 1
+        if effective == turn["route"]:
+            correct += 1
+        if effective != NEEDS_REWRITE:
+            short_circuited += 1
+            if turn["route"] == NEEDS_REWRITE:
+                unsafe_skips += 1
+                print(f"UNSAFE SKIP: {turn['query']!r} routed to {effective} ({confidence:.2f})")
+
+    # Latency per routing decision
+    latencies = []
+    for _ in range(repeats):
+        for turn in turns:
+            start = time.perf_counter()
+            route_query(turn["query"], turn["has_history"])
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    report = {
+        "turns": len(turns),
+        "accuracy": correct / len(turns),
+        "llm_rewrites_avoided": short_circuited / len(turns),
+        "unsafe_skips": unsafe_skips,
+        "p50_us": latencies[len(latencies) // 2] * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+        "max_us": latencies[-1] * 1e6,
+    }
+
+    print("\n=== QUERY ROUTER EVAL ===")
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+    print("Confusion (expected, routed):")
+    for (expected, routed), count in sorted(confusion.items()):
+        print(f"  {expected:>13} -> {routed:<13} {count}")
+
+    return report
+
+
+if __name__ == "__main__":
+    evaluate_router()
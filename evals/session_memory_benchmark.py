@@ -0,0 +1,121 @@
+"""
+Bytes per SessionState and per entity store, before and after the compact representation
+
+    PYTHONPATH=src python -m evals.session_memory_benchmark
+"""
+
+import argparse
+import tracemalloc
+import uuid
+
+from evals.test_data import compaction_conversations
+from controller.entity_extractor import create_entity_extractor
+from controller.entity_memory import EntityMemory
+from controller.insurance_agent import SessionState
+
+
+class LegacySessionState:
+    """The dict-based layout SessionState used before"""
+
+    def __init__(self):
+        self.user_id = str(uuid.uuid4())
+        self.chat_history = []
+        self.plan_discovery_answers = None
+        # The same entity store as SessionState, so only the session and message layout differs
+        self.extracted_entities = EntityMemory()
+        self.last_prompt_budget = None
+        self.discovery_delta = []
+        self.last_usage = None
+
+
+def replay(turns: int) -> list[tuple[str, str]]:
+    """turns user/assistant exchanges cycled from the recorded conversations"""
+    messages = [(m["role"], m["content"]) for conversation in compaction_conversations for m in conversation["messages"]]
+    # A fresh copy of every string, so sessions do not share content the way live sessions would not
+    return [(role, content.encode().decode()) for role, content in (messages[i % len(messages)] for i in range(turns * 2))]
+
+
+def build_before(messages: list[tuple[str, str]], entities: list[list[dict]]) -> LegacySessionState:
+    session, turn = LegacySessionState(), 0
+    for (role, content), message_entities in zip(messages, entities):
+        if role == "user":
+            turn += 1
+        session.chat_history.append({"role": role, "content": content})
+        session.extracted_entities.add(message_entities, turn)
+    return session
+
+
+def build_entity_list(messages: list[tuple[str, str]], entities: list[list[dict]]) -> list[dict]:
+    """extracted_entities as it used to be: every extracted entity appended"""
+    return [dict(entity) for message_entities in entities for entity in message_entities]
+
+
+def build_entity_memory(messages: list[tuple[str, str]], entities: list[list[dict]]) -> EntityMemory:
+    memory, turn = EntityMemory(), 0
+    for (role, _), message_entities in zip(messages, entities):
+        if role == "user":
+            turn += 1
+        memory.add(message_entities, turn)
+    return memory
+
+
+def build_after(messages: list[tuple[str, str]], entities: list[list[dict]]) -> SessionState:
+    session = SessionState()
+    for (role, content), message_entities in zip(messages, entities):
+        if role == "user":
+            session.turn += 1
+        session.chat_history.append(session.create_message(role, content))
+        session.extracted_entities.add(message_entities, session.turn)
+    return session
+
+
+def bytes_per_session(build, messages: list[tuple[str, str]], entities: list[list[dict]], sessions: int,
+                      count_content: bool = True) -> float:
+    copies = [replay(len(messages) // 2) for _ in range(sessions)]
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    built = [build(copy, entities) for copy in copies]
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del built
+    # The copied content strings were allocated before tracing started; add them back
+    content = sum(len(content) + 49 for _, content in messages) if count_content else 0
+    return used / sessions + content
+
+
+def run_benchmark(turn_counts: list[int], gazetteer_path: str) -> dict:
+    extractor = create_entity_extractor("domain", gazetteer_path=gazetteer_path)
+    results = {}
+    for turns in turn_counts:
+        messages = replay(turns)
+        entities = [extractor.extract(content) for _, content in messages]
+        sessions = max(5, 2000 // turns)
+        before = bytes_per_session(build_before, messages, entities, sessions)
+        after = bytes_per_session(build_after, messages, entities, sessions)
+        entity_list = bytes_per_session(build_entity_list, messages, entities, sessions, count_content=False)
+        entity_memory = bytes_per_session(build_entity_memory, messages, entities, sessions, count_content=False)
+        serialized = len(build_after(messages, entities).to_bytes())
+        results[turns] = {"before_bytes": before, "after_bytes": after, "entity_list_bytes": entity_list,
+                          "entity_memory_bytes": entity_memory, "msgpack_bytes": serialized}
+
+    print("\n=== SESSION MEMORY (bytes per session) ===")
+    for turns, result in results.items():
+        print(f"{turns:5d} turns  before {result['before_bytes']:10,.0f}  after {result['after_bytes']:10,.0f}  "
+              f"({1 - result['after_bytes'] / result['before_bytes']:.0%} smaller)  msgpack {result['msgpack_bytes']:10,d}")
+    print("\n=== ENTITIES (bytes per session) ===")
+    for turns, result in results.items():
+        print(f"{turns:5d} turns  appended list {result['entity_list_bytes']:10,.0f}  "
+              f"EntityMemory {result['entity_memory_bytes']:10,.0f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure SessionState memory per session")
+    parser.add_argument("--turns", nargs="+", type=int, default=[10, 100, 1000])
+    parser.add_argument("--gazetteer", default="src/models/insurance_models.py")
+    args = parser.parse_args()
+    run_benchmark(args.turns, args.gazetteer)
+
+
+if __name__ == "__main__":
+    main()
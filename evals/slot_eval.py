@@ -0,0 +1,71 @@
+import time
+from evals.test_data import discovery_scripts
+from controller.slot_extractor import extract_slots
+
+
+# PLAN DISCOVERY SLOT EXTRACTOR OFFLINE EVALUATION
+def evaluate_slot_extractor(scripts: list[dict] = discovery_scripts, repeats: int = 200):
+    """
+    Replays the scripted profile_users conversations through the local slot extractor.
+    Turns the extractor answers itself must fill the right slots; turns it escalates stand in for the
+    model by applying the slots recorded in the script. The final answers are compared per scenario.
+    """
+    turns = 0
+    fast_path = 0
+    routing_correct = 0
+    wrong_fast_path = 0
+    scenarios_correct = 0
+
+    for script in scripts:
+        answers = {"business_size": None, "location": None, "coverage_preference": None}
+        for turn in script["turns"]:
+            turns += 1
+            slots, ambiguous = extract_slots(turn["user"], answers)
+            used_fast_path = bool(slots) and not ambiguous
+
+            if used_fast_path == turn["fast_path"]:
+                routing_correct += 1
+            if used_fast_path:
+                fast_path += 1
+                if not turn["fast_path"]:
+                    wrong_fast_path += 1
+                    print(f"UNEXPECTED FAST PATH: {turn['user']!r} -> {slots}")
+                answers.update(slots)
+            else:
+                answers.update(turn.get("llm_slots", {}))
+
+        if answers == script["expected"]:
+            scenarios_correct += 1
+        else:
+            print(f"MISMATCH: {script['scenario']}\n  expected {script['expected']}\n  got      {answers}")
+
+    # Latency per extraction
+    latencies = []
+    for _ in range(repeats):
+        for script in scripts:
+            for turn in script["turns"]:
+                start = time.perf_counter()
+                extract_slots(turn["user"])
+                latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    report = {
+        "scenarios": len(scripts),
+        "turns": turns,
+        "scenario_accuracy": scenarios_correct / len(scripts),
+        "routing_accuracy": routing_correct / turns,
+        "model_calls_avoided": fast_path / turns,
+        "unexpected_fast_paths": wrong_fast_path,
+        "p50_us": latencies[len(latencies) // 2] * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+    }
+
+    print("\n=== SLOT EXTRACTOR EVAL ===")
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+    return report
+
+
+if __name__ == "__main__":
+    evaluate_slot_extractor()
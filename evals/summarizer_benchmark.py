@@ -0,0 +1,104 @@
+"""
+History compaction latency, kept tokens and fact recall: extractive vs LLM summarizer
+
+    PYTHONPATH=src python -m evals.summarizer_benchmark --summarizers extractive llm --answer-model gpt-4o-mini
+"""
+
+import argparse
+import os
+import time
+from pydantic import BaseModel
+
+from evals.test_data import compaction_conversations
+from controller.context_packer import count_tokens
+from controller.summarizers import SUMMARY_PREFIX, create_summarizer
+
+
+class Answer(BaseModel):
+    answer: str
+
+
+def compact(messages: list[dict], summarizer, max_tokens: int, percent_to_summarize: float = 0.2) -> tuple[list[dict], list[float]]:
+    """Replay the messages through manage_token_limit's policy; returns the history and each compaction's latency"""
+    history, latencies = [], []
+    for message in messages:
+        history.append(message)
+        while count_tokens("".join(m["content"] for m in history)) > max_tokens and len(history) >= 2:
+            count = max(2, int(len(history) * percent_to_summarize))
+            start = time.perf_counter()
+            # No NER entities: the benchmark runs without the BERT model, so this is a lower bound for extractive
+            summary = summarizer.summarize(history[:count], [])
+            latencies.append((time.perf_counter() - start) * 1000)
+            history = [{"role": "system", "content": f"{SUMMARY_PREFIX} {summary}"}] + history[count:]
+    return history, latencies
+
+
+def answer_questions(history: list[dict], questions: list[dict], client, model: str) -> int:
+    conversation = "\n".join(f"{m['role'].capitalize()}: {m['content']}" for m in history)
+    correct = 0
+    for question in questions:
+        response = client.responses.parse(
+            node="summarizer_benchmark",
+            model=model,
+            input=[
+                {"role": "developer", "content": "Answer the question using only the conversation. Reply with a short phrase, or 'unknown'."},
+                {"role": "user", "content": f"Conversation:\n{conversation}\n\nQuestion: {question['question']}"}
+            ],
+            text_format=Answer
+        )
+        if question["expected"].lower() in response.output_parsed.answer.lower():
+            correct += 1
+    return correct
+
+
+def run_benchmark(summarizer_names: list[str], max_tokens: int, answer_model: str | None) -> dict:
+    client = None
+    if "llm" in summarizer_names or answer_model:
+        from controller.llm_client import create_openai_client
+        client = create_openai_client(os.getenv("OPENAI_API_KEY"))
+
+    results = {}
+    for name in summarizer_names:
+        summarizer = create_summarizer(name, client)
+        latencies, kept_tokens, facts_kept, facts_total, answered, questions_total = [], 0, 0, 0, 0, 0
+        for conversation in compaction_conversations:
+            history, compaction_latencies = compact(conversation["messages"], summarizer, max_tokens)
+            latencies.extend(compaction_latencies)
+            history_text = " ".join(m["content"] for m in history).lower()
+            kept_tokens += count_tokens(history_text)
+            facts_kept += sum(1 for fact in conversation["facts"] if fact.lower() in history_text)
+            facts_total += len(conversation["facts"])
+            if answer_model:
+                answered += answer_questions(history, conversation["questions"], client, answer_model)
+                questions_total += len(conversation["questions"])
+
+        latencies.sort()
+        results[name] = {
+            "compactions": len(latencies),
+            "p50_ms": latencies[len(latencies) // 2] if latencies else 0.0,
+            "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0,
+            "avg_history_tokens": kept_tokens / len(compaction_conversations),
+            "fact_recall": facts_kept / facts_total,
+            "answer_accuracy": answered / questions_total if questions_total else None,
+        }
+
+    print(f"\n=== HISTORY COMPACTION ({len(compaction_conversations)} conversations, max_tokens={max_tokens}) ===")
+    for name, result in results.items():
+        accuracy = f"{result['answer_accuracy']:.2f}" if result["answer_accuracy"] is not None else "-"
+        print(f"{name:<12} {result['compactions']:3d} compactions  p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+              f"history {result['avg_history_tokens']:6.0f} tokens  fact recall {result['fact_recall']:.2f}  answers {accuracy}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare history summarizers on recorded conversations")
+    parser.add_argument("--summarizers", nargs="+", default=["extractive"], choices=["extractive", "llm"])
+    # Below manage_token_limit's 300 so the short recorded conversations are compacted several times
+    parser.add_argument("--max-tokens", type=int, default=150, help="History token limit that triggers compaction")
+    parser.add_argument("--answer-model", help="Model that answers the questions from the compacted history")
+    args = parser.parse_args()
+    run_benchmark(args.summarizers, args.max_tokens, args.answer_model)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,4 +19,249 @@ profile_users = [
     "User's business has 50 employees, is located in New York, and needs help deciding between local and national coverage."
     "User's business is located in New Jersey, prefers national coverage, and has 1,200 members."
     ""
-]
\ No newline at end of file
+]
+
+# RECORDED CHAT TURNS FOR QUERY ROUTER EVALS
+# Each turn records whether earlier conversation existed and the route rewrite_query effectively took
+
+router_turns = [
+    {"query": "hi", "has_history": False, "route": "no_retrieval"},
+    {"query": "Hello!", "has_history": False, "route": "no_retrieval"},
+    {"query": "hey there, how's it going?", "has_history": False, "route": "no_retrieval"},
+    {"query": "good morning", "has_history": False, "route": "no_retrieval"},
+    {"query": "thanks!", "has_history": True, "route": "no_retrieval"},
+    {"query": "thank you so much", "has_history": True, "route": "no_retrieval"},
+    {"query": "ok got it", "has_history": True, "route": "no_retrieval"},
+    {"query": "perfect, thanks", "has_history": True, "route": "no_retrieval"},
+    {"query": "that's all, bye", "has_history": True, "route": "no_retrieval"},
+    {"query": "what can you do?", "has_history": False, "route": "no_retrieval"},
+    {"query": "who am I talking to?", "has_history": False, "route": "no_retrieval"},
+    {"query": "is my injury covered", "has_history": False, "route": "clarify"},
+    {"query": "what does my plan cover", "has_history": False, "route": "clarify"},
+    {"query": "which doctors can I see in my area?", "has_history": False, "route": "clarify"},
+    {"query": "how much will it cost me", "has_history": False, "route": "clarify"},
+    {"query": "is it covered?", "has_history": False, "route": "clarify"},
+    {"query": "what's an HMO?", "has_history": False, "route": "needs_rewrite"},
+    {"query": "how is a PPO different from an HMO", "has_history": False, "route": "needs_rewrite"},
+    {"query": "what is coinsurance", "has_history": False, "route": "needs_rewrite"},
+    {"query": "can I pair an HSA with a high deductible plan?", "has_history": False, "route": "needs_rewrite"},
+    {"query": "does LocalPlus cover out of network care?", "has_history": False, "route": "needs_rewrite"},
+    {"query": "tell me about SureFit", "has_history": False, "route": "needs_rewrite"},
+    {"query": "how do I get my prescriptions delivered", "has_history": False, "route": "needs_rewrite"},
+    {"query": "when can I enroll in a plan", "has_history": False, "route": "needs_rewrite"},
+    {"query": "what does medicare part b cover", "has_history": False, "route": "needs_rewrite"},
+    {"query": "do you offer dental insurance for kids", "has_history": False, "route": "needs_rewrite"},
+    {"query": "what about Texas?", "has_history": True, "route": "needs_rewrite"},
+    {"query": "and for my family?", "has_history": True, "route": "needs_rewrite"},
+    {"query": "is my doctor in network?", "has_history": True, "route": "needs_rewrite"},
+    {"query": "what about my state?", "has_history": True, "route": "needs_rewrite"},
+    {"query": "how about virtual care", "has_history": True, "route": "needs_rewrite"},
+    {"query": "what's the cheapest option for a small business", "has_history": False, "route": "needs_rewrite"},
+]
+
+
+# LABELLED QUESTIONS FOR RETRIEVAL BENCHMARKS
+# A retrieved chunk is relevant when its source URL contains one of the listed fragments
+
+retrieval_questions = [
+    {"question": "What is the difference between in-network and out-of-network care?", "relevant_sources": ["in-network-vs-out-of-network"]},
+    {"question": "How do copays, deductibles and coinsurance work?", "relevant_sources": ["copays-deductibles-coinsurance"]},
+    {"question": "What does Medicare Part D cover?", "relevant_sources": ["what-is-medicare-part-d", "part-b-part-d-coverage-differences"]},
+    {"question": "What is Medigap?", "relevant_sources": ["medicare-supplement-insurance-medigap", "plan-g"]},
+    {"question": "When is open enrollment and what is a special enrollment period?", "relevant_sources": ["open-enrollment-special-enrollment"]},
+    {"question": "What are bronze, silver, gold and platinum plans?", "relevant_sources": ["bronze-silver-gold-platinum-health-plans"]},
+    {"question": "Should I choose a dental HMO or PPO?", "relevant_sources": ["dental-hmo-vs-ppo-plans"]},
+    {"question": "Does dental insurance cover braces?", "relevant_sources": ["orthodontic-insurance"]},
+    {"question": "How much does dental insurance cost?", "relevant_sources": ["dental-insurance-cost"]},
+    {"question": "How do I get prescriptions through home delivery pharmacy?", "relevant_sources": ["home-delivery-pharmacy"]},
+    {"question": "What is specialty pharmacy?", "relevant_sources": ["specialty-pharmacy"]},
+    {"question": "What is the employee assistance program?", "relevant_sources": ["employee-assistance-program"]},
+    {"question": "How does hospital indemnity insurance pay out?", "relevant_sources": ["hospital-indemnity-insurance"]},
+    {"question": "What does lump sum cancer insurance cover?", "relevant_sources": ["lump-sum-cancer-insurance", "cancer-treatment-insurance"]},
+    {"question": "What are Medicare Advantage special needs plans?", "relevant_sources": ["special-needs-plans"]},
+    {"question": "What is the Part B giveback benefit?", "relevant_sources": ["additional-benefits"]},
+    {"question": "How do I use the myCigna app?", "relevant_sources": ["mycigna"]},
+    {"question": "What is the health insurance marketplace?", "relevant_sources": ["health-insurance-marketplace"]},
+    {"question": "Is 24/7 virtual care included?", "relevant_sources": ["24-7-virtual-care-tag", "plan-benefits"]},
+    {"question": "Where can I find customer forms?", "relevant_sources": ["customer-forms"]},
+]
+
+
+# SCRIPTED PLAN DISCOVERY CONVERSATIONS FOR THE SLOT EXTRACTOR
+# One script per profile_users scenario. Each turn records whether it can be answered without the model
+# (fast_path) and, for model turns, the slots the model is expected to fill (llm_slots).
+
+discovery_scripts = [
+    {
+        "scenario": "Lives in California, business in Arizona, local coverage, 100 people, one piece at a time",
+        "turns": [
+            {"user": "Hi, I need a health plan for my company", "fast_path": False, "llm_slots": {}},
+            {"user": "We have 100 employees", "fast_path": True},
+            {"user": "I live in California but the business is in Arizona", "fast_path": False, "llm_slots": {"location": "AZ"}},
+            {"user": "local coverage", "fast_path": True},
+        ],
+        "expected": {"business_size": 100, "location": "AZ", "coverage_preference": "Local"}
+    },
+    {
+        "scenario": "Massachusetts, national coverage, 30 people, all at once",
+        "turns": [
+            {"user": "Our business is in Massachusetts, we'd like national coverage and we have 30 employees", "fast_path": True},
+        ],
+        "expected": {"business_size": 30, "location": "MA", "coverage_preference": "National"}
+    },
+    {
+        "scenario": "National coverage at once, Alaska, 15 people, reluctant",
+        "turns": [
+            {"user": "We prefer national coverage.", "fast_path": True},
+            {"user": "Why do you need to know that?", "fast_path": False, "llm_slots": {}},
+            {"user": "Fine, we're up in Alaska", "fast_path": True},
+            {"user": "about fifteen people", "fast_path": True},
+        ],
+        "expected": {"business_size": 15, "location": "AK", "coverage_preference": "National"}
+    },
+    {
+        "scenario": "Non-native speaker, business outside America, local coverage, 400 employees, sequential",
+        "turns": [
+            {"user": "i want the local plan coverage", "fast_path": True},
+            {"user": "we has 400 employe", "fast_path": True},
+            {"user": "company not in america, is in mexico", "fast_path": False, "llm_slots": {}},
+        ],
+        "expected": {"business_size": 400, "location": None, "coverage_preference": "Local"}
+    },
+    {
+        "scenario": "Remote team all over the USA, unsure where, local coverage, 2,000 employees",
+        "turns": [
+            {"user": "Our team is remote and spread all over the country, I'm not sure where", "fast_path": False, "llm_slots": {}},
+            {"user": "We prefer local coverage though", "fast_path": True},
+            {"user": "We have 2,000 employees", "fast_path": True},
+        ],
+        "expected": {"business_size": 2000, "location": None, "coverage_preference": "Local"}
+    },
+    {
+        "scenario": "Business is just themself, Texas, national coverage",
+        "turns": [
+            {"user": "It's just me, I run it out of Texas and I'd like national coverage", "fast_path": True},
+        ],
+        "expected": {"business_size": 1, "location": "TX", "coverage_preference": "National"}
+    },
+    {
+        "scenario": "Alabama, local, 200 employees, then changes to Illinois, national, 300 people",
+        "turns": [
+            {"user": "We're in Alabama with 200 employees and want local coverage", "fast_path": True},
+            {"user": "Actually scratch that, we're 300 people in Illinois and we'd prefer national coverage", "fast_path": True},
+        ],
+        "expected": {"business_size": 300, "location": "IL", "coverage_preference": "National"}
+    },
+    {
+        "scenario": "Does not know location, coverage preference or employee count",
+        "turns": [
+            {"user": "I honestly don't know how many employees we have or where we're based", "fast_path": False, "llm_slots": {}},
+            {"user": "no idea about local or national either", "fast_path": False, "llm_slots": {}},
+        ],
+        "expected": {"business_size": None, "location": None, "coverage_preference": None}
+    },
+    {
+        "scenario": "50 employees, New York, undecided between local and national",
+        "turns": [
+            {"user": "We have 50 employees in New York", "fast_path": True},
+            {"user": "I'm torn between local and national coverage, what do you suggest?", "fast_path": False, "llm_slots": {}},
+        ],
+        "expected": {"business_size": 50, "location": "NY", "coverage_preference": None}
+    },
+    {
+        "scenario": "New Jersey, national coverage, 1,200 members",
+        "turns": [
+            {"user": "Business is in New Jersey, we want national coverage, and we have 1,200 members", "fast_path": True},
+        ],
+        "expected": {"business_size": 1200, "location": "NJ", "coverage_preference": "National"}
+    },
+]
+
+# Recorded chat conversations for history compaction benchmarks. facts must survive compaction;
+# questions are asked against the compacted history and answered correctly if the answer contains expected.
+compaction_conversations = [
+    {
+        "scenario": "Texas design studio comparing HMO and PPO",
+        "messages": [
+            {"role": "user", "content": "Hi there!"},
+            {"role": "assistant", "content": "Hello! I can help you understand Cigna's employer health plans. What would you like to know?"},
+            {"role": "user", "content": "We're a design studio in Austin, Texas with 42 employees. What's the difference between an HMO and a PPO?"},
+            {"role": "assistant", "content": "An HMO usually requires members to choose a primary care provider and get referrals to see specialists, and it only covers in-network care except in emergencies. A PPO lets members see any provider without a referral and covers out-of-network care at a higher cost. HMOs tend to have lower premiums."},
+            {"role": "user", "content": "Most of our team is under 35 and healthy. Budget matters a lot, we can spend about $450 per employee per month."},
+            {"role": "assistant", "content": "With a younger, healthy group and a firm budget, an HMO or a high deductible plan paired with an HSA is often the most cost-effective choice. Would you like to hear how an HSA works?"},
+            {"role": "user", "content": "Sure. Also two of our designers live in Colorado and work remotely."},
+            {"role": "assistant", "content": "An HSA is a tax-advantaged savings account employees can use for qualified medical expenses when they are enrolled in a high deductible plan. Because you have remote staff in Colorado, a plan with a national network would make sure they have in-network providers where they live."},
+            {"role": "user", "content": "Got it. What about copays for urgent care?"},
+            {"role": "assistant", "content": "Urgent care copays vary by plan, but they are usually lower than emergency room copays. Your plan summary lists the exact amounts."},
+        ],
+        "facts": ["42", "Texas", "Colorado", "450", "HMO"],
+        "questions": [
+            {"question": "How many employees does the business have?", "expected": "42"},
+            {"question": "Where do the remote employees live?", "expected": "Colorado"},
+            {"question": "What is the monthly budget per employee?", "expected": "450"},
+        ]
+    },
+    {
+        "scenario": "New Jersey manufacturer with out-of-network concerns",
+        "messages": [
+            {"role": "user", "content": "Hello, I run HR for a manufacturer in Newark, New Jersey."},
+            {"role": "assistant", "content": "Welcome! How can I help you with health coverage today?"},
+            {"role": "user", "content": "We have 1,200 employees across three plants and a lot of them see specialists at hospitals in New York City."},
+            {"role": "assistant", "content": "For a large group with members who see specialists across state lines, a plan with a broad national network and no referral requirement can reduce friction. Open Access Plus plans do not require referrals."},
+            {"role": "user", "content": "Does Open Access Plus cover out-of-network care?"},
+            {"role": "assistant", "content": "Some Open Access Plus plans include out-of-network coverage and some are in-network only. It depends on the plan design your company chooses."},
+            {"role": "user", "content": "Our union contract requires out-of-network coverage, so that's a must."},
+            {"role": "assistant", "content": "Understood. Then you would want an Open Access Plus plan with out-of-network benefits or a PPO. I can help you compare them."},
+            {"role": "user", "content": "Thanks. How do deductibles work for families?"},
+            {"role": "assistant", "content": "Family deductibles are usually either embedded, where each person has their own deductible inside the family amount, or aggregate, where the whole family deductible must be met first."},
+        ],
+        "facts": ["1,200", "New Jersey", "out-of-network", "union", "New York"],
+        "questions": [
+            {"question": "How many employees does the company have?", "expected": "1,200"},
+            {"question": "Why is out-of-network coverage required?", "expected": "union"},
+            {"question": "In which state is the company based?", "expected": "New Jersey"},
+        ]
+    },
+    {
+        "scenario": "Ohio nonprofit worried about pharmacy costs",
+        "messages": [
+            {"role": "user", "content": "Hey"},
+            {"role": "assistant", "content": "Hi! What can I help you with?"},
+            {"role": "user", "content": "I'm with a nonprofit in Columbus, Ohio. We have 85 staff and several of them take expensive prescriptions."},
+            {"role": "assistant", "content": "Pharmacy benefits can make a big difference for members with ongoing prescriptions. Cigna plans include tiered drug lists, and specialty medications are often managed through a specialty pharmacy."},
+            {"role": "user", "content": "Our current carrier raised premiums 18% this year, which we can't absorb again."},
+            {"role": "assistant", "content": "That is a significant increase. Options to manage cost include a narrower local network, a high deductible plan with an HSA or HRA, and encouraging generic drugs."},
+            {"role": "user", "content": "Everyone is local, nobody travels, so a local network would be fine."},
+            {"role": "assistant", "content": "A LocalPlus plan could fit well then, since it uses a local network in your area and usually costs less than a national network plan."},
+            {"role": "user", "content": "Okay, what does coinsurance mean?"},
+            {"role": "assistant", "content": "Coinsurance is the percentage of a covered cost a member pays after meeting the deductible, for example 20%, while the plan pays the rest."},
+        ],
+        "facts": ["85", "Ohio", "18%", "prescriptions", "local"],
+        "questions": [
+            {"question": "How much did premiums increase this year?", "expected": "18%"},
+            {"question": "How many staff does the nonprofit have?", "expected": "85"},
+            {"question": "Does the organization need a national or a local network?", "expected": "local"},
+        ]
+    },
+    {
+        "scenario": "Florida restaurant group with seasonal workers",
+        "messages": [
+            {"role": "user", "content": "I own four restaurants in Miami, Florida."},
+            {"role": "assistant", "content": "Great, thanks for sharing. Are you looking for coverage for your employees?"},
+            {"role": "user", "content": "Yes, about 60 full-time staff, plus 40 seasonal workers in winter who don't need coverage."},
+            {"role": "assistant", "content": "Eligibility rules usually let employers cover full-time employees only, so you would size the plan around the 60 full-time staff."},
+            {"role": "user", "content": "Many of my staff are Spanish speakers, does that matter?"},
+            {"role": "assistant", "content": "Cigna offers member support and materials in Spanish, which can help your team use their benefits."},
+            {"role": "user", "content": "We want something simple with low copays for doctor visits."},
+            {"role": "assistant", "content": "Copay-based plans such as an HMO or a LocalPlus plan keep doctor visits predictable, which many hourly employees prefer."},
+            {"role": "user", "content": "Makes sense. What is a network?"},
+            {"role": "assistant", "content": "A network is the group of doctors, hospitals and pharmacies that have agreed to provide care to plan members at negotiated rates."},
+        ],
+        "facts": ["60", "Florida", "seasonal", "Spanish", "copays"],
+        "questions": [
+            {"question": "How many full-time staff need coverage?", "expected": "60"},
+            {"question": "What language do many employees speak?", "expected": "Spanish"},
+            {"question": "In which state are the restaurants?", "expected": "Florida"},
+        ]
+    },
+]
@@ -0,0 +1,143 @@
+"""Per-model concurrency limits, with a bounded wait queue, for the upstream model calls made while serving requests"""
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+# Comma separated model=limit pairs; unlisted models get ADMISSION_DEFAULT_LIMIT
+ADMISSION_LIMITS = os.getenv("ADMISSION_LIMITS", "gpt-4.1=8,gpt-4o-mini=16,o4-mini=4")
+ADMISSION_DEFAULT_LIMIT = int(os.getenv("ADMISSION_DEFAULT_LIMIT", "8"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+
+# Weight of the newest sample in the service time moving average
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+def parse_limits(spec: str) -> dict[str, int]:
+    limits = {}
+    for pair in spec.split(","):
+        if "=" not in pair:
+            continue
+        model, limit = pair.split("=", 1)
+        limits[model.strip()] = int(limit)
+    return limits
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted; status_code is 429 (queue full) or 503 (queue timeout)"""
+
+    def __init__(self, model: str, status_code: int, retry_after: int, reason: str):
+        super().__init__(f"{model} is at capacity: {reason}")
+        self.model = model
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class _ModelGate:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.semaphore = threading.Semaphore(limit)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.service_time = 1.0
+        self.stats = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue plus one more request should have drained"""
+        return max(1, math.ceil(self.service_time * (self.waiting + 1) / self.limit))
+
+
+class AdmissionController:
+    def __init__(self, limits: dict[str, int] | None = None, default_limit: int = ADMISSION_DEFAULT_LIMIT,
+                 queue_size: int = ADMISSION_QUEUE_SIZE, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+                 enabled: bool = ADMISSION_CONTROL):
+        self.limits = parse_limits(ADMISSION_LIMITS) if limits is None else limits
+        self.default_limit = default_limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.enabled = enabled
+        self.gates: dict[str, _ModelGate] = {}
+        self._lock = threading.Lock()
+
+    def gate(self, model: str) -> _ModelGate:
+        with self._lock:
+            if model not in self.gates:
+                self.gates[model] = _ModelGate(self.limits.get(model, self.default_limit))
+            return self.gates[model]
+
+    @contextmanager
+    def admit(self, model: str):
+        """Hold one of the model's slots for the duration of the block; model calls run in worker threads"""
+        if not self.enabled:
+            yield
+            return
+
+        gate = self.gate(model)
+        if not gate.semaphore.acquire(blocking=False):
+            with gate.lock:
+                if gate.waiting >= self.queue_size:
+                    gate.stats["rejected_queue_full"] += 1
+                    raise AdmissionRejected(model, 429, gate.retry_after(), "wait queue is full")
+                gate.stats["queued"] += 1
+                gate.waiting += 1
+            admitted = gate.semaphore.acquire(timeout=self.queue_timeout)
+            with gate.lock:
+                gate.waiting -= 1
+                if not admitted:
+                    gate.stats["rejected_timeout"] += 1
+                    raise AdmissionRejected(model, 503, gate.retry_after(), f"not admitted within {self.queue_timeout:.0f}s")
+
+        with gate.lock:
+            gate.stats["admitted"] += 1
+            gate.active += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with gate.lock:
+                gate.active -= 1
+                gate.service_time += SERVICE_TIME_SMOOTHING * (elapsed - gate.service_time)
+            gate.semaphore.release()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            gates = dict(self.gates)
+        stats = {}
+        for model, gate in gates.items():
+            with gate.lock:
+                stats[model] = {**gate.stats, "limit": gate.limit, "active": gate.active, "waiting": gate.waiting,
+                                "avg_service_ms": gate.service_time * 1000}
+        return stats
+
+
+class _AdmittedResponses:
+    def __init__(self, responses, controller: AdmissionController):
+        self._responses = responses
+        self._controller = controller
+
+    def parse(self, **kwargs):
+        with self._controller.admit(kwargs.get("model")):
+            return self._responses.parse(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._responses, name)
+
+
+class AdmittedOpenAI:
+    """OpenAI client proxy whose responses.parse calls each hold a slot of their model while in flight"""
+
+    def __init__(self, client, controller: AdmissionController):
+        self._client = client
+        self.responses = _AdmittedResponses(client.responses, controller)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+admission = AdmissionController()
@@ -0,0 +1,234 @@
+"""Record/replay of OpenAI and Pinecone calls, keyed on the normalized request, for offline benchmarks"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+# off (default), record, replay (misses are recorded) or replay_strict (misses raise CassetteMissError)
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off")
+CASSETTE_DIR = Path(os.getenv("CASSETTE_DIR", "cassettes"))
+CASSETTE_NAME = os.getenv("CASSETTE_NAME", "default")
+# 0 replays at full speed, 1 sleeps for the recorded latency, 0.5 for half of it
+CASSETTE_REPLAY_SPEED = float(os.getenv("CASSETTE_REPLAY_SPEED", "0"))
+
+MODES = ("off", "record", "replay", "replay_strict")
+# Request fields that differ between runs without changing the response
+VOLATILE_FIELDS = frozenset({"user", "timeout", "extra_headers", "extra_query"})
+WHITESPACE = re.compile(r"\s+")
+# Replaying responses.parse needs SDK internals with no public equivalent; they were checked against
+# this openai release (the one requirements.txt pins) and are re-checked on upgrade
+OPENAI_SDK_VERSION = "1.101"
+
+
+class CassetteMissError(Exception):
+    """Raised in replay_strict mode for a call that was never recorded"""
+
+
+def normalize(value):
+    """JSON-compatible, run-independent form of a request"""
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in sorted(value.items()) if key not in VOLATILE_FIELDS}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    if isinstance(value, str):
+        return WHITESPACE.sub(" ", value).strip()
+    if isinstance(value, type) and hasattr(value, "model_json_schema"):
+        return {"model": value.__name__, "schema": normalize(value.model_json_schema())}
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return str(value)
+
+
+def request_key(operation: str, request: dict) -> str:
+    payload = json.dumps({"op": operation, "request": normalize(request)}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class Cassette:
+    def __init__(self, name: str = CASSETTE_NAME, mode: str = CASSETTE_MODE, directory: Path = CASSETTE_DIR,
+                 replay_speed: float = CASSETTE_REPLAY_SPEED):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.mode = mode
+        self.path = Path(directory) / f"{name}.jsonl.gz"
+        self.replay_speed = replay_speed
+        self.entries: dict[str, list[dict]] = {}
+        self.cursors: dict[str, int] = {}
+        self.stats = {"replayed": 0, "recorded": 0, "missed": 0}
+        self._lock = threading.Lock()
+        if mode != "off":
+            self.load()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def load(self):
+        if not self.path.exists():
+            return
+        with gzip.open(self.path, "rt") as f:
+            for line in f:
+                entry = json.loads(line)
+                self.entries.setdefault(entry["key"], []).append(entry)
+        print(f"Loaded {sum(len(entries) for entries in self.entries.values())} recorded calls from {self.path}")
+
+    def _append(self, entry: dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Each append is its own gzip member; readers see one continuous stream
+        with gzip.open(self.path, "at") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def _next_recorded(self, key: str) -> dict | None:
+        """Recorded entries for a key are replayed in order, repeating the last one"""
+        entries = self.entries.get(key)
+        if not entries:
+            return None
+        position = self.cursors.get(key, 0)
+        self.cursors[key] = position + 1
+        return entries[min(position, len(entries) - 1)]
+
+    def call(self, operation: str, request: dict, live, serialize, deserialize):
+        """
+        Run one call through the cassette.
+        live() performs the real call, serialize turns its result into JSON and deserialize turns a
+        recorded JSON value back into what live() would have returned.
+        """
+        if not self.enabled:
+            return live()
+
+        key = request_key(operation, request)
+        if self.mode in ("replay", "replay_strict"):
+            with self._lock:
+                entry = self._next_recorded(key)
+                self.stats["replayed" if entry is not None else "missed"] += 1
+            if entry is not None:
+                if self.replay_speed > 0:
+                    time.sleep(entry["latency"] * self.replay_speed)
+                return deserialize(entry["response"])
+            if self.mode == "replay_strict":
+                raise CassetteMissError(f"No recorded {operation} call matches this request (key {key[:12]})")
+
+        start = time.perf_counter()
+        result = live()
+        entry = {"key": key, "op": operation, "latency": time.perf_counter() - start, "response": serialize(result)}
+        with self._lock:
+            self.entries.setdefault(key, []).append(entry)
+            self._append(entry)
+            self.stats["recorded"] += 1
+        return result
+
+
+def parsed_response_loader():
+    """
+    Function rebuilding a ParsedResponse from a recorded response's JSON, as responses.parse returns it.
+    Uses private openai modules, so it raises unless the installed SDK is the release they were checked
+    against or when they have moved.
+    """
+    import openai
+
+    if not openai.__version__.startswith(f"{OPENAI_SDK_VERSION}."):
+        raise RuntimeError(f"Cassette replay was written against openai {OPENAI_SDK_VERSION}.x, found {openai.__version__}; "
+                           f"check parsed_response_loader against the new SDK and update OPENAI_SDK_VERSION")
+    try:
+        from openai._models import construct_type
+        from openai.types.responses import Response
+        from openai.lib._parsing._responses import parse_response
+    except ImportError as e:
+        raise RuntimeError(f"openai {openai.__version__} no longer provides what cassette replay needs: {e}") from e
+
+    def load(data: dict, text_format=None, tools=None):
+        response = construct_type(type_=Response, value=data)
+        return parse_response(text_format=text_format, input_tools=tools, response=response)
+
+    return load
+
+
+class _RecordedResponses:
+    """client.responses with parse going through the cassette"""
+
+    def __init__(self, responses, cassette: Cassette):
+        self._responses = responses
+        self._cassette = cassette
+        # Checked up front so an incompatible SDK fails before the first replayed call
+        self._load_response = parsed_response_loader() if cassette.mode in ("replay", "replay_strict") else None
+
+    def parse(self, **kwargs):
+        return self._cassette.call(
+            "responses.parse",
+            kwargs,
+            live=lambda: self._responses.parse(**kwargs),
+            serialize=lambda response: response.model_dump(mode="json", exclude_none=True),
+            deserialize=lambda data: self._load_response(data, kwargs.get("text_format"), kwargs.get("tools"))
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._responses, name)
+
+
+class RecordedOpenAI:
+    """OpenAI client proxy whose responses.parse calls are recorded and replayed"""
+
+    def __init__(self, client, cassette: Cassette):
+        self._client = client
+        self.responses = _RecordedResponses(client.responses, cassette)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class RecordedIndex:
+    """Pinecone index proxy whose search and upsert_records calls are recorded and replayed"""
+
+    def __init__(self, index, cassette: Cassette):
+        self._index = index
+        self._cassette = cassette
+
+    def search(self, **kwargs):
+        return self._cassette.call(
+            "index.search",
+            kwargs,
+            live=lambda: self._index.search(**kwargs),
+            serialize=lambda results: results.to_dict() if hasattr(results, "to_dict") else results,
+            # Replays are plain dicts, which support the .get access PineconeBackend uses
+            deserialize=lambda data: data
+        )
+
+    def upsert_records(self, namespace: str, records: list[dict]):
+        return self._cassette.call(
+            "index.upsert_records",
+            {"namespace": namespace, "records": records},
+            live=lambda: self._index.upsert_records(namespace, records),
+            serialize=lambda result: None,
+            deserialize=lambda data: None
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
+
+_default_cassette: Cassette | None = None
+_default_lock = threading.Lock()
+
+
+def default_cassette() -> Cassette:
+    """Process-wide cassette configured from the environment"""
+    global _default_cassette
+    with _default_lock:
+        if _default_cassette is None:
+            _default_cassette = Cassette()
+        return _default_cassette
+
+
+def record_openai(client, cassette: Cassette | None = None):
+    cassette = cassette or default_cassette()
+    return RecordedOpenAI(client, cassette) if cassette.enabled else client
+
+
+def record_index(index, cassette: Cassette | None = None):
+    cassette = cassette or default_cassette()
+    return RecordedIndex(index, cassette) if cassette.enabled else index
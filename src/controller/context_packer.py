@@ -0,0 +1,92 @@
+"""Packs retrieved chunks into the RAG prompt under a token budget, dropping repeated and overlapping chunks"""
+
+import tiktoken
+
+# Tokenizer of every model the agent calls (gpt-4.1, gpt-4o-mini, o4-mini); all prompt budgets count with it
+tokenizer = tiktoken.get_encoding("o200k_base")
+
+CHUNK_SEPARATOR = "\n\n---\n\n"
+
+# Bounds for detecting the splitter's chunk overlap (chunk_overlap=100 in smart_scraper.chunk_data)
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 150
+
+
+def count_tokens(text: str) -> int:
+    return len(tokenizer.encode(text)) if text else 0
+
+
+def _overlap_length(first: str, second: str) -> int:
+    """Length of the longest suffix of first that is also a prefix of second"""
+    for size in range(min(MAX_OVERLAP_CHARS, len(first), len(second)), MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+def dedupe_hits(hits: list[dict]) -> list[dict]:
+    """
+    Collapse hits returned by several queries into unique chunks.
+    Keeps the best reranker score per chunk, drops chunks contained in another chunk and trims
+    the text a chunk shares with a neighbouring chunk from the same source.
+    """
+    by_id = {}
+    for hit in hits:
+        fields = hit.get("fields", {})
+        text = fields.get("chunk_text", "").strip()
+        if not text:
+            continue
+        chunk_id = hit.get("_id") or text
+        score = hit.get("_score", 0.0)
+        if chunk_id not in by_id or score > by_id[chunk_id]["score"]:
+            by_id[chunk_id] = {"id": chunk_id, "score": score, "text": text, "source": fields.get("source", "")}
+
+    chunks = sorted(by_id.values(), key=lambda c: c["score"], reverse=True)
+
+    unique = []
+    for chunk in chunks:
+        if any(chunk["text"] in kept["text"] for kept in unique):
+            continue
+        for kept in unique:
+            if kept["source"] != chunk["source"]:
+                continue
+            overlap = _overlap_length(kept["text"], chunk["text"])
+            if overlap:
+                chunk["text"] = chunk["text"][overlap:].lstrip()
+            overlap = _overlap_length(chunk["text"], kept["text"])
+            if overlap:
+                chunk["text"] = chunk["text"][:-overlap].rstrip()
+        if chunk["text"]:
+            unique.append(chunk)
+    return unique
+
+
+def pack_context(hits: list[dict], token_budget: int) -> tuple[str, dict]:
+    """
+    Build the knowledge base context for the prompt from search hits.
+    Returns the context string and a breakdown of how the budget was spent.
+    """
+    chunks = dedupe_hits(hits)
+
+    parts = []
+    used_tokens = 0
+    separator_tokens = count_tokens(CHUNK_SEPARATOR)
+    included = 0
+    for chunk in chunks:
+        text = f"[Source: {chunk['source']}]\n{chunk['text']}" if chunk["source"] else chunk["text"]
+        cost = count_tokens(text) + (separator_tokens if parts else 0)
+        if used_tokens + cost > token_budget:
+            continue
+        parts.append(text)
+        used_tokens += cost
+        included += 1
+
+    breakdown = {
+        "context_budget": token_budget,
+        "context_tokens": used_tokens,
+        "hits_retrieved": len(hits),
+        "chunks_unique": len(chunks),
+        "chunks_included": included,
+        "chunks_dropped": len(chunks) - included,
+    }
+    return CHUNK_SEPARATOR.join(parts), breakdown
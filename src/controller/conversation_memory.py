@@ -0,0 +1,129 @@
+"""Embedding retrieval over a session's past turns: prompts carry the recent messages plus the earlier ones relevant to the query"""
+
+import os
+import re
+import zlib
+import numpy as np
+
+from controller.messages import Message
+
+CONVERSATION_RECENT_MESSAGES = int(os.getenv("CONVERSATION_RECENT_MESSAGES", "4"))
+CONVERSATION_RECALL_K = int(os.getenv("CONVERSATION_RECALL_K", "3"))
+CONVERSATION_HISTORY_TOKENS = int(os.getenv("CONVERSATION_HISTORY_TOKENS", "400"))
+CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", "500"))
+# Sentence encoder for the turn embeddings; hashed word features when unset
+CONVERSATION_EMBEDDING_MODEL = os.getenv("CONVERSATION_EMBEDDING_MODEL")
+
+WORD_PATTERN = re.compile(r"[a-z0-9$%]+")
+# Words every turn shares; left in, they make unrelated turns look similar
+STOPWORDS = frozenset({
+    "a", "an", "the", "and", "or", "but", "if", "of", "to", "in", "on", "for", "with", "at", "by", "from", "as",
+    "is", "are", "was", "were", "be", "been", "do", "does", "did", "have", "has", "had", "it", "its", "this",
+    "that", "these", "those", "i", "we", "you", "they", "our", "your", "their", "my", "me", "us", "what",
+    "which", "how", "can", "could", "would", "should", "will", "so", "about", "there", "any", "some", "not"
+})
+
+
+class HashingEmbedder:
+    """Signed feature hashing of lowercased words and word pairs into a fixed number of dimensions, L2-normalized"""
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = [word for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+            for feature in words + [f"{first} {second}" for first, second in zip(words, words[1:])]:
+                digest = zlib.crc32(feature.encode())
+                vectors[row, digest % self.dimensions] += 1.0 if digest & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+_embedder = None
+
+
+def get_embedder():
+    """Embedder shared by every session's memory"""
+    global _embedder
+    if _embedder is None:
+        if CONVERSATION_EMBEDDING_MODEL:
+            from controller.retrieval_backends import SentenceEmbedder
+            _embedder = SentenceEmbedder(CONVERSATION_EMBEDDING_MODEL)
+        else:
+            _embedder = HashingEmbedder()
+    return _embedder
+
+
+class ConversationMemory:
+    def __init__(self, recent_messages: int = CONVERSATION_RECENT_MESSAGES, recall_k: int = CONVERSATION_RECALL_K,
+                 token_budget: int = CONVERSATION_HISTORY_TOKENS, max_messages: int = CONVERSATION_MAX_MESSAGES,
+                 embedder=None):
+        self.recent_messages = recent_messages
+        self.recall_k = recall_k
+        self.token_budget = token_budget
+        self.max_messages = max_messages
+        self.embedder = embedder or get_embedder()
+        self.messages: list[Message] = []
+        # Rows [0, len(messages)) are in use; capacity doubles as the conversation grows
+        self.vectors: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def add(self, message: Message):
+        vector = self.embedder.encode([message.content])[0]
+        size = len(self.messages)
+        if self.vectors is None:
+            self.vectors = np.zeros((16, vector.shape[0]), dtype=np.float32)
+        elif size == self.vectors.shape[0]:
+            self.vectors = np.vstack([self.vectors, np.zeros_like(self.vectors)])
+        self.vectors[size] = vector
+        self.messages.append(message)
+
+        if len(self.messages) > self.max_messages:
+            # In place, so callers holding the messages list see the eviction
+            evicted = len(self.messages) - self.max_messages
+            del self.messages[:evicted]
+            self.vectors[:len(self.messages)] = self.vectors[evicted:evicted + len(self.messages)]
+
+    def restore(self, messages: list[Message], vectors: np.ndarray | None = None):
+        """
+        Reload a serialized session's messages. They are re-embedded when no vectors were stored, or when
+        the stored ones come from an embedder of another dimension than this memory's.
+        """
+        del self.messages[:]
+        self.vectors = None
+        if vectors is None or len(vectors) != len(messages) or vectors.shape[1] != self.embedder.dimensions:
+            for message in messages:
+                self.add(message)
+            return
+        self.messages.extend(messages)
+        self.vectors = np.array(vectors, dtype=np.float32)
+
+    def select(self, query: str) -> list[Message]:
+        """The last recent_messages messages plus up to recall_k relevant earlier ones, in order, within the token budget"""
+        size = len(self.messages)
+        recent_start = max(0, size - self.recent_messages)
+
+        chosen, used = [], 0
+        # Newest first, so a tight budget drops the oldest of the recent messages
+        for position in range(size - 1, recent_start - 1, -1):
+            if used + self.messages[position].tokens > self.token_budget and chosen:
+                break
+            chosen.append(position)
+            used += self.messages[position].tokens
+
+        if recent_start > 0 and self.recall_k > 0 and len(chosen) == size - recent_start:
+            scores = self.vectors[:recent_start] @ self.embedder.encode([query])[0]
+            k = min(self.recall_k, recent_start)
+            top = np.argpartition(-scores, k - 1)[:k]
+            for position in top[np.argsort(-scores[top])]:
+                if scores[position] <= 0:
+                    break
+                if used + self.messages[position].tokens <= self.token_budget:
+                    chosen.append(int(position))
+                    used += self.messages[position].tokens
+
+        return [self.messages[position] for position in sorted(chosen)]
@@ -0,0 +1,230 @@
+"""Batch API execution of the /data/process page extractions; LocalBatchRunner runs the same batch file in-process"""
+
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Literal
+from langchain_core.documents import Document
+from pydantic import BaseModel
+
+from data_processing.generate_insurance_plans import (
+    client,
+    collection,
+    SESSION_ID,
+    build_extraction_model,
+    model_registry
+)
+from data_processing.model_registry import CompiledModels, text_format_param
+from models.schemas import SummaryResponse
+
+BATCH_DIR = Path(os.getenv("BATCH_DIR", "batches"))
+BATCH_POLL_INTERVAL = int(os.getenv("BATCH_POLL_INTERVAL", "30"))
+
+
+def batch_request(custom_id: str, body: dict) -> dict:
+    return {"custom_id": custom_id, "method": "POST", "url": "/v1/responses", "body": body}
+
+
+def metadata_request_body(page_content: str, text_format: dict) -> dict:
+    with open("prompts/metadata.txt") as f:
+        metadata_prompt = f.read()
+    return {
+        "model": "o4-mini",
+        "input": [{"role": "user", "content": f"{metadata_prompt}\n\n{page_content}"}],
+        "user": SESSION_ID,
+        "reasoning": {"effort": "medium"},
+        "text": {"format": text_format}
+    }
+
+
+def extraction_request_body(page_content: str, text_format: dict) -> dict:
+    with open("prompts/plan_extraction.txt") as f:
+        extraction_prompt = f.read()
+    return {
+        "model": "o4-mini",
+        "input": [{"role": "user", "content": f"{extraction_prompt}\n\n{page_content}"}],
+        "user": SESSION_ID,
+        "reasoning": {"effort": "medium"},
+        "text": {"format": text_format}
+    }
+
+
+def summary_request_body(page_content: str, plan_name: str, text_format: dict) -> dict:
+    with open("prompts/plan_summary.txt") as f:
+        prompt_template = f.read()
+    return {
+        "model": "gpt-4o-mini",
+        "input": [{"role": "user", "content": prompt_template.format(plan_name=plan_name, raw_text=page_content)}],
+        "user": SESSION_ID,
+        "text": {"format": text_format}
+    }
+
+
+def write_batch_file(requests: list[dict], name: str) -> Path:
+    BATCH_DIR.mkdir(parents=True, exist_ok=True)
+    path = BATCH_DIR / f"{name}-{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.jsonl"
+    with open(path, "w") as f:
+        for request in requests:
+            f.write(json.dumps(request) + "\n")
+    print(f"Wrote {len(requests)} batch requests to {path}")
+    return path
+
+
+def output_text(response_body: dict) -> str:
+    """Concatenate the output_text parts of a Responses API response body"""
+    texts = []
+    for item in response_body.get("output", []):
+        if item.get("type") != "message":
+            continue
+        for part in item.get("content", []):
+            if part.get("type") == "output_text":
+                texts.append(part.get("text", ""))
+    return "".join(texts)
+
+
+def parse_batch_results(lines: list[dict], Model: type[BaseModel]) -> dict[str, BaseModel]:
+    """Map custom_id to the parsed model, skipping failed requests"""
+    parsed = {}
+    for line in lines:
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            print(f"  Batch request {line.get('custom_id')} failed: {line.get('error') or response.get('status_code')}")
+            continue
+        try:
+            parsed[line["custom_id"]] = Model.model_validate_json(output_text(response["body"]))
+        except Exception as e:
+            print(f"  Could not parse batch result {line.get('custom_id')}: {e}")
+    return parsed
+
+
+class OpenAIBatchRunner:
+    """Submits a batch file to the OpenAI Batch API and waits for its results"""
+
+    def __init__(self, client=client, poll_interval: int = BATCH_POLL_INTERVAL):
+        self.client = client
+        self.poll_interval = poll_interval
+
+    def run(self, batch_path: Path) -> list[dict]:
+        with open(batch_path, "rb") as f:
+            batch_file = self.client.files.create(file=f, purpose="batch")
+
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/responses",
+            completion_window="24h",
+            metadata={"source": batch_path.name}
+        )
+        print(f"Submitted batch {batch.id} ({batch_path.name})")
+
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(self.poll_interval)
+            batch = self.client.batches.retrieve(batch.id)
+            counts = batch.request_counts
+            print(f"  Batch {batch.id}: {batch.status} ({counts.completed if counts else 0}/{counts.total if counts else '?'})")
+
+        if batch.status != "completed" or not batch.output_file_id:
+            raise Exception(f"Batch {batch.id} ended with status {batch.status}")
+
+        content = self.client.files.content(batch.output_file_id).text
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+class LocalBatchRunner:
+    """
+    Executes a batch file in-process, producing output lines in the Batch API format.
+    By default each request is sent to responses.create; tests pass a responder that returns
+    a canned response body instead.
+    """
+
+    def __init__(self, responder: Callable[[str, dict], dict] | None = None):
+        self.responder = responder or (lambda custom_id, body: client.responses.create(**body).model_dump())
+
+    def run(self, batch_path: Path) -> list[dict]:
+        results = []
+        with open(batch_path) as f:
+            for line in f:
+                request = json.loads(line)
+                try:
+                    body = self.responder(request["custom_id"], request["body"])
+                    results.append({"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}, "error": None})
+                except Exception as e:
+                    results.append({"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}})
+        return results
+
+
+def create_batch_runner(name: str | None = None):
+    name = name or os.getenv("BATCH_RUNNER", "openai")
+    if name == "local":
+        return LocalBatchRunner()
+    return OpenAIBatchRunner()
+
+
+def process_pages_in_batch(cleaned_plans: list[Document], models: CompiledModels | None = None,
+                           extraction_mode: Literal["separate", "combined"] = "separate", runner=None) -> int:
+    """
+    Batch equivalent of process_pages_to_mongodb.
+    "combined" needs a single batch; "separate" runs a metadata batch and then a summary batch,
+    because each summary prompt needs the plan type extracted by the metadata call.
+    """
+    runner = runner or create_batch_runner()
+
+    # Schemas are built once per model version
+    models = models or model_registry.get()
+    Metadata = models.Metadata
+    ExtractionModel = models.derived_model("PlanExtraction", lambda: build_extraction_model(models.Metadata))
+    metadata_format = models.text_format("DynamicMetaDataTags", Metadata)
+    extraction_format = models.text_format("PlanExtraction", ExtractionModel)
+    summary_format = text_format_param(SummaryResponse)
+
+    print(f"\n=== BATCH PROCESSING {len(cleaned_plans)} PAGES ({extraction_mode} extraction) ===")
+
+    pages = {f"page-{idx}": doc for idx, doc in enumerate(cleaned_plans)}
+    summaries: dict[str, str] = {}
+
+    if extraction_mode == "combined":
+        requests = [batch_request(page_id, extraction_request_body(doc.page_content, extraction_format)) for page_id, doc in pages.items()]
+        results = parse_batch_results(runner.run(write_batch_file(requests, "plan-extraction")), ExtractionModel)
+        metadata_by_page = {}
+        for page_id, parsed in results.items():
+            metadata = parsed.model_dump()
+            summaries[page_id] = metadata.pop("summary")
+            metadata_by_page[page_id] = metadata
+    else:
+        requests = [batch_request(page_id, metadata_request_body(doc.page_content, metadata_format)) for page_id, doc in pages.items()]
+        results = parse_batch_results(runner.run(write_batch_file(requests, "plan-metadata")), Metadata)
+        metadata_by_page = {page_id: parsed.model_dump() for page_id, parsed in results.items()}
+
+        requests = [
+            batch_request(page_id, summary_request_body(pages[page_id].page_content, metadata.get("Plan Type", "Unknown Plan"), summary_format))
+            for page_id, metadata in metadata_by_page.items()
+        ]
+        if requests:
+            summary_results = parse_batch_results(runner.run(write_batch_file(requests, "plan-summary")), SummaryResponse)
+            summaries = {page_id: parsed.summary for page_id, parsed in summary_results.items()}
+
+    documents = []
+    for page_id, metadata in metadata_by_page.items():
+        doc = pages[page_id]
+        page_content = doc.page_content
+        summary = summaries.get(page_id)
+        if summary is None:
+            # Same fallback generate_document_summary uses when summarization fails
+            summary = page_content[:3000] + "..." if len(page_content) > 3000 else page_content
+        documents.append({
+            **metadata,
+            "raw_text": page_content,
+            "source_url": doc.metadata.get("source", page_id),
+            "summary": summary
+        })
+
+    if not documents:
+        print("No batch results to upload.")
+        return 0
+
+    result = collection.insert_many(documents)
+    print(f"\n=== BATCH UPLOAD COMPLETE ===")
+    print(f"Successfully uploaded {len(result.inserted_ids)}/{len(cleaned_plans)} documents")
+    return len(result.inserted_ids)
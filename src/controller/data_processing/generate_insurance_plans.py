@@ -1,17 +1,21 @@
 import data_processing.smart_scraper as smart_scraper
+from data_processing.model_registry import ModelRegistry, CompiledModels
+from controller.llm_client import create_openai_client
 from langchain_core.documents import Document
 from langchain_community.document_transformers.openai_functions import (
     create_metadata_tagger,
 )
 from langchain_openai import ChatOpenAI
-from pinecone import Pinecone
-from openai import OpenAI
 from dotenv import load_dotenv
 from pathlib import Path
 from pydantic import BaseModel, create_model
 from typing import Literal
 import os
+import re
 import json
+import hashlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
@@ -41,6 +45,7 @@ mongo_client = MongoClient(MONGODB_URI, server_api=ServerApi('1'))
 db = mongo_client['cigna_insurance']
 collection = db['insurance_plans']
 models_collection = db['insurance_models']  
+analysis_cache_collection = db['plan_analysis_cache']
 
 
 try:
@@ -61,8 +66,10 @@ NAMESPACE = os.getenv("NAMESPACE")
 HTML_CACHE_DIR = Path(os.getenv("HTML_CACHE_DIR"))
 
 # SETUP 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = create_openai_client(OPENAI_API_KEY)
 SESSION_ID = "generate_insurance_plans_id"  # For development, use a fixed session ID. In production, generate a new one each time.
+PLAN_ANALYSIS_MODEL = "gpt-4.1"
+PLAN_ANALYSIS_WORKERS = int(os.getenv("PLAN_ANALYSIS_WORKERS", "8"))
 plan_links = [
     "https://www.cigna.com/individuals-families/shop-plans/plans-through-employer/open-access-plus", # OAP
     "https://www.cigna.com/employers/medical-plans/localplus?gclid=CjwKCAjw7MLDBhAuEiwAIeXGIYKFxgNbYP3kz7KY-srG0rulaFAcLz9yaLzV5vG7gzf2erJQgCzeaxoCmaQQAvD_BwE", # LP
@@ -119,6 +126,9 @@ def generate_pydantic_models(required_fields: list[str], key_differences: list[l
 
     return DynamicInsurancePlanModel, DynamicMetadataTags
 
+# Compiled models per insurance_models version, shared by every extraction call in this process
+model_registry = ModelRegistry(models_collection, generate_pydantic_models)
+
 # Generate metadata for current document
 def generate_metadata_tagger(Metadata: BaseModel):
     llm = ChatOpenAI(temperature=0, model="gpt-4.1")
@@ -128,24 +138,150 @@ def generate_metadata_tagger(Metadata: BaseModel):
 # MAIN FUNCTIONS
 
 # Generate fields for insurance models and save them to MongoDB
-def plan_analysis(cleaned_plans: list[Document]) -> str:
+def plan_analysis(cleaned_plans: list[Document], strategy: Literal["map_reduce", "single"] = "map_reduce") -> str:
+    """
+    Discover the insurance model schema from the scraped plans and save it to MongoDB.
+    "map_reduce" analyzes each page separately (cached by content hash) and merges the results,
+    "single" sends every page to the model in one call.
+    """
+    if strategy == "single":
+        parsed = plan_analysis_single_call(cleaned_plans)
+    else:
+        parsed = plan_analysis_map_reduce(cleaned_plans)
 
+    # Save to MongoDB instead of local file
+    models_id = save_models_to_mongodb(parsed.required_fields, parsed.key_differences)
+    return models_id
+
+def plan_analysis_single_call(cleaned_plans: list[Document]) -> PlanAnalysis:
     all_docs = aggregate_page_contents(cleaned_plans)
 
     with open("prompts/plan_analysis.txt") as f:
-        prompt = f.read()
+        prompt = f.read().replace("{all_docs}", all_docs)
 
     raw_response = client.responses.parse(
-        model="gpt-4.1",
+        node="plan_analysis",
+        model=PLAN_ANALYSIS_MODEL,
         input=[{"role": "developer", "content": prompt}],
         user=SESSION_ID,
         text_format=PlanAnalysis)
 
+    return raw_response.output_parsed
+
+def page_content_hash(page_content: str, prompt: str) -> str:
+    """Cache key for a map result, changes when the page, the map prompt or the model changes"""
+    return hashlib.sha256(f"{PLAN_ANALYSIS_MODEL}\n{prompt}\n{page_content.strip()}".encode()).hexdigest()
+
+def analyze_single_page(page_content: str, prompt: str) -> PlanAnalysis:
+    """Map step: candidate fields and key differences for one page, cached in MongoDB by content hash"""
+    content_hash = page_content_hash(page_content, prompt)
+
+    cached = analysis_cache_collection.find_one({"content_hash": content_hash})
+    if cached:
+        print(f"  MAP CACHE HIT: {content_hash[:12]}")
+        return PlanAnalysis(required_fields=cached["required_fields"], key_differences=cached["key_differences"])
+
+    print(f"  MAP CACHE MISS: {content_hash[:12]}")
+    raw_response = client.responses.parse(
+        node="plan_analysis",
+        model=PLAN_ANALYSIS_MODEL,
+        input=[{"role": "developer", "content": f"{prompt}\n{page_content}"}],
+        user=SESSION_ID,
+        text_format=PlanAnalysis)
     parsed = raw_response.output_parsed
 
-    # Save to MongoDB instead of local file
-    models_id = save_models_to_mongodb(parsed.required_fields, parsed.key_differences)
-    return models_id
+    analysis_cache_collection.update_one(
+        {"content_hash": content_hash},
+        {"$set": {
+            "content_hash": content_hash,
+            "required_fields": parsed.required_fields,
+            "key_differences": parsed.key_differences,
+            "created_at": datetime.now()
+        }},
+        upsert=True
+    )
+    return parsed
+
+def normalize_label(label: str) -> str:
+    """Comparison key for field names, dimensions and value labels"""
+    return " ".join(re.findall(r"[a-z0-9+]+", label.lower().replace(",", "")))
+
+def canonical_label(spellings: Counter) -> str:
+    """Most frequent spelling of a label, ties broken alphabetically so the result is deterministic"""
+    return min(spellings.items(), key=lambda item: (-item[1], item[0]))[0]
+
+def reduce_plan_analyses(analyses: list[PlanAnalysis], min_values: int = 2) -> PlanAnalysis:
+    """
+    Reduce step: merge per-page results deterministically.
+    Fields and dimensions are deduplicated by normalized name and ordered by how many pages
+    reported them, then by first appearance. Value labels are deduplicated the same way.
+    Dimensions with fewer than min_values distinct values do not distinguish plans and are dropped.
+    """
+    field_keys: dict[str, None] = {}
+    field_pages = Counter()
+    dimension_spellings: dict[str, Counter] = {}
+    dimension_pages = Counter()
+    dimension_values: dict[str, dict[str, Counter]] = {}
+    first_seen: dict[str, int] = {}
+
+    for analysis in analyses:
+        page_fields = set()
+        for field in analysis.required_fields:
+            key = normalize_label(field).replace(" ", "_")
+            if not key:
+                continue
+            field_keys.setdefault(key)
+            first_seen.setdefault(f"field:{key}", len(first_seen))
+            page_fields.add(key)
+        field_pages.update(page_fields)
+
+        page_dimensions = set()
+        for difference in analysis.key_differences:
+            if not difference:
+                continue
+            name = difference[0].strip()
+            key = normalize_label(name)
+            if not key:
+                continue
+            dimension_spellings.setdefault(key, Counter())[name] += 1
+            first_seen.setdefault(f"dimension:{key}", len(first_seen))
+            page_dimensions.add(key)
+
+            values = dimension_values.setdefault(key, {})
+            for value in difference[1:]:
+                value = value.strip()
+                value_key = normalize_label(value)
+                if not value_key:
+                    continue
+                values.setdefault(value_key, Counter())[value] += 1
+                first_seen.setdefault(f"value:{key}:{value_key}", len(first_seen))
+        dimension_pages.update(page_dimensions)
+
+    required_fields = sorted(field_keys, key=lambda key: (-field_pages[key], first_seen[f"field:{key}"]))
+
+    key_differences = []
+    for key in sorted(dimension_spellings, key=lambda key: (-dimension_pages[key], first_seen[f"dimension:{key}"])):
+        values = dimension_values.get(key, {})
+        if len(values) < min_values:
+            continue
+        ordered_values = sorted(values, key=lambda value_key: first_seen[f"value:{key}:{value_key}"])
+        key_differences.append([canonical_label(dimension_spellings[key])] + [canonical_label(values[v]) for v in ordered_values])
+
+    return PlanAnalysis(required_fields=required_fields, key_differences=key_differences)
+
+def plan_analysis_map_reduce(cleaned_plans: list[Document]) -> PlanAnalysis:
+    """Analyze pages in parallel, then merge their candidate schemas"""
+    with open("prompts/plan_analysis_map.txt") as f:
+        map_prompt = f.read()
+
+    print(f"Running schema discovery map step on {len(cleaned_plans)} pages...")
+    with ThreadPoolExecutor(max_workers=PLAN_ANALYSIS_WORKERS) as executor:
+        # map keeps input order, so the reduce step sees the same order on every run
+        analyses = list(executor.map(lambda doc: analyze_single_page(doc.page_content, map_prompt), cleaned_plans))
+
+    merged = reduce_plan_analyses(analyses)
+    print(f"Reduced to {len(merged.required_fields)} required fields and {len(merged.key_differences)} key differences")
+    return merged
 
 # Fit info into models
 def fit_info_into_models(cleaned_plans: list[Document], InsuranceModel: BaseModel, Metadata: BaseModel):
@@ -159,6 +295,7 @@ def fit_info_into_models(cleaned_plans: list[Document], InsuranceModel: BaseMode
 
     for idx, doc in enumerate(cleaned_plans, 1):
         IM_raw_response = client.responses.parse(
+        node="fit_info_into_models",
         model="gpt-4.1",
         input=[{"role": "developer", "content": f"{insurance_model_prompt}\n{doc.page_content}"}],
         user=SESSION_ID,
@@ -173,6 +310,7 @@ def fit_info_into_models(cleaned_plans: list[Document], InsuranceModel: BaseMode
         # print("--- End of Plan ---\n")
 
         MD_raw_response = client.responses.parse(
+        node="fit_info_into_models",
         model="gpt-4.1",
         input=[{"role": "developer", "content": f"{metadata_prompt}\n{doc.page_content}"}],
         user=SESSION_ID,
@@ -192,7 +330,7 @@ def fit_info_into_models(cleaned_plans: list[Document], InsuranceModel: BaseMode
 
     return insurance_plans
 
-def generate_page_metadata(page_content: str, page_url: str) -> dict:
+def generate_page_metadata(page_content: str, page_url: str, models: CompiledModels | None = None) -> dict:
     """
     Generate metadata for a single scraped page using OpenAI reasoning model.
     Returns metadata as a dictionary.
@@ -204,11 +342,12 @@ def generate_page_metadata(page_content: str, page_url: str) -> dict:
 
     try:
         raw_response = client.responses.parse(
+            node="generate_page_metadata",
             model="o4-mini",
             input=[{"role": "user", "content": f"{metadata_prompt}\n\n{page_content}"}],
             user=SESSION_ID,
             reasoning={"effort": "medium"},
-            text_format=DynamicMetaDataTags
+            text_format=(models or model_registry.get()).Metadata
         )
         
         metadata = raw_response.output_parsed.model_dump()
@@ -238,6 +377,7 @@ def generate_document_summary(page_content: str, plan_name: str) -> str:
 
     try:
         response = client.responses.parse(
+            node="generate_document_summary",
             model="gpt-4o-mini",
             input=[{"role": "user", "content": prompt}],
             user=SESSION_ID,
@@ -252,9 +392,48 @@ def generate_document_summary(page_content: str, plan_name: str) -> str:
         print(f"    Error generating summary: {e}")
         return page_content[:3000] + "..." if len(page_content) > 3000 else page_content
 
-def upload_to_mongodb(page_content: str, metadata: dict, page_url: str):
+def build_extraction_model(Metadata: type[BaseModel]) -> type[BaseModel]:
+    """Composite schema with every metadata field plus the plan summary, for single-call extraction"""
+    return create_model("PlanExtraction", __base__=Metadata, summary=(str, ...))
+
+def generate_page_extraction(page_content: str, page_url: str, models: CompiledModels | None = None) -> tuple[dict, str | None]:
+    """
+    Generate metadata and summary for a single scraped page in one structured-output call,
+    so the page content is only sent to the API once.
+    Returns the metadata dictionary and the summary.
+    """
+    print(f"Generating metadata and summary for: {page_url}")
+
+    with open("prompts/plan_extraction.txt") as f:
+        extraction_prompt = f.read()
+
+    # Built once per model version, not once per page
+    models = models or model_registry.get()
+    ExtractionModel = models.derived_model("PlanExtraction", lambda: build_extraction_model(models.Metadata))
+
+    try:
+        raw_response = client.responses.parse(
+            node="generate_page_extraction",
+            model="o4-mini",
+            input=[{"role": "user", "content": f"{extraction_prompt}\n\n{page_content}"}],
+            user=SESSION_ID,
+            reasoning={"effort": "medium"},
+            text_format=ExtractionModel
+        )
+
+        metadata = raw_response.output_parsed.model_dump()
+        summary = metadata.pop("summary")
+        print(f"  Generated metadata with {len(metadata)} fields and summary ({len(summary)} characters)")
+        return metadata, summary
+
+    except Exception as e:
+        print(f"  Error generating metadata and summary: {e}")
+        return {}, None
+
+def upload_to_mongodb(page_content: str, metadata: dict, page_url: str, summary: str | None = None):
     """
     Upload a document to MongoDB with metadata, raw text content, and AI-generated summary.
+    The summary is generated here unless it was already extracted together with the metadata.
     """
     try:
         # Create document with metadata fields + raw_text field
@@ -263,8 +442,9 @@ def upload_to_mongodb(page_content: str, metadata: dict, page_url: str):
         document['source_url'] = page_url
         
         # Generate and add summary
-        plan_name = metadata.get('Plan Type', 'Unknown Plan')
-        summary = generate_document_summary(page_content, plan_name)
+        if summary is None:
+            plan_name = metadata.get('Plan Type', 'Unknown Plan')
+            summary = generate_document_summary(page_content, plan_name)
         document['summary'] = summary
         
         # Insert into MongoDB collection
@@ -362,22 +542,28 @@ def save_models_to_mongodb(required_fields: list[str], key_differences: list[lis
                 }
             )
             print(f"Updated models in MongoDB. Modified count: {result.modified_count}")
+            model_registry.refresh()
             return str(existing["_id"])
         else:
             # Insert new
             result = models_collection.insert_one(models_document)
             print(f"Saved new models to MongoDB with ID: {result.inserted_id}")
+            model_registry.refresh()
             return str(result.inserted_id)
     
     except Exception as e:
         print(f"Error saving models to MongoDB: {e}")
         raise
 
-def process_pages_to_mongodb(cleaned_plans: list[Document]):
+def process_pages_to_mongodb(cleaned_plans: list[Document], models: CompiledModels | None = None,
+                             extraction_mode: Literal["separate", "combined"] = "separate"):
     """
     Process each scraped page individually and upload to MongoDB.
+    "separate" makes one metadata call and one summary call per page,
+    "combined" extracts both in a single call.
     """
-    print(f"\n=== PROCESSING {len(cleaned_plans)} PAGES TO MONGODB ===")
+    print(f"\n=== PROCESSING {len(cleaned_plans)} PAGES TO MONGODB ({extraction_mode} extraction) ===")
+    models = models or model_registry.get()
     
     uploaded_count = 0
     
@@ -386,11 +572,14 @@ def process_pages_to_mongodb(cleaned_plans: list[Document]):
         page_url = doc.metadata.get('source', f'page_{idx}')
         
         # Generate metadata for this page
-        metadata = generate_page_metadata(doc.page_content, page_url)
+        if extraction_mode == "combined":
+            metadata, summary = generate_page_extraction(doc.page_content, page_url, models)
+        else:
+            metadata, summary = generate_page_metadata(doc.page_content, page_url, models), None
         
         if metadata:
             # Upload to MongoDB
-            doc_id = upload_to_mongodb(doc.page_content, metadata, page_url)
+            doc_id = upload_to_mongodb(doc.page_content, metadata, page_url, summary)
             if doc_id:
                 uploaded_count += 1
         
@@ -416,11 +605,8 @@ if __name__ == "__main__":
         print("Using existing insurance models from MongoDB...")
     
     print("\n=== PART 3: LOAD MODEL INPUTS FROM MONGODB ===")
-    data = load_models_from_mongodb()
-
-    DynamicInsurancePlanModel, DynamicMetaDataTags = generate_pydantic_models(
-    required_fields=data["required_fields"],
-    key_differences=data["key_differences"])
+    models = model_registry.get()
+    DynamicInsurancePlanModel, DynamicMetaDataTags = models.InsuranceModel, models.Metadata
 
     print("\n\nMODEL FIELDS:\n\n")
     for model in [DynamicInsurancePlanModel, DynamicMetaDataTags]:
@@ -429,7 +615,7 @@ if __name__ == "__main__":
         print("\n\n")
 
     print("\n=== PART 4: PROCESS PAGES AND UPLOAD TO MONGODB ===")
-    uploaded_count = process_pages_to_mongodb(clean_data)
+    uploaded_count = process_pages_to_mongodb(clean_data, models)
     
     print(f"\n=== PROCESSING COMPLETE ===")
     print(f"Total pages processed: {len(clean_data)}")
@@ -0,0 +1,179 @@
+"""Compiled insurance models per MongoDB revision, cached in memory and under MODEL_CACHE_DIR"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+from pydantic import BaseModel
+
+MODEL_CACHE_DIR = Path(os.getenv("MODEL_CACHE_DIR", "model_cache"))
+MODEL_REFRESH_INTERVAL = float(os.getenv("MODEL_REFRESH_INTERVAL", "30"))
+
+
+def _strict_schema(node, defs: dict):
+    """Structured outputs' strict dialect: closed objects, every property required, no defaults"""
+    if isinstance(node, list):
+        return [_strict_schema(item, defs) for item in node]
+    if not isinstance(node, dict):
+        return node
+    if "$ref" in node and len(node) > 1:
+        # Strict mode does not allow keywords next to $ref; inline the definition instead
+        ref = node["$ref"].split("/")[-1]
+        node = {**defs[ref], **{key: value for key, value in node.items() if key != "$ref"}}
+    strict = {key: _strict_schema(value, defs) for key, value in node.items() if key != "default"}
+    if strict.get("type") == "object" and "properties" in strict:
+        strict["additionalProperties"] = False
+        strict["required"] = list(strict["properties"])
+    return strict
+
+
+def text_format_param(Model: type[BaseModel]) -> dict:
+    """Responses API text format (strict JSON schema) for a Pydantic model"""
+    schema = Model.model_json_schema()
+    return {
+        "type": "json_schema",
+        "name": Model.__name__,
+        "schema": _strict_schema(schema, schema.get("$defs", {})),
+        "strict": True
+    }
+
+
+def definition_revision(doc: dict) -> str:
+    """Version plus a hash of the document id and last write time; changes whenever the definition does"""
+    written_at = doc.get("updated_at") or doc.get("created_at")
+    digest = hashlib.sha256(f"{doc['_id']}:{written_at}".encode()).hexdigest()[:12]
+    return f"v{doc.get('version', 1)}_{digest}"
+
+
+class CompiledModels:
+    """Pydantic classes and structured-output formats for one version of the insurance models"""
+
+    def __init__(self, version: int, definition: dict, InsuranceModel: type[BaseModel], Metadata: type[BaseModel]):
+        self.version = version
+        self.definition = definition
+        self.InsuranceModel = InsuranceModel
+        self.Metadata = Metadata
+        self._derived: dict[str, type[BaseModel]] = {}
+        self._text_formats: dict[str, dict] = {}
+
+    def derived_model(self, name: str, build: Callable[[], type[BaseModel]]) -> type[BaseModel]:
+        """A model built from this version's classes (e.g. the combined extraction schema), built once"""
+        if name not in self._derived:
+            self._derived[name] = build()
+        return self._derived[name]
+
+    def text_format(self, name: str, Model: type[BaseModel]) -> dict:
+        """Structured-output JSON schema for one of this version's models, built once"""
+        if name not in self._text_formats:
+            self._text_formats[name] = text_format_param(Model)
+        return self._text_formats[name]
+
+
+class ModelRegistry:
+    def __init__(self, collection, compile_models: Callable[[list[str], list[list[str]]], tuple],
+                 cache_dir: Path = MODEL_CACHE_DIR, refresh_interval: float = MODEL_REFRESH_INTERVAL):
+        self.collection = collection
+        self.compile_models = compile_models
+        self.cache_dir = Path(cache_dir)
+        self.refresh_interval = refresh_interval
+        self._compiled: dict[str, CompiledModels] = {}
+        # (version, revision) of the definition last seen in MongoDB
+        self._current: tuple[int, str] | None = None
+        self._checked_at = 0.0
+        # Reentrant: get() holds it while from_definition compiles
+        self._lock = threading.RLock()
+
+    def _cache_path(self, revision: str) -> Path:
+        return self.cache_dir / f"insurance_models_{revision}.json"
+
+    def _write_cache(self, definition: dict):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._cache_path(definition["revision"])
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(definition, f)
+            tmp_path.replace(path)
+        except OSError as e:
+            print(f"Could not write model cache: {e}")
+
+    def _read_cache(self, revision: str) -> dict | None:
+        path = self._cache_path(revision)
+        if not path.exists():
+            return None
+        with open(path) as f:
+            definition = json.load(f)
+        return definition if definition.get("revision") == revision else None
+
+    def _latest(self) -> tuple[int, str] | None:
+        """Version and revision of the definition currently in MongoDB"""
+        doc = self.collection.find_one({"model_type": "insurance_models"}, {"version": 1, "created_at": 1, "updated_at": 1})
+        return (doc.get("version", 1), definition_revision(doc)) if doc else None
+
+    def _fetch_definition(self) -> dict:
+        """The definition MongoDB holds now, written to the disk cache under its revision"""
+        doc = self.collection.find_one({"model_type": "insurance_models"})
+        if not doc:
+            raise Exception("Insurance models not found in MongoDB")
+        definition = {
+            "version": doc.get("version", 1),
+            "revision": definition_revision(doc),
+            "required_fields": doc["required_fields"],
+            "key_differences": doc["key_differences"]
+        }
+        self._write_cache(definition)
+        return definition
+
+    def from_definition(self, definition: dict) -> CompiledModels:
+        """Compile a definition once per process, keyed by its revision"""
+        revision = definition["revision"]
+        with self._lock:
+            compiled = self._compiled.get(revision)
+            if compiled is None:
+                print(f"Compiling insurance models {revision}")
+                InsuranceModel, Metadata = self.compile_models(definition["required_fields"], definition["key_differences"])
+                compiled = CompiledModels(definition["version"], definition, InsuranceModel, Metadata)
+                self._compiled[revision] = compiled
+            return compiled
+
+    def get(self, version: int | None = None) -> CompiledModels:
+        """
+        Compiled models for the current MongoDB definition. The current revision is re-checked at most
+        every refresh_interval seconds. Raises if a specific version is requested and MongoDB holds another.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._current is None or now - self._checked_at > self.refresh_interval:
+                latest = self._latest()
+                if latest is None:
+                    raise Exception("Insurance models not found in MongoDB")
+                if self._current is None or latest[1] != self._current[1]:
+                    print(f"Insurance models {self._current[1] if self._current else None} -> {latest[1]}")
+                self._current = latest
+                self._checked_at = now
+
+            revision = self._current[1]
+            definition = None
+            if revision not in self._compiled:
+                definition = self._read_cache(revision)
+                if definition is None:
+                    # The document may have been replaced since the revision check; serve what it holds now
+                    definition = self._fetch_definition()
+                    revision = definition["revision"]
+                    self._current = (definition["version"], revision)
+
+            current_version = self._current[0]
+            if version is not None and version != current_version:
+                raise Exception(f"Requested insurance models version {version}, MongoDB holds version {current_version}")
+            if revision in self._compiled:
+                return self._compiled[revision]
+            return self.from_definition(definition)
+
+    def refresh(self) -> CompiledModels:
+        """Hot-swap to the latest version right away, used after save_models_to_mongodb"""
+        with self._lock:
+            self._current = None
+            return self.get()
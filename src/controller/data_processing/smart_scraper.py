@@ -4,8 +4,6 @@ from pathlib import Path
 import re
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from pinecone import Pinecone
-from openai import OpenAI
 from dotenv import load_dotenv
 import os
 from datetime import datetime
@@ -13,6 +11,12 @@ from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 import urllib.parse
 
+from controller.retrieval_backends import LocalBackend, DEFAULT_EMBEDDING_MODEL
+from controller.lexical_index import BM25Index
+from controller.cassette import record_index
+from controller.llm_client import create_openai_client
+from controller.http_transport import shared_pinecone_index
+
 
 """
 This file stores raw data scraped from the internet in both MongoDB and in Pinecone. 
@@ -31,13 +35,18 @@ PINECONE_INDEX_HOST = os.getenv("PINECONE_INDEX_HOST")
 NAMESPACE = os.getenv("NAMESPACE")
 HTML_CACHE_DIR = Path(os.getenv("HTML_CACHE_DIR"))
 MONGODB_URI = os.getenv("MONGODB_URI")
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "pinecone")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL)
+LOCAL_INDEX_INT8 = os.getenv("LOCAL_INDEX_INT8", "false").lower() == "true"
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "lexical_index")
 
 mongo_client = MongoClient(MONGODB_URI, server_api=ServerApi('1'))
 db = mongo_client['cigna_insurance']
 scraped_collection = db['scraped_documents']  # New collection for scraped documents
 
 # SETUP 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = create_openai_client(OPENAI_API_KEY)
 SESSION_ID = "development_id"  # For development, use a fixed session ID. In production, generate a new one each time.
 
 
@@ -242,19 +251,59 @@ def chunk_data(cleaned_docs_for_langchain: list[Document]) -> list[Document]:
     
     return document_chunks
 
+def prepare_records(document_chunks: list[Document]) -> list[dict]:
+    """Convert chunks into the flat records stored by every retrieval backend"""
+    records = []
+    for i, chunk_doc in enumerate(document_chunks):
+        metadata = chunk_doc.metadata
+
+        for key, value in metadata.items():
+            if not isinstance(value, (str, int, float, bool, list)):
+                metadata[key] = str(value) # Convert to string
+
+        records.append({
+            "id": f"doc-{i}",
+            "chunk_text": chunk_doc.page_content,
+            **metadata
+        })
+    return records
+
+def build_local_index(document_chunks: list[Document], index_dir: str = LOCAL_INDEX_DIR,
+                      quantize: bool = LOCAL_INDEX_INT8) -> list[dict]:
+    """Populate the local retrieval backend with the same records upload_data sends to Pinecone"""
+    print("BUILDING LOCAL VECTOR INDEX...")
+    records = prepare_records(document_chunks)
+    if not records:
+        print("No records to index after processing chunks.")
+        return records
+
+    # Embed with the model the agent's LocalBackend will query with
+    backend = LocalBackend(index_dir, embedding_model=LOCAL_EMBEDDING_MODEL, quantize=quantize)
+    backend.upsert(records)
+    return records
+
+def build_lexical_index(records: list[dict], index_dir: str = LEXICAL_INDEX_DIR):
+    """Build and save the BM25 index used for hybrid retrieval"""
+    print("BUILDING BM25 LEXICAL INDEX...")
+    lexical_index = BM25Index.build(records)
+    lexical_index.save(index_dir)
+    print(f"Indexed {len(records)} chunks with {len(lexical_index.vocabulary)} terms at {index_dir}")
+    return lexical_index
+
 def upload_data(document_chunks: list[Document], pinecone_api_key: str, pinecone_index_host: str, namespace: str = "ns2"):
     
-    print("SETTING UP PINECONE...")
-
-    # create pinecone client
-    try:
-        pc = Pinecone(api_key=pinecone_api_key)
-    except Exception as e:
-        print(f"ERROR: Failed to initialize Pinecone client: {e}")
+    if RETRIEVAL_BACKEND == "local":
+        # The agent searches the on-disk index instead of Pinecone
+        records = build_local_index(document_chunks)
+        if records:
+            build_lexical_index(records)
         return
 
+    print("SETTING UP PINECONE...")
+
+    # Reuse the process-wide Pinecone client and its connection pool
     try:
-        index = pc.Index(host=PINECONE_INDEX_HOST)
+        index = record_index(shared_pinecone_index(pinecone_api_key, PINECONE_INDEX_HOST))
         print(f"Successfully connected to index")
     except Exception as e:
         print(f"ERROR: Failed to connect to Pinecone index: {e}")
@@ -262,19 +311,7 @@ def upload_data(document_chunks: list[Document], pinecone_api_key: str, pinecone
 
     # prepare records for upsert
     print("PREPARING RECORDS FOR PINECONE...")
-    records_for_pinecone = []
-    for i, chunk_doc in enumerate(document_chunks):
-        pinecone_metadata = chunk_doc.metadata
-
-        for key, value in pinecone_metadata.items():
-            if not isinstance(value, (str, int, float, bool, list)):
-                pinecone_metadata[key] = str(value) # Convert to string
-
-        records_for_pinecone.append({
-            "id": f"doc-{i}",
-            "chunk_text": chunk_doc.page_content,
-            **pinecone_metadata
-        })
+    records_for_pinecone = prepare_records(document_chunks)
 
     if not records_for_pinecone:
         print("No records to upload after processing chunks.")
@@ -290,6 +327,9 @@ def upload_data(document_chunks: list[Document], pinecone_api_key: str, pinecone
         print("Please check the `batch_upsert_to_pinecone` function and the `index.upsert_records` call's compatibility with your Pinecone setup.")
         return
 
+    # Only once Pinecone holds the records, so the lexical index never returns ids the dense index lacks
+    build_lexical_index(records_for_pinecone)
+
     try:
         stats = index.describe_index_stats()
         print("Pinecone index stats after upload attempt:")
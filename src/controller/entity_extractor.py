@@ -0,0 +1,141 @@
+"""Entity extractors for SessionState.extract_entities: BERT CoNLL NER and a domain gazetteer matched by one trie-shaped regex"""
+
+import json
+import re
+from abc import ABC, abstractmethod
+
+from controller.slot_extractor import SIZE_PATTERNS, SOLO_PATTERN, find_states, parse_number, trie_pattern
+
+# key_differences values that say nothing on their own ("Required", "Yes") are not entities
+GENERIC_VALUES = frozenset({
+    "required", "not required", "optional", "included", "not included", "yes", "no", "available",
+    "not available", "varies by plan", "all sizes", "not covered", "medical network"
+})
+
+# Terms users say that the key_differences values do not spell out, with the label they belong to
+EXTRA_TERMS = {
+    "Plan Type": {"HDHP": "HDHP", "high deductible": "HDHP", "high deductible health plan": "HDHP", "EPO": "EPO",
+                  "Open Access": "OAP (Open Access Plus)", "Local Plus": "LocalPlus", "Sure Fit": "SureFit"},
+    "Account Option": {"HSA": "HSA", "HRA": "HRA", "FSA": "FSA", "health savings account": "HSA",
+                       "health reimbursement account": "HRA", "flexible spending account": "FSA"},
+    "Network Type": {"nationwide": "National", "national network": "National", "local network": "Local"},
+    "Provider Network Access": {"out-of-network": "Out-of-network", "in-network": "In-network"},
+    "Funding Option": {"self-funded": "Self-Funded (ASO)", "ASO": "Self-Funded (ASO)", "level funded": "Level Funded",
+                       "fully insured": "Fully Insured"},
+    "Benefit Term": {term: term for term in ("deductible", "copay", "coinsurance", "premium", "out-of-pocket maximum",
+                                             "referral", "PCP", "primary care", "specialist", "pharmacy",
+                                             "prescription", "urgent care", "emergency room", "dental", "vision")},
+}
+
+MONEY_PATTERN = re.compile(r"\$\s?\d[\d,]*(?:\.\d+)?(?:\s?(?:k|thousand|million))?", re.IGNORECASE)
+PERCENT_PATTERN = re.compile(r"\b\d+(?:\.\d+)?\s?(?:%|percent\b)", re.IGNORECASE)
+PARENTHESISED = re.compile(r"^(.*?)\s*\((.*)\)\s*$")
+
+
+def _normalize(term: str) -> str:
+    return re.sub(r"[\s-]+", "", term.lower())
+
+
+class EntityExtractor(ABC):
+    """Interface shared by all entity extractors"""
+
+    @abstractmethod
+    def extract(self, text: str) -> list[dict]:
+        ...
+
+
+class BertEntityExtractor(EntityExtractor):
+    def __init__(self, model_name: str = "dbmdz/bert-large-cased-finetuned-conll03-english", threshold: float = 0.9):
+        from transformers import pipeline
+
+        self.pipeline = pipeline("ner", model=model_name, aggregation_strategy="simple")
+        self.threshold = threshold
+
+    def extract(self, text: str) -> list[dict]:
+        entities = self.pipeline(text)
+        return [
+            {"text": entity["word"], "label": entity["entity_group"], "score": entity["score"]}
+            for entity in entities if entity["score"] > self.threshold
+        ]
+
+
+class DomainEntityExtractor(EntityExtractor):
+    def __init__(self, key_differences: list[list[str]], extra_terms: dict = EXTRA_TERMS):
+        # normalized alias -> (canonical value, label)
+        self.terms: dict[str, tuple[str, str]] = {}
+        self.aliases: list[str] = []
+        for field, *values in key_differences:
+            for value in values:
+                if value.lower() in GENERIC_VALUES or not re.search(r"[A-Za-z]", value):
+                    continue
+                self._add(value, value, field)
+                match = PARENTHESISED.match(value)
+                if match:
+                    for part in match.groups():
+                        if part.lower() not in GENERIC_VALUES:
+                            self._add(part, value, field)
+        for label, aliases in extra_terms.items():
+            for alias, value in aliases.items():
+                self._add(alias, value, label)
+
+        # Hyphens and spaces inside a term are interchangeable ("out of network", "out-of-network"), plurals count
+        self.pattern = re.compile(r"(?<!\w)(" + trie_pattern(self.aliases, flexible_separators=True) + r")s?(?!\w)", re.IGNORECASE)
+
+    def _add(self, alias: str, value: str, label: str):
+        key = _normalize(alias)
+        if key and key not in self.terms:
+            self.terms[key] = (value, label)
+            self.aliases.append(alias)
+
+    @classmethod
+    def from_file(cls, path: str) -> "DomainEntityExtractor":
+        """Gazetteer from an insurance models definition file (JSON with key_differences)"""
+        with open(path) as f:
+            return cls(json.load(f)["key_differences"])
+
+    def extract(self, text: str) -> list[dict]:
+        entities = []
+        for match in self.pattern.finditer(text):
+            value, label = self.terms[_normalize(match.group(1))]
+            entities.append({"text": match.group(0), "label": label, "value": value, "score": 1.0})
+
+        for surface, code, _ in find_states(text):
+            entities.append({"text": surface, "label": "State", "value": code, "score": 1.0})
+
+        solo = SOLO_PATTERN.search(text)
+        if solo:
+            entities.append({"text": solo.group(0), "label": "Business Size", "value": 1, "score": 1.0})
+        sizes = set()
+        for pattern in SIZE_PATTERNS:
+            for match in pattern.finditer(text):
+                size = parse_number(match.group(1))
+                if size and size not in sizes:
+                    sizes.add(size)
+                    entities.append({"text": match.group(0).strip(), "label": "Business Size", "value": size, "score": 1.0})
+
+        for match in MONEY_PATTERN.finditer(text):
+            entities.append({"text": match.group(0), "label": "Money", "value": match.group(0), "score": 1.0})
+        for match in PERCENT_PATTERN.finditer(text):
+            entities.append({"text": match.group(0), "label": "Percent", "value": match.group(0), "score": 1.0})
+        return entities
+
+
+class CombinedEntityExtractor(EntityExtractor):
+    """Union of several extractors' entities"""
+
+    def __init__(self, extractors: list[EntityExtractor]):
+        self.extractors = extractors
+
+    def extract(self, text: str) -> list[dict]:
+        return [entity for extractor in self.extractors for entity in extractor.extract(text)]
+
+
+def create_entity_extractor(name: str, gazetteer_path: str = "models/insurance_models.py") -> EntityExtractor:
+    """Build the extractor selected by ENTITY_EXTRACTOR"""
+    if name == "bert":
+        return BertEntityExtractor()
+    if name == "domain":
+        return DomainEntityExtractor.from_file(gazetteer_path)
+    if name == "both":
+        return CombinedEntityExtractor([DomainEntityExtractor.from_file(gazetteer_path), BertEntityExtractor()])
+    raise ValueError(f"Unknown entity extractor: {name}")
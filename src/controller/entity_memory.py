@@ -0,0 +1,77 @@
+"""Per-session entity memory: one record per entity, ranked by label weight, score, frequency and recency"""
+
+import math
+import os
+import sys
+
+ENTITY_MEMORY_SIZE = int(os.getenv("ENTITY_MEMORY_SIZE", "64"))
+# Relevance multiplier per turn since an entity was last seen
+RECENCY_DECAY = 0.9
+# Facts about the user's business outrank terms the assistant explains every other turn
+LABEL_WEIGHTS = {"State": 2.0, "Business Size": 2.0, "Money": 1.5, "Percent": 1.5, "Benefit Term": 0.5}
+
+
+class EntityRecord:
+    __slots__ = ("text", "label", "hits", "last_turn", "max_score")
+
+    def __init__(self, text: str, label: str, turn: int, score: float):
+        self.text = text
+        self.label = label
+        self.hits = 1
+        self.last_turn = turn
+        self.max_score = score
+
+    def relevance(self, turn: int) -> float:
+        weight = LABEL_WEIGHTS.get(self.label, 1.0)
+        return weight * self.max_score * (1 + math.log(self.hits)) * RECENCY_DECAY ** (turn - self.last_turn)
+
+    def to_dict(self) -> dict:
+        return {"text": self.text, "label": self.label, "hits": self.hits, "last_turn": self.last_turn, "max_score": self.max_score}
+
+
+def entity_key(entity: dict) -> str:
+    """Label and normalized value; domain entities with the same canonical value share a key ("HSA", "health savings account")"""
+    value = entity.get("value", entity["text"])
+    return sys.intern(f"{entity['label']}:{' '.join(str(value).lower().split())}")
+
+
+class EntityMemory:
+    __slots__ = ("max_entries", "records", "ranking", "evicted")
+
+    def __init__(self, max_entries: int = ENTITY_MEMORY_SIZE):
+        self.max_entries = max_entries
+        self.records: dict[str, EntityRecord] = {}
+        # Keys ordered by relevance, most relevant first
+        self.ranking: list[str] = []
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add(self, entities: list[dict], turn: int):
+        for entity in entities:
+            text = entity["text"].strip()
+            # Single characters are subword fragments from the NER pipeline, not entities
+            if len(text) < 2:
+                continue
+            key = entity_key(entity)
+            score = float(entity.get("score", 1.0))
+            record = self.records.get(key)
+            if record is None:
+                self.records[key] = EntityRecord(text, sys.intern(entity["label"]), turn, score)
+            else:
+                record.hits += 1
+                record.last_turn = max(record.last_turn, turn)
+                record.max_score = max(record.max_score, score)
+
+        self.ranking = sorted(self.records, key=lambda key: self.records[key].relevance(turn), reverse=True)
+        while len(self.ranking) > self.max_entries:
+            del self.records[self.ranking.pop()]
+            self.evicted += 1
+
+    def top(self, k: int) -> list[EntityRecord]:
+        """The k most relevant entities"""
+        return [self.records[key] for key in self.ranking[:k]]
+
+    def get_stats(self) -> dict:
+        return {"entities": len(self.records), "evicted": self.evicted}
@@ -0,0 +1,140 @@
+"""HTTP connection pools shared by every OpenAI and Pinecone client in the process, prewarmed at startup"""
+
+import importlib.util
+import os
+import threading
+import httpx
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "120"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP2 = os.getenv("HTTP2", "true").lower() == "true"
+PINECONE_POOL_SIZE = int(os.getenv("PINECONE_POOL_SIZE", "20"))
+HTTP_PREWARM = os.getenv("HTTP_PREWARM", "true").lower() == "true"
+PREWARM_CONNECTIONS = int(os.getenv("PREWARM_CONNECTIONS", "2"))
+
+# HTTP/2 needs the optional h2 package; without it the pool speaks HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class CountingTransport(httpx.HTTPTransport):
+    """httpx transport that counts requests, new connections and TLS handshakes through httpcore trace events"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = {"requests": 0, "connections_opened": 0, "tls_handshakes": 0}
+        self._lock = threading.Lock()
+
+    def _trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.stats["connections_opened"] += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._lock:
+                self.stats["tls_handshakes"] += 1
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        with self._lock:
+            self.stats["requests"] += 1
+        request.extensions["trace"] = self._trace
+        return super().handle_request(request)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["reused"] = max(0, stats["requests"] - stats["connections_opened"])
+        return stats
+
+
+_lock = threading.Lock()
+_http_client: httpx.Client | None = None
+_transport: CountingTransport | None = None
+_pinecone_clients: dict[str, object] = {}
+_pinecone_indexes: dict[str, object] = {}
+
+
+def shared_http_client() -> httpx.Client:
+    """The httpx client every OpenAI client is built with"""
+    global _http_client, _transport
+    with _lock:
+        if _http_client is None:
+            _transport = CountingTransport(
+                http2=HTTP2 and HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                )
+            )
+            # Read timeouts are set per request by the LLM gateway
+            _http_client = httpx.Client(
+                transport=_transport,
+                timeout=httpx.Timeout(600, connect=HTTP_CONNECT_TIMEOUT),
+                follow_redirects=True
+            )
+        return _http_client
+
+
+def shared_pinecone_index(api_key: str | None, host: str | None):
+    """One Pinecone client per API key and one Index (one connection pool) per host"""
+    from pinecone import Pinecone
+
+    with _lock:
+        if api_key not in _pinecone_clients:
+            _pinecone_clients[api_key] = Pinecone(api_key=api_key)
+        if host not in _pinecone_indexes:
+            _pinecone_indexes[host] = _pinecone_clients[api_key].Index(host=host, connection_pool_maxsize=PINECONE_POOL_SIZE)
+        return _pinecone_indexes[host]
+
+
+def _pinecone_pool_stats(index) -> dict | None:
+    """Request and connection counts of the index's urllib3 pools, where the SDK exposes them"""
+    try:
+        pool_manager = index._vector_api.api_client.rest_client.pool_manager
+        pools = [pool_manager.pools[key] for key in pool_manager.pools.keys()]
+    except Exception:
+        return None
+    requests = sum(pool.num_requests for pool in pools)
+    connections = sum(pool.num_connections for pool in pools)
+    return {"requests": requests, "connections_opened": connections, "reused": max(0, requests - connections)}
+
+
+def prewarm(openai_base_url: str | None = None, connections: int = PREWARM_CONNECTIONS):
+    """Open pooled connections to OpenAI and the Pinecone indexes before the first user request"""
+    base_url = openai_base_url or os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+    client = shared_http_client()
+
+    def warm_openai():
+        try:
+            # Any response will do; the point is the TCP and TLS handshake
+            client.head(base_url)
+        except Exception as e:
+            print(f"Prewarming OpenAI connection failed: {e}")
+
+    def warm_pinecone(index):
+        try:
+            index.describe_index_stats()
+        except Exception as e:
+            print(f"Prewarming Pinecone connection failed: {e}")
+
+    with _lock:
+        indexes = list(_pinecone_indexes.values())
+    threads = [threading.Thread(target=warm_openai) for _ in range(connections)]
+    threads += [threading.Thread(target=warm_pinecone, args=(index,)) for index in indexes for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"Prewarmed {connections} connection(s) to OpenAI and {len(indexes)} Pinecone index(es)")
+
+
+def get_transport_stats() -> dict:
+    with _lock:
+        transport = _transport
+        indexes = dict(_pinecone_indexes)
+    return {
+        "openai": transport.get_stats() if transport else None,
+        "http2": HTTP2 and HTTP2_AVAILABLE,
+        "pinecone": {host: _pinecone_pool_stats(index) for host, index in indexes.items()}
+    }
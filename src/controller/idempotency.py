@@ -0,0 +1,98 @@
+"""Idempotency-Key handling for POST endpoints: retries get the first request's result instead of rerunning the turn"""
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from fastapi import HTTPException
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "600"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "5000"))
+
+
+def fingerprint(*parts) -> str:
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+
+
+class IdempotencyCache:
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (request fingerprint, expiry, result)
+        self.completed: OrderedDict[str, tuple[str, float, object]] = OrderedDict()
+        # key -> (request fingerprint, task computing the result)
+        self.in_flight: dict[str, tuple[str, asyncio.Task]] = {}
+        self.stats = {"requests": 0, "computed": 0, "replayed": 0, "attached": 0, "conflicts": 0}
+
+    def _lookup(self, key: str) -> tuple[str, float, object] | None:
+        entry = self.completed.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            del self.completed[key]
+            return None
+        self.completed.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, request_fingerprint: str, result):
+        self.completed[key] = (request_fingerprint, time.monotonic() + self.ttl, result)
+        self.completed.move_to_end(key)
+        while len(self.completed) > self.max_entries:
+            self.completed.popitem(last=False)
+
+    def _check(self, key: str, stored_fingerprint: str, request_fingerprint: str):
+        if stored_fingerprint != request_fingerprint:
+            self.stats["conflicts"] += 1
+            raise HTTPException(status_code=422, detail=f"Idempotency-Key {key!r} was already used with a different request")
+
+    async def run(self, scope: str, key: str | None, request_fingerprint: str, compute) -> tuple[object, bool]:
+        """
+        Result of compute() for this key, computing it at most once.
+        Returns the result and whether it came from an earlier request.
+        """
+        if not key:
+            return await compute(), False
+
+        self.stats["requests"] += 1
+        cache_key = f"{scope}:{key}"
+
+        entry = self._lookup(cache_key)
+        if entry is not None:
+            self._check(key, entry[0], request_fingerprint)
+            self.stats["replayed"] += 1
+            return entry[2], True
+
+        if cache_key in self.in_flight:
+            stored_fingerprint, task = self.in_flight[cache_key]
+            self._check(key, stored_fingerprint, request_fingerprint)
+            self.stats["attached"] += 1
+            # Shielded so a disconnecting retry does not cancel the original computation
+            return await asyncio.shield(task), True
+
+        task = asyncio.create_task(self._compute(cache_key, request_fingerprint, compute))
+        task.add_done_callback(_retrieve_exception)
+        self.in_flight[cache_key] = (request_fingerprint, task)
+        self.stats["computed"] += 1
+        # Shielded too: the first request being cancelled leaves the turn running for its retries
+        return await asyncio.shield(task), False
+
+    async def _compute(self, cache_key: str, request_fingerprint: str, compute):
+        try:
+            result = await compute()
+            self._store(cache_key, request_fingerprint, result)
+            return result
+        finally:
+            del self.in_flight[cache_key]
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "stored": len(self.completed), "in_flight": len(self.in_flight)}
+
+
+def _retrieve_exception(task: asyncio.Task):
+    # Retrieved here so a failure nobody is waiting for any more is not reported as unhandled
+    if not task.cancelled():
+        task.exception()
+
+
+idempotency_cache = IdempotencyCache()
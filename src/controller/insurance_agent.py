@@ -1,5 +1,3 @@
-from pinecone import Pinecone
-from openai import OpenAI
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 import urllib.parse
@@ -8,11 +6,26 @@ from dotenv import load_dotenv
 from datetime import date
 from typing import Literal 
 import os
-import tiktoken
+import threading
 import uuid
-from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
-
-from models.schemas import BusinessProfile, PlanDiscoveryResponse, PlanDiscoveryAnswers, SmartQueries, ChatResponse, SummaryResponse
+from concurrent.futures import ThreadPoolExecutor
+
+from controller.retrieval_backends import create_retrieval_backend
+from controller.admission import admission, AdmissionRejected
+from controller.llm_client import create_openai_client, single_flight
+from controller.lexical_index import ReloadingBM25Index, reciprocal_rank_fusion
+from controller.context_packer import pack_context, count_tokens
+from controller.query_router import route_query, CLARIFY, NEEDS_REWRITE, CONFIDENCE_THRESHOLD
+from controller.slot_extractor import extract_slots
+from controller.prompt_layout import build_input, load_prompt, format_sections, record_usage, get_prompt_cache_stats
+from controller.summarizers import create_summarizer
+from controller.entity_extractor import create_entity_extractor
+from controller.entity_memory import EntityMemory
+from controller.conversation_memory import ConversationMemory
+from controller.messages import Message, Role
+from controller.session_codec import pack_session, unpack_session
+from controller.plan_scoring import rank_plans, format_ranking, format_ranking_report
+from models.schemas import BusinessProfile, PlanDiscoveryResponse, PlanDiscoveryAnswers, SmartQueries, ChatResponse
 
 # Load environment variables
 load_dotenv()
@@ -21,20 +34,39 @@ PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX_HOST = os.getenv("PINECONE_INDEX_HOST")
 NAMESPACE = os.getenv("NAMESPACE")
 MONGODB_URI = os.getenv("MONGODB_URI")
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "pinecone")
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "false").lower() == "true"
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "lexical_index")
+RETRIEVAL_RERANK = os.getenv("RETRIEVAL_RERANK", "true").lower() == "true"
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+QUERY_ROUTER = os.getenv("QUERY_ROUTER", "true").lower() == "true"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "4000"))
+LOCAL_PLAN_SCORING = os.getenv("LOCAL_PLAN_SCORING", "true").lower() == "true"
+PLAN_SCORING_TOP_K = int(os.getenv("PLAN_SCORING_TOP_K", "3"))
+SLOT_FAST_PATH = os.getenv("SLOT_FAST_PATH", "true").lower() == "true"
+SUMMARIZER = os.getenv("SUMMARIZER", "extractive")
+ENTITY_EXTRACTOR = os.getenv("ENTITY_EXTRACTOR", "bert")
+# summary: full history in prompts, compacted over the token limit; retrieval: recent plus relevant past turns
+CONVERSATION_MEMORY = os.getenv("CONVERSATION_MEMORY", "summary")
 
 # Create client 
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index = pc.Index(host=PINECONE_INDEX_HOST)
-client = OpenAI(api_key=OPENAI_API_KEY)
+retrieval_backend = create_retrieval_backend(RETRIEVAL_BACKEND, namespace=NAMESPACE)
+# Picks up the index upload_data rebuilds; dense-only until one exists
+lexical_index = ReloadingBM25Index(LEXICAL_INDEX_DIR) if HYBRID_RETRIEVAL else None
+if lexical_index is not None:
+    lexical_index.current()
+# Calls made while serving a turn are subject to the API's admission limits
+client = create_openai_client(OPENAI_API_KEY, admission=admission)
+summarizer = create_summarizer(SUMMARIZER, client)
 
 
 mongo_client = MongoClient(MONGODB_URI, server_api=ServerApi('1'))
 db = mongo_client['cigna_insurance']
 collection = db['insurance_plans']
 
-# Initialize tokenizer and NER pipeline
-tokenizer = tiktoken.encoding_for_model("gpt-4")
-ner_pipeline = pipeline("ner", model="dbmdz/bert-large-cased-finetuned-conll03-english", aggregation_strategy="simple")
+# Initialize entity extractor
+entity_extractor = create_entity_extractor(ENTITY_EXTRACTOR)
 
 # Informative links for reasoning model 
 links = ["https://www.cigna.com/employers/medical-plans/",
@@ -43,40 +75,84 @@ links = ["https://www.cigna.com/employers/medical-plans/",
          "https://www.cigna.com/knowledge-center/copays-deductibles-coinsurance",
          "https://www.cigna.com/knowledge-center/in-network-vs-out-of-network"]
 
+# Speculative retrieval runs a search on the raw user query while the rewrite is in flight
+speculative_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative-search")
+
+
+class Counters:
+    """Named counters updated from request threads and the speculative executor"""
+
+    def __init__(self, *names: str):
+        self._counts = dict.fromkeys(names, 0)
+        self._lock = threading.Lock()
+
+    def add(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+speculative_stats = Counters("turns", "used", "discarded", "queries_skipped")
+router_stats = Counters("no_retrieval", "clarify", "llm_rewrite")
+discovery_stats = Counters("fast_path", "llm")
+
 # Initialize the session state
 class SessionState:
+    __slots__ = ("user_id", "chat_history", "conversation_memory", "plan_discovery_answers", "extracted_entities",
+                 "turn", "last_prompt_budget", "discovery_delta", "last_usage", "last_response_id")
+
     def __init__(self):
         self.user_id = str(uuid.uuid4())
-        self.chat_history = []
+        self.chat_history: list[Message] = []
+        self.conversation_memory: ConversationMemory | None = None
+        if CONVERSATION_MEMORY == "retrieval":
+            self.conversation_memory = ConversationMemory()
+            # Same list, so chat_history stays the full (bounded) history
+            self.chat_history = self.conversation_memory.messages
         self.plan_discovery_answers: PlanDiscoveryAnswers | None = None
-        self.extracted_entities = []
+        self.extracted_entities = EntityMemory()
+        self.turn = 0
+        self.last_prompt_budget: dict | None = None
+        self.discovery_delta: list[Message] = []
+        self.last_usage: dict | None = None
+        self.last_response_id: str | None = None
+    
+    def to_bytes(self) -> bytes:
+        """msgpack serialization of the session, for persistence"""
+        return pack_session(self)
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SessionState":
+        return unpack_session(data, cls())
+    
+    def create_message(self, role: Role | str, content: str) -> Message:
+        """Message record with its token count, counted once"""
+        return Message(role, content, count_tokens(content))
     
     def update_chat_history(self, role: Literal["user", "assistant"], content: str):
-        self.chat_history.append({"role": role, "content": content})
+        if role == "user":
+            self.turn += 1
+        message = self.create_message(role, content)
+        if self.conversation_memory is not None:
+            # Nothing is compacted in retrieval mode, so entities come from each user message
+            self.conversation_memory.add(message)
+            if role == "user":
+                self.extracted_entities.add(self.extract_entities(content), self.turn)
+            return
+        self.chat_history.append(message)
         self.manage_token_limit()
     
     def count_tokens(self, messages):
         """Count tokens in a list of messages"""
-        total_tokens = 0
-        for message in messages:
-            content = message.get("content", "")
-            total_tokens += len(tokenizer.encode(content))
-        return total_tokens
+        return sum(message.tokens for message in messages)
     
     def extract_entities(self, text):
-        """Extract entities from text using NER pipeline"""
+        """Extract entities from text with the configured entity extractor"""
         try:
-            entities = ner_pipeline(text)
-            # Filter and format entities
-            formatted_entities = []
-            for entity in entities:
-                if entity['score'] > 0.9:  # High confidence threshold
-                    formatted_entities.append({
-                        'text': entity['word'],
-                        'label': entity['entity_group'],
-                        'score': entity['score']
-                    })
-            return formatted_entities
+            return entity_extractor.extract(text)
         except Exception as e:
             print(f"Entity extraction error: {e}")
             return []
@@ -87,44 +163,33 @@ class SessionState:
         
         # Extract entities before summarization
         entities = self.extract_entities(conversation_text)
-        self.extracted_entities.extend(entities)
-        
-        # Create summarization prompt
-        summary_prompt = f"""Summarize the following conversation while preserving key insurance-related information, preferences, and business details:
-
-{conversation_text}
-
-Provide a concise summary that maintains important context for insurance discussions."""
+        self.extracted_entities.add(entities, self.turn)
         
         try:
-            response = client.responses.parse(
-                model="gpt-4o-mini",
-                input=[{"role": "system", "content": summary_prompt}],
-                user=self.user_id,
-                text_format=SummaryResponse
-            )
-            return response.output_parsed.summary
+            return summarizer.summarize(messages, entities, user_id=self.user_id)
         except Exception as e:
             print(f"Summarization error: {e}")
             return f"Summary of {len(messages)} messages (summary failed)"
     
-    def format_conversation_history(self):
-        """Format conversation history for prompt inclusion"""
+    def format_conversation_history(self, query: str | None = None):
+        """Format conversation history for prompt inclusion; in retrieval mode only the turns relevant to query"""
         if not self.chat_history:
             return ""
         
+        messages = self.chat_history
+        if self.conversation_memory is not None and query:
+            messages = self.conversation_memory.select(query)
         return "\n".join([
             f"{msg['role'].capitalize()}: {msg['content']}" 
-            for msg in self.chat_history
+            for msg in messages
         ])
     
     def format_extracted_entities(self, limit=10):
-        """Format extracted entities for prompt inclusion"""
+        """Format the most relevant extracted entities for prompt inclusion"""
         if not self.extracted_entities:
             return 'None'
         
-        recent_entities = self.extracted_entities[-limit:]
-        return [e['text'] for e in recent_entities]
+        return [record.text for record in self.extracted_entities.top(limit)]
     
     def manage_token_limit(self, max_tokens=300, percent_to_summarize=0.2):
         """Manage token limit by summarizing older conversation history"""
@@ -153,10 +218,7 @@ Provide a concise summary that maintains important context for insurance discuss
         print("SUMMARY: ", summary)
         
         # Replace summarized messages with summary
-        summary_message = {
-            "role": "system", 
-            "content": f"[CONVERSATION SUMMARY] {summary}"
-        }
+        summary_message = self.create_message(Role.SYSTEM, f"[CONVERSATION SUMMARY] {summary}")
         
         self.chat_history = [summary_message] + remaining_messages
         
@@ -170,23 +232,23 @@ Provide a concise summary that maintains important context for insurance discuss
 
 def rewrite_query(user_query, client, currentSession: SessionState):
     # Get conversation history and entities (excluding current query since it hasn't been added yet)
-    conversation_history = currentSession.format_conversation_history()
+    conversation_history = currentSession.format_conversation_history(user_query)
     extracted_entities = currentSession.format_extracted_entities()
     
-    with open("prompts/rewrite_query.txt") as f:
-        prompt_template = f.read()
-    
-    # Format the prompt with actual variables
-    prompt = prompt_template.format(
-        user_query=user_query,
-        conversation_history=conversation_history,
-        extracted_entities=extracted_entities
-    )
+    # Static instructions first, growing history next, per-turn values last
+    prompt_input = build_input("rewrite_query", [
+        ("Previous Conversation History", conversation_history),
+        ("Extracted Entities from Conversation", str(extracted_entities)),
+        ("Current User Query", user_query)
+    ])
     raw_response = client.responses.parse(
+        node="rewrite_query",
         model="gpt-4o-mini",
-        input=[{"role": "developer", "content": prompt}],
+        input=prompt_input,
         user=currentSession.user_id,
+        prompt_cache_key="rewrite_query",
         text_format=SmartQueries)
+    record_usage("rewrite_query", raw_response)
     
     parsed = raw_response.output_parsed
     print("QUERY? YES OR NO: ", parsed.queryDB)
@@ -197,65 +259,143 @@ def rewrite_query(user_query, client, currentSession: SessionState):
         print("No queries needed, returning empty list.")
     return parsed
 
-def query_db(queries: list[str], top_k: int = 5):
-    context = ""
+def analyze_query(user_query: str, currentSession: SessionState) -> SmartQueries:
+    """
+    Route the turn locally first and only call rewrite_query when the router is not confident.
+    The current user message is already in chat_history, so earlier turns exist when it has more than one entry.
+    """
+    if QUERY_ROUTER:
+        route, confidence = route_query(user_query, has_history=len(currentSession.chat_history) > 1)
+        print(f"ROUTER: {route} (confidence {confidence:.2f})")
+
+        if route != NEEDS_REWRITE and confidence >= CONFIDENCE_THRESHOLD:
+            router_stats.add(route)
+            return SmartQueries(clarify=route == CLARIFY, queryDB=False, queries=[])
+
+    router_stats.add("llm_rewrite")
+    return rewrite_query(user_query, client, currentSession)
+
+def search_index(query: str, top_k: int = 5) -> list[dict]:
+    """
+    Search the configured retrieval backend and return its hits.
+    With hybrid retrieval the dense hits are fused with BM25 hits by reciprocal rank.
+    """
+    print("Searching for:", query)
+    dense_hits = retrieval_backend.search(query, top_k, rerank=RETRIEVAL_RERANK)
+    bm25 = lexical_index.current() if lexical_index is not None else None
+    if bm25 is None:
+        return dense_hits
+    return reciprocal_rank_fusion([dense_hits, bm25.search(query, top_k)], top_k)
+
+def retrieve_hits(queries: list[str], top_k: int = 5) -> list[dict]:
+    hits = []
     for query in queries:
-            print("Searching for:", query)  
-            results = index.search(
-                namespace=NAMESPACE,
-                query={
-                    "inputs": {"text": query},
-                    "top_k": top_k
-                },
-                rerank={
-                    "model": "bge-reranker-v2-m3",
-                    "top_n": top_k,
-                    "rank_fields": ["chunk_text"]
-                },
-                fields=["chunk_text", "source"]
-            )
-            hits = results.get("result", {}).get("hits", [])
-            context += "\n\n".join([hit["fields"].get("chunk_text", "") for hit in hits])
-    
+        hits.extend(search_index(query, top_k))
+    return hits
+
+def query_db(queries: list[str], top_k: int = 5, token_budget: int = CONTEXT_TOKEN_BUDGET):
+    context, _ = pack_context(retrieve_hits(queries, top_k), token_budget)
     return context
 
-def ask_rag_bot(user_query: str,  currentSession: SessionState, top_k: int = 5):
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+def speculative_retrieve_hits(speculative_search, raw_query: str, query_analysis: SmartQueries, top_k: int = 5) -> list[dict]:
+    """
+    Resolve a speculative search started on the raw user query against the rewritten queries.
+    The speculative hits are kept only when the rewrite decided retrieval is needed, and
+    rewritten queries identical to the raw query are not searched a second time.
+    """
+    speculative_stats.add("turns")
+
+    if not query_analysis.queryDB or not query_analysis.queries:
+        # Nothing to retrieve for this turn, drop the speculative search
+        speculative_search.cancel()
+        speculative_stats.add("discarded")
+        print("Speculative search discarded (no retrieval needed).")
+        return []
+
+    try:
+        speculative_hits = speculative_search.result()
+    except Exception as e:
+        print(f"Speculative search failed, falling back to rewritten queries: {e}")
+        speculative_stats.add("discarded")
+        return retrieve_hits(query_analysis.queries, top_k)
+
+    speculative_stats.add("used")
+    raw_key = normalize_query(raw_query)
+    new_queries = [q for q in query_analysis.queries if normalize_query(q) != raw_key]
+    speculative_stats.add("queries_skipped", len(query_analysis.queries) - len(new_queries))
+
+    return speculative_hits + retrieve_hits(new_queries, top_k)
+
+def get_speculative_stats() -> dict:
+    """Report how often speculative retrieval results made it into the prompt"""
+    stats = speculative_stats.snapshot()
+    return {
+        **stats,
+        "hit_rate": stats["used"] / stats["turns"] if stats["turns"] else 0.0
+    }
+
+def ask_rag_bot(user_query: str,  currentSession: SessionState, top_k: int = 5, speculative: bool = SPECULATIVE_RETRIEVAL):
     # Update conversation history with user query
     currentSession.update_chat_history("user", user_query)
     
-    context = ""
+    hits = []
+
+    # Start searching on the raw query while the rewrite is still running
+    if speculative:
+        speculative_search = speculative_executor.submit(search_index, user_query, top_k)
     
-    query_analysis = rewrite_query(user_query, client, currentSession)
+    query_analysis = analyze_query(user_query, currentSession)
     queries = query_analysis.queries
 
-    if queries: 
-        context += query_db(queries, top_k)
+    if speculative:
+        hits = speculative_retrieve_hits(speculative_search, user_query, query_analysis, top_k)
+    elif queries: 
+        hits = retrieve_hits(queries, top_k)
     
 
     # Use SessionState methods to format data for prompt
-    conversation_history = currentSession.format_conversation_history()
+    conversation_history = currentSession.format_conversation_history(user_query)
     extracted_entities = currentSession.format_extracted_entities()
 
-    with open("prompts/rag_bot.txt") as f:
-        prompt_template = f.read()
+    def rag_sections(context: str) -> list[tuple[str, str]]:
+        # Static instructions first, growing history next, per-turn values last
+        return [
+            ("Previous Conversation", conversation_history),
+            ("Extracted Entities from Conversation", str(extracted_entities)),
+            ("Context from Knowledge Base", context),
+            ("Clarification required", str(query_analysis.clarify)),
+            ("Current Question", user_query)
+        ]
+
+    # Knowledge base context gets whatever the rest of the prompt leaves of the prompt budget
+    base_tokens = count_tokens(load_prompt("rag_bot")) + count_tokens(format_sections(rag_sections("")))
+    context_budget = max(0, min(CONTEXT_TOKEN_BUDGET, PROMPT_TOKEN_BUDGET - base_tokens))
+    context, budget_breakdown = pack_context(hits, context_budget)
     
-    # Format the prompt with actual variables
-    prompt = prompt_template.format(
-        user_query=user_query,
-        conversation_history=conversation_history,
-        extracted_entities=extracted_entities,
-        context=context,
-        query_analysis=query_analysis
-    )
+    prompt_input = build_input("rag_bot", rag_sections(context))
+
+    currentSession.last_prompt_budget = {
+        **budget_breakdown,
+        "prompt_budget": PROMPT_TOKEN_BUDGET,
+        "history_tokens": count_tokens(conversation_history),
+        "prompt_tokens": sum(count_tokens(message["content"]) for message in prompt_input),
+    }
+    print("PROMPT BUDGET: ", currentSession.last_prompt_budget)
 
 
     raw_response = client.responses.parse(
+        node="ask_rag_bot",
         model="gpt-4.1",
-        input=[{"role": "developer", "content": prompt}],
+        input=prompt_input,
         user=currentSession.user_id,
+        prompt_cache_key="rag_bot",
         text_format=ChatResponse)
 
     currentSession.last_response_id = raw_response.id
+    currentSession.last_usage = record_usage("ask_rag_bot", raw_response)
     parsed = raw_response.output_parsed
     
     # Update conversation history with assistant response
@@ -267,47 +407,83 @@ def ask_rag_bot(user_query: str,  currentSession: SessionState, top_k: int = 5):
     print(f"Current token count: {currentSession.count_tokens(currentSession.chat_history)}")
     print(f"Extracted entities count: {len(currentSession.extracted_entities)}")
     if currentSession.extracted_entities:
-        print("Recent entities:", [e['text'] for e in currentSession.extracted_entities[-5:]])
+        print("Top entities:", [record.text for record in currentSession.extracted_entities.top(5)])
+    if speculative:
+        print("Speculative retrieval:", get_speculative_stats())
     print("--- END STATE ---\n")
 
     return parsed.response
 
+DISCOVERY_QUESTIONS = {
+    "business_size": "How many employees does your company have?",
+    "location": "Which state is your business based in?",
+    "coverage_preference": "Does your team mostly need care close to home, or coverage that works wherever they are across the country?"
+}
+
+def discovery_reply(answers: PlanDiscoveryAnswers) -> str:
+    """Acknowledge the answers and ask for the next missing one, without a model call"""
+    for slot, question in DISCOVERY_QUESTIONS.items():
+        if getattr(answers, slot) is None:
+            return f"Thanks, got it! {question}"
+    return (f"Perfect, I have everything I need: {answers.business_size} employees in {answers.location} "
+            f"with a preference for {answers.coverage_preference.lower()} coverage. "
+            "I'll move on to plan discovery and find the plans that fit your business.")
+
 def plan_discovery_node(user_query: str, currentSession: SessionState):
     """ This function systematically collects business size, location, and coverage preference information
-    to help find eligible insurance plans. """
+    to help find eligible insurance plans. Clear answers are parsed locally by the slot extractor;
+    the model only handles ambiguous input and sees the conversation since the last filled slot. """
 
     print(f"\n=== PLAN DISCOVERY DEBUG ===")
     
     # Update conversation history with user query first
     currentSession.update_chat_history("user", user_query)
+    currentSession.last_usage = None
     
-    conversation_history = currentSession.format_conversation_history()
-    current_answers = currentSession.plan_discovery_answers.model_dump_json() if currentSession.plan_discovery_answers else "{}"
+    previous_answers = currentSession.plan_discovery_answers or PlanDiscoveryAnswers()
+    current_answers = previous_answers.model_dump_json() if currentSession.plan_discovery_answers else "{}"
     
     print(f"Current answers: {current_answers}")
     print(f"Chat history length: {len(currentSession.chat_history)} messages")
     print(f"Extracted entities count: {len(currentSession.extracted_entities)}")
     if currentSession.extracted_entities:
-        print(f"Current entities: {[e['text'] for e in currentSession.extracted_entities]}")
+        print(f"Current entities: {[record.text for record in currentSession.extracted_entities.top(len(currentSession.extracted_entities))]}")
 
-    with open("prompts/plan_discovery.txt") as f:
-        prompt_template = f.read()
-
-    prompt = prompt_template.format(
-        user_query=user_query,
-        conversation_history=conversation_history,
-        current_answers=current_answers
-    )
+    if SLOT_FAST_PATH:
+        slots, ambiguous = extract_slots(user_query, previous_answers.model_dump())
+        print(f"Slot extractor: {slots} (ambiguous: {ambiguous})")
+        
+        if slots and not ambiguous:
+            discovery_stats.add("fast_path")
+            currentSession.plan_discovery_answers = previous_answers.model_copy(update=slots)
+            response = discovery_reply(currentSession.plan_discovery_answers)
+            currentSession.discovery_delta = []
+            currentSession.update_chat_history("assistant", response)
+            print(f"=== END DEBUG ===\n")
+            return response
+
+    discovery_stats.add("llm")
+    conversation_delta = "\n".join(f"{msg['role']}: {msg['content']}" for msg in currentSession.discovery_delta)
+
+    # Static instructions first, growing history next, per-turn values last
+    prompt_input = build_input("plan_discovery", [
+        ("Conversation since the last answer was collected", conversation_delta or "(none)"),
+        ("Current collected answers", current_answers),
+        ("User input", user_query)
+    ])
     
     print(f"Sending request to LLM...")
 
     raw_response = client.responses.parse(
+        node="plan_discovery_node",
         model="gpt-4o-mini",
-        input=[{"role": "developer", "content": prompt}],
+        input=prompt_input,
         user=currentSession.user_id,
+        prompt_cache_key="plan_discovery",
         text_format=PlanDiscoveryResponse)
 
     currentSession.last_response_id = raw_response.id
+    currentSession.last_usage = record_usage("plan_discovery_node", raw_response)
     parsed = raw_response.output_parsed
     
     print(f"LLM Response received!")
@@ -315,6 +491,15 @@ def plan_discovery_node(user_query: str, currentSession: SessionState):
     
     currentSession.plan_discovery_answers = parsed.plan_discovery_answers
     
+    # Only the turns after the last filled slot are sent next time
+    if parsed.plan_discovery_answers != previous_answers:
+        currentSession.discovery_delta = []
+    else:
+        currentSession.discovery_delta.extend([
+            currentSession.create_message(Role.USER, user_query),
+            currentSession.create_message(Role.ASSISTANT, parsed.response)
+        ])
+    
     # Update chat history with assistant response
     currentSession.update_chat_history("assistant", parsed.response)
     
@@ -348,10 +533,10 @@ def map_business_size_to_categories(employee_count: int) -> list[str]:
     
     return categories
 
-def search_eligible_plans(plan_answers: PlanDiscoveryAnswers):
+def search_eligible_plan_documents(plan_answers: PlanDiscoveryAnswers) -> list[dict]:
     """
     Search MongoDB for insurance plans that match user's business profile.
-    Returns a dictionary where key is plan name and value is summary text.
+    Returns one metadata document per plan name (without raw_text), used for local plan scoring.
     """
     print(f"\n=== PLAN SEARCH DEBUG ===")
     print(f"Searching MongoDB for plans with:")
@@ -398,35 +583,49 @@ def search_eligible_plans(plan_answers: PlanDiscoveryAnswers):
     
     # Query MongoDB
     try:
-        cursor = collection.find(query_filters)
+        cursor = collection.find(query_filters, {"raw_text": 0})
         matching_docs = list(cursor)
         print(f"  Found {len(matching_docs)} matching documents")
         
-        # Create dictionary: plan_name -> summary
-        plan_dict = {}
+        # One document per plan name, later documents win as before
+        plan_docs = {}
         for doc in matching_docs:
             plan_name = doc.get("Plan Type", "Unknown Plan")
             summary = doc.get("summary", "")
             
             if plan_name != "Unknown Plan" and summary:
-                plan_dict[plan_name] = summary
+                plan_docs[plan_name] = doc
                 print(f"    Added plan: {plan_name}")
             else:
                 print(f"    Skipped document with missing Plan Type or summary")
         
-        print(f"  Returning {len(plan_dict)} unique plans")
-        print(f"  Plan names: {list(plan_dict.keys())}")
+        print(f"  Returning {len(plan_docs)} unique plans")
+        print(f"  Plan names: {list(plan_docs.keys())}")
         print(f"=== END PLAN SEARCH ===\n")
         
-        return plan_dict
+        return list(plan_docs.values())
         
     except Exception as e:
         print(f"Error searching MongoDB: {e}")
-        return {}
+        return []
+
+def summaries_by_plan(plan_documents: list[dict]) -> dict:
+    """Dictionary where key is plan name and value is summary text"""
+    return {doc["Plan Type"]: doc["summary"] for doc in plan_documents}
 
-def reason_about_plans(eligible_plans: dict, plan_answers: PlanDiscoveryAnswers) -> str:
+def search_eligible_plans(plan_answers: PlanDiscoveryAnswers):
+    """
+    Search MongoDB for insurance plans that match user's business profile.
+    Returns a dictionary where key is plan name and value is summary text.
+    """
+    return summaries_by_plan(search_eligible_plan_documents(plan_answers))
+
+def reason_about_plans(eligible_plans: dict, plan_answers: PlanDiscoveryAnswers,
+                       plan_documents: list[dict] | None = None, top_k: int = PLAN_SCORING_TOP_K) -> str:
     """
     Use reasoning model to analyze and rank insurance plans based on business profile.
+    When the plan metadata documents are passed, plans are ranked locally first: the model only
+    writes the narrative for the top_k plans, and with one or two plans it is not called at all.
     Returns comprehensive analysis and recommendation.
     """
     print(f"\n=== REASONING ABOUT PLANS ===")
@@ -436,22 +635,51 @@ def reason_about_plans(eligible_plans: dict, plan_answers: PlanDiscoveryAnswers)
     print("Using stored plan summaries...")
     plan_summaries = eligible_plans  # eligible_plans now contains summaries, not raw text
     
+    ranking = None
+    if LOCAL_PLAN_SCORING and plan_documents:
+        ranking = rank_plans(plan_documents, plan_answers.business_size, plan_answers.coverage_preference)
+        print("Local plan ranking:")
+        for entry in ranking:
+            print(f"  {entry['plan']}: {entry['score']}/10")
+        
+        if len(ranking) <= 2:
+            print("Too few plans to compare, skipping the reasoning model")
+            return format_ranking_report(ranking, plan_summaries, plan_answers.business_size,
+                                         plan_answers.location, plan_answers.coverage_preference)
+        
+        ranking = ranking[:top_k]
+        plan_summaries = {entry["plan"]: plan_summaries[entry["plan"]] for entry in ranking if entry["plan"] in plan_summaries}
+    
     # Create formatted summaries text
     summaries_text = "\n\n".join([f"=== {plan} ===\n{summary}" for plan, summary in plan_summaries.items()])
     
-    with open("prompts/reason_about_plans.txt") as f:
-        prompt_template = f.read()
-    
-    # Format the prompt with actual variables
-    prompt = prompt_template.format(
-        business_size=plan_answers.business_size,
-        location=plan_answers.location,
-        coverage_preference=plan_answers.coverage_preference,
-        plan_summaries=summaries_text
-    )
+    if ranking is None:
+        with open("prompts/reason_about_plans.txt") as f:
+            prompt_template = f.read()
+        
+        # Format the prompt with actual variables
+        prompt = prompt_template.format(
+            business_size=plan_answers.business_size,
+            location=plan_answers.location,
+            coverage_preference=plan_answers.coverage_preference,
+            plan_summaries=summaries_text
+        )
+    else:
+        with open("prompts/explain_plan_ranking.txt") as f:
+            prompt_template = f.read()
+        
+        prompt = prompt_template.format(
+            business_size=plan_answers.business_size,
+            location=plan_answers.location,
+            coverage_preference=plan_answers.coverage_preference,
+            total_plans=len(eligible_plans),
+            plan_ranking=format_ranking(ranking),
+            plan_summaries=summaries_text
+        )
 
     try:
         response = client.responses.parse(
+            node="reason_about_plans",
             model="o4-mini",
             input=[{"role": "user", "content": prompt}],
             user=str(uuid.uuid4()),
@@ -468,6 +696,9 @@ def reason_about_plans(eligible_plans: dict, plan_answers: PlanDiscoveryAnswers)
         
         return analysis_result
         
+    except AdmissionRejected:
+        # Overload is reported to the caller as 429/503, not as a failed analysis
+        raise
     except Exception as e:
         print(f"Error analyzing plans: {e}")
         return f"Error occurred during plan analysis. Available plans: {list(eligible_plans.keys())}"
@@ -507,7 +738,8 @@ def complete_insurance_workflow(currentSession: SessionState):
     
     # Step 2: Search Eligible Plans
     print(f"\n=== STEP 2: SEARCHING ELIGIBLE PLANS ===")
-    eligible_plans = search_eligible_plans(currentSession.plan_discovery_answers)
+    plan_documents = search_eligible_plan_documents(currentSession.plan_discovery_answers)
+    eligible_plans = summaries_by_plan(plan_documents)
     
     if not eligible_plans:
         return "No eligible plans found for your business profile. Please contact us directly for assistance."
@@ -516,7 +748,7 @@ def complete_insurance_workflow(currentSession: SessionState):
     
     # Step 3: Reason About Plans
     print(f"\n=== STEP 3: ANALYZING AND RANKING PLANS ===")
-    analysis_result = reason_about_plans(eligible_plans, currentSession.plan_discovery_answers)
+    analysis_result = reason_about_plans(eligible_plans, currentSession.plan_discovery_answers, plan_documents)
     
     print(f"\n✓ Analysis complete! Here's your personalized recommendation:")
     print(f"\n{analysis_result}")
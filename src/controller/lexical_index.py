@@ -0,0 +1,195 @@
+"""BM25 index over the ingested chunks, fused with the dense hits for hybrid retrieval"""
+
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Common English words that carry no retrieval signal
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in is it its me my of on or our "
+    "so than that the their them there these this to was we what when where which who why will with "
+    "you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.records: list[dict] = []
+        self.vocabulary: dict[str, int] = {}
+        self.term_offsets = np.zeros(1, dtype=np.int64)
+        self.postings_docs = np.zeros(0, dtype=np.int32)
+        self.postings_tfs = np.zeros(0, dtype=np.int32)
+        self.doc_lengths = np.zeros(0, dtype=np.int32)
+        self.avg_doc_length = 0.0
+
+    @classmethod
+    def build(cls, records: list[dict], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        """Build postings from records shaped like smart_scraper.prepare_records output"""
+        index = cls(k1, b)
+        index.records = records
+
+        postings: dict[str, list[tuple[int, int]]] = {}
+        doc_lengths = []
+        for doc_id, record in enumerate(records):
+            counts = Counter(tokenize(record.get("chunk_text", "")))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        terms = sorted(postings)
+        index.vocabulary = {term: i for i, term in enumerate(terms)}
+        offsets = [0]
+        docs, tfs = [], []
+        for term in terms:
+            for doc_id, tf in postings[term]:
+                docs.append(doc_id)
+                tfs.append(tf)
+            offsets.append(len(docs))
+
+        index.term_offsets = np.array(offsets, dtype=np.int64)
+        index.postings_docs = np.array(docs, dtype=np.int32)
+        index.postings_tfs = np.array(tfs, dtype=np.int32)
+        index.doc_lengths = np.array(doc_lengths, dtype=np.int32)
+        index.avg_doc_length = float(index.doc_lengths.mean()) if doc_lengths else 0.0
+        return index
+
+    def save(self, index_dir: str):
+        path = Path(index_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        # Each file is replaced whole, the records last, so a reader never sees a partly written file
+        with open(path / "bm25.npz.tmp", "wb") as f:
+            np.savez_compressed(
+                f,
+                term_offsets=self.term_offsets,
+                postings_docs=self.postings_docs,
+                postings_tfs=self.postings_tfs,
+                doc_lengths=self.doc_lengths
+            )
+        os.replace(path / "bm25.npz.tmp", path / "bm25.npz")
+        with open(path / "bm25_meta.json.tmp", "w") as f:
+            json.dump({"k1": self.k1, "b": self.b, "terms": terms}, f)
+        os.replace(path / "bm25_meta.json.tmp", path / "bm25_meta.json")
+        with open(path / "bm25_records.jsonl.tmp", "w") as f:
+            for record in self.records:
+                f.write(json.dumps({key: record.get(key) for key in ("id", "chunk_text", "source")}, default=str) + "\n")
+        os.replace(path / "bm25_records.jsonl.tmp", path / "bm25_records.jsonl")
+
+    @classmethod
+    def load(cls, index_dir: str) -> "BM25Index":
+        path = Path(index_dir)
+        with open(path / "bm25_meta.json") as f:
+            meta = json.load(f)
+        index = cls(meta["k1"], meta["b"])
+        index.vocabulary = {term: i for i, term in enumerate(meta["terms"])}
+        arrays = np.load(path / "bm25.npz")
+        index.term_offsets = arrays["term_offsets"]
+        index.postings_docs = arrays["postings_docs"]
+        index.postings_tfs = arrays["postings_tfs"]
+        index.doc_lengths = arrays["doc_lengths"]
+        index.avg_doc_length = float(index.doc_lengths.mean()) if len(index.doc_lengths) else 0.0
+        with open(path / "bm25_records.jsonl") as f:
+            index.records = [json.loads(line) for line in f]
+        if len(index.term_offsets) != len(index.vocabulary) + 1 or len(index.doc_lengths) != len(index.records):
+            raise ValueError(f"BM25 index files at {index_dir} are from different builds")
+        return index
+
+    def search(self, query: str, top_k: int = 5) -> list[dict]:
+        if not self.records:
+            return []
+
+        n_docs = len(self.records)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(self.avg_doc_length, 1e-9))
+
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.postings_docs[start:end]
+            tfs = self.postings_tfs[start:end]
+            df = end - start
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        k = min(top_k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            {
+                "_id": self.records[i]["id"],
+                "_score": float(scores[i]),
+                "fields": {"chunk_text": self.records[i].get("chunk_text", ""), "source": self.records[i].get("source", "")}
+            }
+            for i in top
+        ]
+
+
+class ReloadingBM25Index:
+    """
+    The BM25 index saved at index_dir, reloaded whenever a rebuild replaces it.
+    current() is None while no index has been built, so hybrid retrieval falls back to dense-only.
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.index: BM25Index | None = None
+        # Modification time of the records file the loaded index was read from; -1 before the first check
+        self.loaded_mtime: int | None = -1
+        self._lock = threading.Lock()
+
+    def current(self) -> BM25Index | None:
+        try:
+            mtime = (Path(self.index_dir) / "bm25_records.jsonl").stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self.loaded_mtime:
+            return self.index
+
+        with self._lock:
+            if mtime == self.loaded_mtime:
+                return self.index
+            if mtime is None:
+                print(f"WARNING: no BM25 index at {self.index_dir}; hybrid retrieval is dense-only until one is built")
+                self.index = None
+            else:
+                try:
+                    self.index = BM25Index.load(self.index_dir)
+                except (OSError, ValueError, KeyError) as e:
+                    # Mid-rebuild; keep serving the previous index and try again on the next search
+                    print(f"WARNING: could not load the BM25 index at {self.index_dir}: {e}")
+                    return self.index
+                print(f"Loaded BM25 index with {len(self.index.records)} chunks from {self.index_dir}")
+            self.loaded_mtime = mtime
+            return self.index
+
+
+def reciprocal_rank_fusion(result_lists: list[list[dict]], top_k: int = 5, k: int = 60) -> list[dict]:
+    """
+    Merge ranked hit lists by summing 1 / (k + rank) per chunk id.
+    The fused score replaces _score so downstream ranking uses it.
+    """
+    fused: dict[str, dict] = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits, 1):
+            entry = fused.setdefault(hit["_id"], {"_id": hit["_id"], "_score": 0.0, "fields": hit["fields"]})
+            entry["_score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda hit: hit["_score"], reverse=True)[:top_k]
@@ -0,0 +1,102 @@
+"""OpenAI client construction shared by the agent and the data pipeline"""
+
+import os
+import threading
+from concurrent.futures import Future
+from openai import OpenAI
+
+from controller.admission import AdmissionController, AdmittedOpenAI
+from controller.cassette import record_openai, request_key
+from controller.llm_gateway import LLM_GATEWAY, LLMGateway, GatewayOpenAI
+from controller.http_transport import shared_http_client
+
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true").lower() == "true"
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers that arrive while a call for the same key is in
+    flight wait for it and receive the same result (or exception) instead of issuing their own.
+    """
+
+    def __init__(self):
+        self._in_flight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "executed": 0, "coalesced": 0}
+
+    def do(self, key: str, fn):
+        with self._lock:
+            self.stats["calls"] += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+                self.stats["executed"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return future.result()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "in_flight": len(self._in_flight)}
+
+
+# One group per process so identical requests from different modules coalesce too
+single_flight = SingleFlight()
+
+
+class _CoalescingResponses:
+    def __init__(self, responses, group: SingleFlight):
+        self._responses = responses
+        self._group = group
+
+    def parse(self, **kwargs):
+        # Keyed on model, prompt and schema; per-request user ids are ignored
+        key = request_key("responses.parse", kwargs)
+        return self._group.do(key, lambda: self._responses.parse(**kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._responses, name)
+
+
+class CoalescingOpenAI:
+    """OpenAI client proxy whose identical concurrent responses.parse calls share one request"""
+
+    def __init__(self, client, group: SingleFlight = single_flight):
+        self._client = client
+        self.responses = _CoalescingResponses(client.responses, group)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def create_openai_client(api_key: str | None = None, admission: AdmissionController | None = None):
+    # All clients share one pooled HTTP transport
+    sdk_client = OpenAI(api_key=api_key, http_client=shared_http_client())
+    recorded = record_openai(sdk_client)
+    # The gateway owns retries and timeouts for responses.parse when it is enabled; every other call
+    # (files, batches, responses.create) keeps the SDK's own retries
+    gateway_responses = recorded.responses
+    if LLM_GATEWAY:
+        gateway_responses = record_openai(sdk_client.with_options(max_retries=0)).responses
+    # Always installed so parse calls can pass node=; when disabled it passes calls straight through
+    client = GatewayOpenAI(recorded, LLMGateway(gateway_responses, passthrough=recorded.responses))
+    # Clients serving requests hold an admission slot per call; coalesced followers make no call of their own
+    if admission is not None:
+        client = AdmittedOpenAI(client, admission)
+    # Coalescing sits outside the gateway so hedged duplicates are not merged with their original
+    if SINGLE_FLIGHT:
+        client = CoalescingOpenAI(client)
+    return client
@@ -0,0 +1,243 @@
+"""Per-node latency policies for model calls: SLO, attempt timeouts, retries, hedging and a fallback model"""
+
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+LLM_GATEWAY = os.getenv("LLM_GATEWAY", "true").lower() == "true"
+LLM_HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", "32"))
+
+DEFAULT_POLICY = {
+    "slo_s": 60.0,
+    "attempt_timeout_s": 30.0,
+    "max_retries": 2,
+    "backoff_base_s": 0.5,
+    "backoff_max_s": 8.0,
+    "hedge": False,
+    # Hedge delay until the model has enough latency samples for a p95
+    "hedge_after_s": 5.0,
+    "fallback": None,
+    # Time kept back for the fallback until its own p95 is known
+    "fallback_reserve_s": 10.0,
+}
+
+NODE_POLICIES = {
+    # Interactive nodes: tight SLOs, hedged, answering falls back to the faster model
+    "ask_rag_bot": {"slo_s": 20.0, "attempt_timeout_s": 15.0, "hedge": True, "hedge_after_s": 4.0,
+                    "fallback": "gpt-4o-mini", "fallback_reserve_s": 6.0},
+    "rewrite_query": {"slo_s": 8.0, "attempt_timeout_s": 6.0, "hedge": True, "hedge_after_s": 2.0},
+    "plan_discovery_node": {"slo_s": 8.0, "attempt_timeout_s": 6.0, "hedge": True, "hedge_after_s": 2.0},
+    "summarize_history": {"slo_s": 15.0, "attempt_timeout_s": 10.0},
+    "reason_about_plans": {"slo_s": 60.0, "attempt_timeout_s": 45.0, "fallback": "gpt-4.1", "fallback_reserve_s": 15.0},
+    # Data pipeline nodes: nobody is waiting, so retry patiently instead of hedging or degrading
+    "plan_analysis": {"slo_s": 600.0, "attempt_timeout_s": 300.0, "max_retries": 4},
+    "fit_info_into_models": {"slo_s": 300.0, "attempt_timeout_s": 180.0, "max_retries": 4},
+    "generate_page_extraction": {"slo_s": 300.0, "attempt_timeout_s": 180.0, "max_retries": 4},
+    "generate_page_metadata": {"slo_s": 300.0, "attempt_timeout_s": 180.0, "max_retries": 4},
+    "generate_document_summary": {"slo_s": 120.0, "attempt_timeout_s": 60.0, "max_retries": 4},
+}
+
+RETRYABLE_ERRORS = (RateLimitError, InternalServerError, APIConnectionError)
+# Latency samples kept per model for the percentiles
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+
+class LLMDeadlineExceeded(Exception):
+    """Raised when a call could not complete within its node's SLO"""
+
+
+def load_policies(path: str | None = None) -> dict:
+    """Node policies, with per-field overrides from the JSON file at LLM_GATEWAY_CONFIG"""
+    path = path or os.getenv("LLM_GATEWAY_CONFIG")
+    policies = {node: {**DEFAULT_POLICY, **policy} for node, policy in NODE_POLICIES.items()}
+    if path:
+        with open(path) as f:
+            for node, policy in json.load(f).items():
+                policies[node] = {**policies.get(node, DEFAULT_POLICY), **policy}
+    return policies
+
+
+class LatencyTracker:
+    """Recent successful call latencies per model"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self.samples: dict[str, deque] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, model: str, seconds: float):
+        with self.lock:
+            self.samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model: str, p: float) -> float | None:
+        with self.lock:
+            samples = sorted(self.samples.get(model, ()))
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+# Shared by every client in the process, so all modules feed one set of percentiles and counters
+latency_tracker = LatencyTracker()
+hedge_executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+gateway_stats: dict[str, dict] = {}
+_stats_lock = threading.Lock()
+
+
+class LLMGateway:
+    """
+    client.responses replacement applying the node policies to parse calls.
+    parse goes to responses (normally a client without SDK retries, since the gateway retries itself);
+    everything else, e.g. responses.create, goes to passthrough with the SDK's retries.
+    """
+
+    def __init__(self, responses, policies: dict | None = None, enabled: bool = LLM_GATEWAY, passthrough=None):
+        self._responses = responses
+        self._passthrough = passthrough or responses
+        self.policies = load_policies() if policies is None else policies
+        self.enabled = enabled
+        self.latency = latency_tracker
+        self.executor = hedge_executor
+
+    def policy(self, node: str | None) -> dict:
+        return self.policies.get(node, DEFAULT_POLICY)
+
+    def count(self, node: str | None, event: str):
+        with _stats_lock:
+            node_stats = gateway_stats.setdefault(node or "unnamed", {
+                "calls": 0, "succeeded": 0, "retries": 0, "hedged": 0, "hedge_wins": 0,
+                "fallbacks": 0, "fallback_succeeded": 0, "timeouts": 0, "failures": 0
+            })
+            node_stats[event] += 1
+
+    def __getattr__(self, name):
+        return getattr(self._passthrough, name)
+
+    def parse(self, node: str | None = None, **kwargs):
+        if not self.enabled:
+            return self._responses.parse(**kwargs)
+
+        policy = self.policy(node)
+        self.count(node, "calls")
+        deadline = time.monotonic() + policy["slo_s"]
+        fallback = policy["fallback"] if policy["fallback"] != kwargs.get("model") else None
+
+        primary_deadline = deadline
+        if fallback:
+            reserve = self.latency.percentile(fallback, 0.95) or policy["fallback_reserve_s"]
+            primary_deadline = deadline - min(reserve, policy["slo_s"] / 2)
+
+        try:
+            response = self._attempts(node, kwargs, policy, primary_deadline)
+            self.count(node, "succeeded")
+            return response
+        except (LLMDeadlineExceeded, APITimeoutError, *RETRYABLE_ERRORS) as e:
+            if isinstance(e, (LLMDeadlineExceeded, APITimeoutError)):
+                self.count(node, "timeouts")
+            if not fallback or time.monotonic() >= deadline:
+                self.count(node, "failures")
+                raise
+            print(f"LLM gateway: {node} falling back from {kwargs.get('model')} to {fallback} ({type(e).__name__})")
+
+        self.count(node, "fallbacks")
+        fallback_kwargs = {**kwargs, "model": fallback}
+        if not fallback.startswith("o"):
+            # Reasoning options are only accepted by reasoning models
+            fallback_kwargs.pop("reasoning", None)
+        try:
+            response = self._attempts(node, fallback_kwargs, policy, deadline)
+        except Exception:
+            self.count(node, "failures")
+            raise
+        self.count(node, "fallback_succeeded")
+        return response
+
+    def _attempts(self, node: str | None, kwargs: dict, policy: dict, deadline: float):
+        """One model: retry 429/5xx/connection errors with jittered backoff until the deadline"""
+        model = kwargs.get("model")
+        for attempt in range(policy["max_retries"] + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMDeadlineExceeded(f"{node}: no time left for {model}")
+            try:
+                return self._hedged(node, kwargs, policy, min(policy["attempt_timeout_s"], remaining))
+            except APITimeoutError:
+                raise
+            except RETRYABLE_ERRORS as e:
+                delay = random.uniform(0, min(policy["backoff_max_s"], policy["backoff_base_s"] * 2 ** attempt))
+                retry_after = getattr(getattr(e, "response", None), "headers", {}).get("retry-after")
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+                # Not worth retrying if a typical response would not fit in what is left
+                expected = self.latency.percentile(model, 0.5) or 0.0
+                if attempt == policy["max_retries"] or time.monotonic() + delay + expected >= deadline:
+                    raise
+                self.count(node, "retries")
+                print(f"LLM gateway: {node} retrying {model} in {delay:.1f}s after {type(e).__name__}")
+                time.sleep(delay)
+
+    def _call(self, kwargs: dict, timeout: float):
+        start = time.monotonic()
+        response = self._responses.parse(**kwargs, timeout=timeout)
+        self.latency.observe(kwargs.get("model"), time.monotonic() - start)
+        return response
+
+    def _hedged(self, node: str | None, kwargs: dict, policy: dict, timeout: float):
+        """One attempt; a second identical request is sent if the first outlives the model's p95"""
+        if not policy["hedge"]:
+            return self._call(kwargs, timeout)
+
+        end = time.monotonic() + timeout
+        hedge_after = self.latency.percentile(kwargs.get("model"), 0.95) or policy["hedge_after_s"]
+        first = self.executor.submit(self._call, kwargs, timeout)
+        done, _ = wait([first], timeout=min(hedge_after, timeout))
+        if done:
+            return first.result()
+
+        self.count(node, "hedged")
+        second = self.executor.submit(self._call, kwargs, max(0.1, end - time.monotonic()))
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise LLMDeadlineExceeded(f"{node}: {kwargs.get('model')} did not answer within {timeout:.1f}s")
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self.count(node, "hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+
+
+def get_gateway_stats() -> dict:
+    """Per-node counters of each path (retry, hedge, fallback) and per-model latency percentiles"""
+    with _stats_lock:
+        stats = {node: dict(node_stats) for node, node_stats in gateway_stats.items()}
+    latency = {}
+    for model in list(latency_tracker.samples):
+        p50, p95 = latency_tracker.percentile(model, 0.5), latency_tracker.percentile(model, 0.95)
+        latency[model] = {"p50_ms": p50 * 1000 if p50 else None, "p95_ms": p95 * 1000 if p95 else None}
+    return {"nodes": stats, "latency": latency}
+
+
+class GatewayOpenAI:
+    """OpenAI client proxy whose responses.parse calls go through an LLMGateway"""
+
+    def __init__(self, client, gateway: LLMGateway):
+        self._client = client
+        self.responses = gateway
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
@@ -0,0 +1,39 @@
+"""Compact chat message records that still read like the {"role", "content"} dicts they replace"""
+
+from enum import Enum
+
+
+class Role(str, Enum):
+    USER = "user"
+    ASSISTANT = "assistant"
+    SYSTEM = "system"
+
+
+# Wire codes for the session serializer
+ROLE_CODES = {role: code for code, role in enumerate(Role)}
+ROLES_BY_CODE = list(Role)
+
+
+class Message:
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role: Role | str, content: str, tokens: int):
+        self.role = Role(role)
+        self.content = content
+        self.tokens = tokens
+
+    def __getitem__(self, key: str) -> str:
+        if key == "role":
+            return self.role.value
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self) -> str:
+        return f"Message({self.role.value!r}, {self.content!r}, tokens={self.tokens})"
@@ -0,0 +1,222 @@
+"""Deterministic local scoring of eligible plans from their metadata fields; the reasoning model explains the ranking"""
+
+import copy
+import json
+import os
+import numpy as np
+
+# Score used for fields a plan does not have or values the config does not know
+NEUTRAL_SCORE = 0.5
+
+DEFAULT_SCORING_CONFIG = {
+    "value_scores": {
+        "Network Type": {"National": 1.0, "Local": 1.0},
+        "PCP Requirement": {"Not Required": 1.0, "Optional": 0.8, "Required": 0.4},
+        "Auto PCP Assignment": {"Included": 0.8, "Optional": 0.7, "Not Included": 0.5},
+        "Referral Requirement": {"Not Required": 1.0, "Varies by Plan": 0.6, "Required": 0.3},
+        "Out-of-Network Coverage": {
+            "Available (no network restrictions)": 1.0,
+            "Included at a cost": 0.8,
+            "Emergencies Only": 0.3,
+            "Not Covered": 0.1
+        },
+        "Urgent/Emergent Services Coverage": {
+            "Included (any provider)": 1.0,
+            "Included (in-network level)": 0.8,
+            "Varies by plan": 0.5
+        },
+        "Funding Option": {"Fully Insured": 0.7, "Minimum Premium": 0.7, "Self-Funded (ASO)": 0.7},
+        "Self-funded Option Available": {"Yes": 0.7, "No": 0.5},
+        "HSA/HRA/FSA Option": {"Available": 1.0, "Not available": 0.3},
+        "Provider Network Access": {
+            "Any provider (Indemnity)": 1.0,
+            "In- and out-of-network": 0.8,
+            "In-network only": 0.4
+        }
+    },
+    "weights": {
+        "Network Type": 3.0,
+        "PCP Requirement": 1.0,
+        "Auto PCP Assignment": 0.5,
+        "Referral Requirement": 1.5,
+        "Out-of-Network Coverage": 2.0,
+        "Urgent/Emergent Services Coverage": 1.0,
+        "Funding Option": 1.5,
+        "Self-funded Option Available": 1.0,
+        "HSA/HRA/FSA Option": 1.5,
+        "Provider Network Access": 1.5
+    },
+    # Adjustments by business size bucket, see size_bucket
+    "size_adjustments": {
+        "small": {
+            "value_scores": {
+                "Funding Option": {"Fully Insured": 1.0, "Minimum Premium": 0.6, "Self-Funded (ASO)": 0.3},
+                "Self-funded Option Available": {"Yes": 0.5, "No": 0.6}
+            },
+            "weights": {"Funding Option": 2.0}
+        },
+        "mid": {
+            "value_scores": {
+                "Funding Option": {"Fully Insured": 0.8, "Minimum Premium": 1.0, "Self-Funded (ASO)": 0.7}
+            }
+        },
+        "large": {
+            "value_scores": {
+                "Funding Option": {"Fully Insured": 0.5, "Minimum Premium": 0.8, "Self-Funded (ASO)": 1.0},
+                "Self-funded Option Available": {"Yes": 1.0, "No": 0.2}
+            },
+            "weights": {"Funding Option": 2.0, "Self-funded Option Available": 2.0}
+        }
+    },
+    # Adjustments by coverage preference
+    "coverage_adjustments": {
+        "National": {"value_scores": {"Network Type": {"National": 1.0, "Local": 0.2}}},
+        "Local": {"value_scores": {"Network Type": {"National": 0.5, "Local": 1.0}}}
+    }
+}
+
+
+def _merge(base: dict, override: dict) -> dict:
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def load_scoring_config(path: str | None = None) -> dict:
+    """Scoring weights, merged with the overrides in the JSON file at PLAN_SCORING_CONFIG"""
+    path = path or os.getenv("PLAN_SCORING_CONFIG")
+    if not path:
+        return DEFAULT_SCORING_CONFIG
+    with open(path) as f:
+        return _merge(DEFAULT_SCORING_CONFIG, json.load(f))
+
+
+scoring_config = load_scoring_config()
+
+
+def size_bucket(business_size: int | None) -> str | None:
+    if business_size is None:
+        return None
+    if business_size < 100:
+        return "small"
+    if business_size < 500:
+        return "mid"
+    return "large"
+
+
+def profile_config(business_size: int | None, coverage_preference: str | None, config: dict = None) -> dict:
+    """Value scores and weights for one business profile"""
+    config = config or scoring_config
+    profile = {"value_scores": config["value_scores"], "weights": config["weights"]}
+    bucket = size_bucket(business_size)
+    if bucket in config.get("size_adjustments", {}):
+        profile = _merge(profile, config["size_adjustments"][bucket])
+    if coverage_preference in config.get("coverage_adjustments", {}):
+        profile = _merge(profile, config["coverage_adjustments"][coverage_preference])
+    return profile
+
+
+# Compiled profiles keyed by (config id, size bucket, coverage preference); there are only a handful
+_compiled_profiles: dict[tuple, tuple] = {}
+
+
+def _compiled_profile(business_size: int | None, coverage_preference: str | None, config: dict = None) -> tuple:
+    """Field order, normalized weight vector and value scores, built once per profile"""
+    config = config or scoring_config
+    key = (id(config), size_bucket(business_size), coverage_preference)
+    compiled = _compiled_profiles.get(key)
+    if compiled is None:
+        profile = profile_config(business_size, coverage_preference, config)
+        fields = list(profile["weights"])
+        weights = np.array([profile["weights"][field] for field in fields], dtype=np.float64)
+        compiled = (fields, weights / weights.sum(), [profile["value_scores"].get(field, {}) for field in fields])
+        _compiled_profiles[key] = compiled
+    return compiled
+
+
+def _value_score(value, scores: dict) -> float:
+    if isinstance(value, list):
+        known = [scores[v] for v in value if v in scores]
+        return max(known) if known else NEUTRAL_SCORE
+    return scores.get(value, NEUTRAL_SCORE)
+
+
+def rank_plans(plan_documents: list[dict], business_size: int | None, coverage_preference: str | None,
+               config: dict = None) -> list[dict]:
+    """
+    Score every plan out of 10 and return them best first.
+    Each entry has the plan name, overall score and the weighted contribution of every field.
+    """
+    if not plan_documents:
+        return []
+
+    fields, weights, value_scores = _compiled_profile(business_size, coverage_preference, config)
+    matrix = np.array([
+        [_value_score(doc.get(field), scores) for field, scores in zip(fields, value_scores)]
+        for doc in plan_documents
+    ], dtype=np.float64)
+
+    contributions = matrix * weights * 10
+    scores = contributions.sum(axis=1)
+    # Stable sort keeps MongoDB order for ties
+    order = np.argsort(-scores, kind="stable")
+
+    return [
+        {
+            "plan": plan_documents[i].get("Plan Type", "Unknown Plan"),
+            "score": round(float(scores[i]), 1),
+            "breakdown": {field: round(float(contributions[i, j]), 2) for j, field in enumerate(fields)},
+            "metadata": {field: plan_documents[i][field] for field in fields if plan_documents[i].get(field) is not None}
+        }
+        for i in order
+    ]
+
+
+def format_ranking(ranking: list[dict]) -> str:
+    """Ranking as prompt-ready text"""
+    lines = []
+    for position, entry in enumerate(ranking, 1):
+        lines.append(f"{position}. {entry['plan']} - Score: {entry['score']}/10")
+        for field, value in entry["metadata"].items():
+            lines.append(f"   - {field}: {value} (contributes {entry['breakdown'][field]})")
+    return "\n".join(lines)
+
+
+def format_ranking_report(ranking: list[dict], plan_summaries: dict, business_size, location, coverage_preference) -> str:
+    """Recommendation text built without a model, used when there are too few plans to compare"""
+    top = ranking[0]
+    strongest = sorted((item for item in top["breakdown"].items() if item[0] in top["metadata"]),
+                       key=lambda item: item[1], reverse=True)[:3]
+
+    lines = [
+        "## FINAL RANKING",
+        *[f"{position}. **{entry['plan']} - Overall Score: {entry['score']}/10**" for position, entry in enumerate(ranking, 1)],
+        "",
+        "## TOP RECOMMENDATION",
+        "",
+        f"**Recommended Plan: {top['plan']}**",
+        "",
+        f"For a business with {business_size} employees in {location} that prefers {coverage_preference} coverage, "
+        f"{top['plan']} is the strongest eligible option.",
+        "",
+        "**Key Benefits for This Business:**",
+        *[f"- {field}: {top['metadata'][field]}" for field, _ in strongest],
+    ]
+
+    if len(ranking) > 1:
+        runner_up = ranking[1]
+        lines += [
+            "",
+            "**Potential Considerations:**",
+            f"- {runner_up['plan']} scored {runner_up['score']}/10 and is also available to your business."
+        ]
+
+    summary = plan_summaries.get(top["plan"])
+    if summary:
+        lines += ["", f"**About {top['plan']}:**", summary]
+
+    return "\n".join(lines)
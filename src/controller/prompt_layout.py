@@ -0,0 +1,50 @@
+"""Prompt assembly for provider prefix caching: static instructions first, then history, then per-turn values"""
+
+import threading
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def load_prompt(name: str) -> str:
+    """Static prompt text from prompts/, read once per process"""
+    with open(f"prompts/{name}.txt") as f:
+        return f.read()
+
+
+def format_sections(sections: list[tuple[str, str]]) -> str:
+    return "\n\n".join(f"{title}:\n{body}" for title, body in sections)
+
+
+def build_input(prompt_name: str, sections: list[tuple[str, str]]) -> list[dict]:
+    """Static instructions first, then the dynamic sections in the order given (see the module docstring on prefix size)"""
+    return [
+        {"role": "developer", "content": load_prompt(prompt_name)},
+        {"role": "user", "content": format_sections(sections)}
+    ]
+
+
+prompt_cache_stats: dict[str, dict] = {}
+_stats_lock = threading.Lock()
+
+
+def record_usage(node: str, response) -> dict | None:
+    """Add a response's input and cached token counts to the node's counters"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    details = getattr(usage, "input_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", 0) or 0
+    with _stats_lock:
+        stats = prompt_cache_stats.setdefault(node, {"calls": 0, "input_tokens": 0, "cached_tokens": 0})
+        stats["calls"] += 1
+        stats["input_tokens"] += usage.input_tokens
+        stats["cached_tokens"] += cached_tokens
+    return {"input_tokens": usage.input_tokens, "cached_tokens": cached_tokens, "output_tokens": usage.output_tokens}
+
+
+def get_prompt_cache_stats() -> dict:
+    with _stats_lock:
+        return {
+            node: {**stats, "cached_ratio": stats["cached_tokens"] / stats["input_tokens"] if stats["input_tokens"] else 0.0}
+            for node, stats in prompt_cache_stats.items()
+        }
@@ -0,0 +1,169 @@
+"""Local intent router run before rewrite_query: small talk and vague questions are handled without the model"""
+
+import math
+import re
+from collections import Counter
+
+NO_RETRIEVAL = "no_retrieval"
+CLARIFY = "clarify"
+NEEDS_REWRITE = "needs_rewrite"
+
+# Below this confidence the router defers to the LLM rewrite
+CONFIDENCE_THRESHOLD = 0.75
+
+# Cosine similarity at which a labelled example counts as a full match
+MATCH_SIMILARITY = 0.6
+
+# Messages made up entirely of small talk phrases, e.g. "ok got it", "perfect, thanks"
+SMALL_TALK_PHRASE = (
+    r"(hi|hello|hey|hiya|howdy|yo|there|good (morning|afternoon|evening)|how are you|how'?s it going|"
+    r"thanks?( you)?( so much| a lot)?|thank you( so much| very much)?|thx|ty|"
+    r"ok(ay)?|k|cool|great|awesome|perfect|got it|sounds good|makes sense|"
+    r"bye|goodbye|see (you|ya)|have a (good|nice|great) (day|one)|"
+    r"that'?s (all|it)|nothing else|never ?mind)"
+)
+SMALL_TALK_PATTERN = re.compile(
+    rf"^{SMALL_TALK_PHRASE}([\s!.,?]+{SMALL_TALK_PHRASE})*[\s!.,?]*$",
+    re.IGNORECASE
+)
+
+# Questions about the assistant itself rather than about insurance
+ASSISTANT_META_PATTERN = re.compile(
+    r"^(what can you (do|help( me)? with)|who (are you|am i (talking|speaking) (to|with))|what are you|"
+    r"are you a (bot|robot|human|real person))[\s!.?]*$",
+    re.IGNORECASE
+)
+
+# Terms that cannot be searched without knowing more about the user
+VAGUE_REFERENCE_PATTERN = re.compile(
+    r"\b(my (state|area|plan|policy|coverage|doctor|injury|condition|situation|case)|"
+    r"this plan|that plan|the plan i have)\b",
+    re.IGNORECASE
+)
+
+# Vocabulary that signals an answerable insurance question
+INSURANCE_TERM_PATTERN = re.compile(
+    r"\b(hmo|ppo|epo|hsa|hra|fsa|oap|open access|localplus|surefit|indemnity|deductible|coinsurance|"
+    r"copays?|premiums?|out[- ]of[- ]pocket|network|in[- ]network|medicare|medicaid|dental|vision|"
+    r"pharmacy|prescriptions?|enroll(ment)?|referrals?|pcp|primary care|cobra|aca|marketplace|"
+    r"telehealth|virtual care|mental health|behavioral health|claims?|formulary)\b",
+    re.IGNORECASE
+)
+
+# Labelled example turns for nearest-neighbour routing
+LABELLED_EXAMPLES = [
+    ("hi there", NO_RETRIEVAL),
+    ("hello, how are you?", NO_RETRIEVAL),
+    ("thanks for the help", NO_RETRIEVAL),
+    ("thank you that was really helpful", NO_RETRIEVAL),
+    ("ok that makes sense", NO_RETRIEVAL),
+    ("great, that's all I needed", NO_RETRIEVAL),
+    ("bye for now", NO_RETRIEVAL),
+    ("who are you?", NO_RETRIEVAL),
+    ("what can you help me with?", NO_RETRIEVAL),
+    ("can you help me?", NO_RETRIEVAL),
+    ("I have another question", NO_RETRIEVAL),
+    ("never mind", NO_RETRIEVAL),
+    ("what is covered in my state?", CLARIFY),
+    ("is my injury covered?", CLARIFY),
+    ("does my plan cover this?", CLARIFY),
+    ("how much will it cost me?", CLARIFY),
+    ("is it covered?", CLARIFY),
+    ("what about my doctor?", CLARIFY),
+    ("can I get it cheaper?", CLARIFY),
+    ("what are my options?", CLARIFY),
+    ("what is a deductible?", NEEDS_REWRITE),
+    ("what is the difference between an HMO and a PPO?", NEEDS_REWRITE),
+    ("how does coinsurance work?", NEEDS_REWRITE),
+    ("can I use an HSA with my plan?", NEEDS_REWRITE),
+    ("what is the LocalPlus network?", NEEDS_REWRITE),
+    ("does Cigna cover out of network emergencies?", NEEDS_REWRITE),
+    ("when is open enrollment?", NEEDS_REWRITE),
+    ("how do I fill a prescription through home delivery?", NEEDS_REWRITE),
+    ("what does Medicare Part D cover?", NEEDS_REWRITE),
+    ("do I need a referral to see a specialist?", NEEDS_REWRITE),
+    ("what dental plans do you offer?", NEEDS_REWRITE),
+    ("tell me about virtual care options", NEEDS_REWRITE),
+    ("what about in Texas?", NEEDS_REWRITE),
+    ("and for a family?", NEEDS_REWRITE),
+]
+
+
+def _features(text: str) -> Counter:
+    """Bag of word unigrams and character trigrams, robust to typos in short turns"""
+    text = text.lower()
+    words = re.findall(r"[a-z0-9']+", text)
+    features = Counter(words)
+    for word in words:
+        padded = f"#{word}#"
+        features.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+def _norm(vector: Counter) -> float:
+    return math.sqrt(sum(v * v for v in vector.values()))
+
+
+def _cosine(a: Counter, a_norm: float, b: Counter, b_norm: float) -> float:
+    if not a_norm or not b_norm:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0) for k, v in a.items()) / (a_norm * b_norm)
+
+
+_EXAMPLE_VECTORS = [(_features(text), label) for text, label in LABELLED_EXAMPLES]
+_EXAMPLE_VECTORS = [(vector, _norm(vector), label) for vector, label in _EXAMPLE_VECTORS]
+
+
+def nearest_neighbour_route(user_query: str, k: int = 3) -> tuple[str, float]:
+    """Similarity-weighted vote over the k most similar labelled examples"""
+    query_vector = _features(user_query)
+    query_norm = _norm(query_vector)
+    scored = sorted(
+        ((_cosine(query_vector, query_norm, vector, norm), label) for vector, norm, label in _EXAMPLE_VECTORS),
+        reverse=True
+    )[:k]
+
+    votes = Counter()
+    for similarity, label in scored:
+        votes[label] += similarity
+    total = sum(votes.values())
+    if not total:
+        return NEEDS_REWRITE, 0.0
+
+    label, weight = votes.most_common(1)[0]
+    # Confidence combines agreement between neighbours with how close the best match is
+    return label, (weight / total) * min(1.0, scored[0][0] / MATCH_SIMILARITY)
+
+
+def route_query(user_query: str, has_history: bool = False) -> tuple[str, float]:
+    """
+    Decide whether a turn needs no retrieval, a clarifying question, or the LLM rewrite.
+    Returns the route and a confidence in [0, 1].
+    """
+    text = user_query.strip()
+    if not text:
+        return NO_RETRIEVAL, 1.0
+
+    if SMALL_TALK_PATTERN.match(text):
+        return NO_RETRIEVAL, 1.0
+
+    if ASSISTANT_META_PATTERN.match(text):
+        return NO_RETRIEVAL, 0.95
+
+    mentions_insurance = INSURANCE_TERM_PATTERN.search(text) is not None
+
+    # Vague references can only be clarified safely when there is no history that resolves them
+    if VAGUE_REFERENCE_PATTERN.search(text) and not mentions_insurance and not has_history:
+        return CLARIFY, 0.9
+
+    if mentions_insurance:
+        return NEEDS_REWRITE, 1.0
+
+    label, confidence = nearest_neighbour_route(text)
+
+    # Short follow-ups lean on earlier turns, let the rewrite resolve them
+    if has_history and label == CLARIFY:
+        return NEEDS_REWRITE, confidence
+    return label, confidence
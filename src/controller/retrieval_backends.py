@@ -0,0 +1,247 @@
+"""Retrieval backends behind query_db: hosted Pinecone or an on-disk index, both returning Pinecone-shaped hits"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+import numpy as np
+
+from controller.cassette import record_index
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class RetrievalBackend(ABC):
+    """Interface shared by all retrieval backends"""
+
+    @abstractmethod
+    def search(self, query: str, top_k: int = 5, rerank: bool = True) -> list[dict]:
+        ...
+
+    @abstractmethod
+    def upsert(self, records: list[dict]):
+        ...
+
+
+class PineconeBackend(RetrievalBackend):
+    def __init__(self, index, namespace: str, rerank_model: str = "bge-reranker-v2-m3", batch_size: int = 96):
+        self.index = index
+        self.namespace = namespace
+        self.rerank_model = rerank_model
+        self.batch_size = batch_size
+
+    def search(self, query: str, top_k: int = 5, rerank: bool = True) -> list[dict]:
+        search_kwargs = {}
+        if rerank:
+            search_kwargs["rerank"] = {
+                "model": self.rerank_model,
+                "top_n": top_k,
+                "rank_fields": ["chunk_text"]
+            }
+        results = self.index.search(
+            namespace=self.namespace,
+            query={
+                "inputs": {"text": query},
+                "top_k": top_k
+            },
+            fields=["chunk_text", "source"],
+            **search_kwargs
+        )
+        hits = results.get("result", {}).get("hits", [])
+        return [{"_id": hit["_id"], "_score": hit["_score"], "fields": dict(hit["fields"])} for hit in hits]
+
+    def upsert(self, records: list[dict]):
+        for i in range(0, len(records), self.batch_size):
+            batch = records[i:i + self.batch_size]
+            print(f"Upserting batch of {len(batch)} records to namespace '{self.namespace}'...")
+            self.index.upsert_records(self.namespace, batch)
+
+
+class SentenceEmbedder:
+    """Mean-pooled, L2-normalized sentence embeddings from a Hugging Face encoder on CPU"""
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, batch_size: int = 32):
+        from transformers import AutoTokenizer, AutoModel
+        import torch
+
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).eval()
+        self.batch_size = batch_size
+        self.dimensions = self.model.config.hidden_size
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        embeddings = []
+        for i in range(0, len(texts), self.batch_size):
+            batch = self.tokenizer(texts[i:i + self.batch_size], padding=True, truncation=True,
+                                   max_length=256, return_tensors="pt")
+            with self.torch.inference_mode():
+                output = self.model(**batch).last_hidden_state
+            mask = batch["attention_mask"].unsqueeze(-1).to(output.dtype)
+            pooled = (output * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            embeddings.append(self.torch.nn.functional.normalize(pooled, dim=-1).numpy())
+        return np.vstack(embeddings).astype(np.float32) if embeddings else np.zeros((0, 0), dtype=np.float32)
+
+
+class CrossEncoderReranker:
+    """Scores (query, passage) pairs with a local cross-encoder"""
+
+    def __init__(self, model_name: str = DEFAULT_RERANKER_MODEL):
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+        import torch
+
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+
+    def score(self, query: str, passages: list[str]) -> np.ndarray:
+        batch = self.tokenizer([query] * len(passages), passages, padding=True, truncation=True,
+                               max_length=512, return_tensors="pt")
+        with self.torch.inference_mode():
+            logits = self.model(**batch).logits.squeeze(-1)
+        return self.torch.sigmoid(logits).numpy()
+
+
+class LocalBackend(RetrievalBackend):
+    """
+    On-disk vector index populated from the same records upload_data sends to Pinecone.
+    Files in index_dir: records.jsonl (ids and fields), vectors.npy and, when quantized, scales.npy.
+    """
+
+    def __init__(self, index_dir: str, embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+                 reranker_model: str | None = None, quantize: bool = False):
+        self.index_dir = Path(index_dir)
+        self.embedding_model = embedding_model
+        self.reranker_model = reranker_model
+        self.quantize = quantize
+        self._embedder = None
+        self._reranker = None
+        self.records: list[dict] = []
+        self.vectors = None
+        self.scales = None
+        self.load()
+
+    @property
+    def embedder(self) -> SentenceEmbedder:
+        if self._embedder is None:
+            self._embedder = SentenceEmbedder(self.embedding_model)
+        return self._embedder
+
+    @property
+    def reranker(self) -> CrossEncoderReranker | None:
+        if self.reranker_model and self._reranker is None:
+            self._reranker = CrossEncoderReranker(self.reranker_model)
+        return self._reranker
+
+    def load(self):
+        """Memory-map the vector matrix if the index has been built"""
+        records_path = self.index_dir / "records.jsonl"
+        if not records_path.exists():
+            return
+        with open(records_path) as f:
+            self.records = [json.loads(line) for line in f]
+        self.vectors = np.load(self.index_dir / "vectors.npy", mmap_mode="r")
+        scales_path = self.index_dir / "scales.npy"
+        self.scales = np.load(scales_path) if scales_path.exists() else None
+
+    def _write(self, records: list[dict], vectors: np.ndarray):
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.vectors = None
+        with open(self.index_dir / "records.jsonl", "w") as f:
+            for record in records:
+                f.write(json.dumps(record, default=str) + "\n")
+
+        scales_path = self.index_dir / "scales.npy"
+        if self.quantize:
+            # Symmetric per-row int8 quantization, rows are unit length so scores stay comparable
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+            np.save(self.index_dir / "vectors.npy", np.round(vectors / scales[:, None]).astype(np.int8))
+            np.save(scales_path, scales.astype(np.float32))
+        else:
+            np.save(self.index_dir / "vectors.npy", vectors.astype(np.float32))
+            if scales_path.exists():
+                scales_path.unlink()
+        self.load()
+
+    def _dense_vectors(self) -> np.ndarray:
+        if self.vectors is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        # Copy out of the memory map so the files can be rewritten safely
+        if self.scales is not None:
+            return self.vectors.astype(np.float32) * self.scales[:, None]
+        return np.array(self.vectors, dtype=np.float32)
+
+    def upsert(self, records: list[dict]):
+        """Add or replace records by id, embedding only the records whose text changed"""
+        existing = {record["id"]: i for i, record in enumerate(self.records)}
+        old_vectors = self._dense_vectors()
+
+        merged = list(self.records)
+        vectors = [old_vectors[i] for i in range(len(self.records))]
+        to_embed = []
+        for record in records:
+            position = existing.get(record["id"])
+            if position is not None and merged[position].get("chunk_text") == record.get("chunk_text"):
+                merged[position] = record
+                continue
+            if position is None:
+                position = len(merged)
+                merged.append(record)
+                vectors.append(None)
+            else:
+                merged[position] = record
+            to_embed.append(position)
+
+        if to_embed:
+            print(f"Embedding {len(to_embed)} records locally...")
+            embedded = self.embedder.encode([merged[i].get("chunk_text", "") for i in to_embed])
+            for position, vector in zip(to_embed, embedded):
+                vectors[position] = vector
+
+        if merged:
+            self._write(merged, np.vstack(vectors))
+        print(f"Local index at {self.index_dir} holds {len(merged)} records")
+
+    def search(self, query: str, top_k: int = 5, rerank: bool = True) -> list[dict]:
+        if self.vectors is None or not self.records:
+            return []
+
+        query_vector = self.embedder.encode([query])[0]
+        scores = self.vectors @ query_vector
+        if self.scales is not None:
+            scores = scores * self.scales
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        candidates = [(self.records[i], float(scores[i])) for i in top]
+
+        if rerank and self.reranker is not None:
+            rerank_scores = self.reranker.score(query, [record.get("chunk_text", "") for record, _ in candidates])
+            candidates = sorted(zip((record for record, _ in candidates), rerank_scores.tolist()),
+                                key=lambda pair: pair[1], reverse=True)
+
+        return [
+            {"_id": record["id"], "_score": score, "fields": {key: value for key, value in record.items() if key != "id"}}
+            for record, score in candidates
+        ]
+
+
+def create_retrieval_backend(name: str, namespace: str | None = None) -> RetrievalBackend:
+    """Build the backend selected by RETRIEVAL_BACKEND"""
+    if name == "local":
+        return LocalBackend(
+            index_dir=os.getenv("LOCAL_INDEX_DIR", "local_index"),
+            embedding_model=os.getenv("LOCAL_EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL),
+            reranker_model=os.getenv("LOCAL_RERANKER_MODEL") or None,
+            quantize=os.getenv("LOCAL_INDEX_INT8", "false").lower() == "true"
+        )
+
+    if name == "pinecone":
+        from controller.http_transport import shared_pinecone_index
+
+        index = record_index(shared_pinecone_index(os.getenv("PINECONE_API_KEY"), os.getenv("PINECONE_INDEX_HOST")))
+        return PineconeBackend(index, namespace)
+
+    raise ValueError(f"Unknown retrieval backend: {name}")
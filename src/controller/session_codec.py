@@ -0,0 +1,89 @@
+"""msgpack serialization of SessionState"""
+
+import sys
+import numpy as np
+
+from controller.conversation_memory import HashingEmbedder
+from controller.entity_memory import EntityRecord
+from controller.messages import Message, ROLE_CODES, ROLES_BY_CODE
+from models.schemas import PlanDiscoveryAnswers
+
+SESSION_FORMAT_VERSION = 1
+
+
+def _pack_messages(messages: list[Message]) -> list[list]:
+    return [[ROLE_CODES[message.role], message.content, message.tokens] for message in messages]
+
+
+def _unpack_messages(rows: list[list]) -> list[Message]:
+    return [Message(ROLES_BY_CODE[code], content, tokens) for code, content, tokens in rows]
+
+
+def _pack_entity(key: str, record: EntityRecord) -> list:
+    return [key, record.text, record.label, record.hits, record.last_turn, record.max_score]
+
+
+def pack_session(session) -> bytes:
+    import msgpack
+
+    entities = session.extracted_entities
+    memory = session.conversation_memory
+    vectors = None
+    # Sentence encoder embeddings are stored; hashed ones are cheaper to recompute on load
+    if memory is not None and memory.vectors is not None and not isinstance(memory.embedder, HashingEmbedder):
+        vectors = [memory.vectors.shape[1], memory.vectors[:len(memory)].astype(np.float32).tobytes()]
+
+    payload = {
+        "version": SESSION_FORMAT_VERSION,
+        "user_id": session.user_id,
+        "turn": session.turn,
+        "history": _pack_messages(session.chat_history),
+        "vectors": vectors,
+        "answers": session.plan_discovery_answers.model_dump() if session.plan_discovery_answers else None,
+        "entities": [_pack_entity(key, entities.records[key]) for key in entities.ranking],
+        "entities_evicted": entities.evicted,
+        "discovery_delta": _pack_messages(session.discovery_delta),
+        "last_prompt_budget": session.last_prompt_budget,
+        "last_usage": session.last_usage,
+        "last_response_id": session.last_response_id,
+    }
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def unpack_session(data: bytes, session):
+    """Fill a freshly created SessionState from pack_session's bytes"""
+    import msgpack
+
+    payload = msgpack.unpackb(data, raw=False)
+    if payload["version"] != SESSION_FORMAT_VERSION:
+        raise ValueError(f"Unsupported session format version: {payload['version']}")
+
+    session.user_id = payload["user_id"]
+    session.turn = payload["turn"]
+    history = _unpack_messages(payload["history"])
+    if session.conversation_memory is not None:
+        vectors = None
+        if payload["vectors"]:
+            dimensions, raw = payload["vectors"]
+            vectors = np.frombuffer(raw, dtype=np.float32).reshape(-1, dimensions)
+        # Vectors from a different embedding model than the current one are discarded and recomputed
+        session.conversation_memory.restore(history, vectors)
+    else:
+        session.chat_history = history
+
+    answers = payload["answers"]
+    session.plan_discovery_answers = PlanDiscoveryAnswers(**answers) if answers else None
+
+    entities = session.extracted_entities
+    for key, text, label, hits, last_turn, max_score in payload["entities"]:
+        record = EntityRecord(text, sys.intern(label), last_turn, max_score)
+        record.hits = hits
+        entities.records[sys.intern(key)] = record
+    entities.ranking = list(entities.records)
+    entities.evicted = payload["entities_evicted"]
+
+    session.discovery_delta = _unpack_messages(payload["discovery_delta"])
+    session.last_prompt_budget = payload["last_prompt_budget"]
+    session.last_usage = payload["last_usage"]
+    session.last_response_id = payload["last_response_id"]
+    return session
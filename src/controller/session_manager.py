@@ -1,4 +1,9 @@
+import asyncio
+import math
+import os
+import time
 import uuid
+from contextlib import asynccontextmanager
 from typing import Optional, Dict
 from datetime import datetime
 from fastapi import HTTPException
@@ -10,6 +15,28 @@ from models.api_models import JobInfo, JobStatus
 # In-memory session storage (in production, use Redis)
 sessions: Dict[str, SessionState] = {}
 
+# How long a turn waits for the session's earlier turns before it is rejected with 429
+SESSION_LOCK_TIMEOUT = float(os.getenv("SESSION_LOCK_TIMEOUT", "30"))
+# Weight of the newest turn in the turn time moving average
+TURN_TIME_SMOOTHING = 0.2
+
+
+class SessionLock:
+    """Lock serializing one session's turns, counting the turns that hold or wait for it"""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+        self.turn_time = 1.0
+
+    def retry_after(self) -> int:
+        """Seconds until the turns ahead of a waiting one should have finished"""
+        return max(1, math.ceil(self.turn_time * max(1, self.users - 1)))
+
+
+# One lock per session so a session's turns run one at a time, in arrival order
+session_locks: Dict[str, SessionLock] = {}
+
 # Global job store (in production, use Redis or database)
 jobs_store: Dict[str, JobInfo] = {}
 
@@ -26,6 +53,38 @@ def get_session(session_id: str) -> SessionState:
     return sessions[session_id]
 
 
+@asynccontextmanager
+async def session_lock(session_id: str, timeout: float = SESSION_LOCK_TIMEOUT):
+    """Hold the session's lock for one turn; raises 429 with Retry-After if it is not free within timeout"""
+    entry = session_locks.setdefault(session_id, SessionLock())
+    entry.users += 1
+    try:
+        try:
+            await asyncio.wait_for(entry.lock.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=429, detail="An earlier turn of this session is still running",
+                                headers={"Retry-After": str(entry.retry_after())})
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            entry.turn_time += TURN_TIME_SMOOTHING * (time.monotonic() - start - entry.turn_time)
+            entry.lock.release()
+    finally:
+        entry.users -= 1
+        # The lock of a deleted session is dropped by the last turn that used it
+        if entry.users == 0 and session_id not in sessions and session_locks.get(session_id) is entry:
+            del session_locks[session_id]
+
+
+def delete_session_state(session_id: str):
+    """Remove a session, and its lock unless turns still hold or wait for it"""
+    del sessions[session_id]
+    entry = session_locks.get(session_id)
+    if entry is not None and entry.users == 0:
+        del session_locks[session_id]
+
+
 def create_job(job_name: Optional[str] = None) -> str:
     """Create a new job and return job ID"""
     job_id = str(uuid.uuid4())
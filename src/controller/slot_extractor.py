@@ -0,0 +1,211 @@
+"""Local extraction of the plan discovery slots; turns it cannot read unambiguously are left to the model"""
+
+import re
+
+# Separator token in trie_pattern: any run of spaces and hyphens
+SEPARATOR = object()
+
+
+def _trie_tokens(term: str, flexible_separators: bool) -> list:
+    tokens = []
+    for char in term.strip().lower():
+        if flexible_separators and char in " -":
+            if not tokens or tokens[-1] is not SEPARATOR:
+                tokens.append(SEPARATOR)
+        else:
+            tokens.append(char)
+    return tokens
+
+
+def trie_pattern(terms, flexible_separators: bool = False) -> str:
+    """
+    Regex alternation of terms factored by common prefix ("ne(?:w (?:york|jersey)|vada)"), so the engine
+    checks one branch per character instead of every term at every position. Longer terms win over their
+    prefixes. Meant for re.IGNORECASE patterns; with flexible_separators spaces and hyphens inside a term
+    match any run of spaces and hyphens.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for token in _trie_tokens(term, flexible_separators):
+            node = node.setdefault(token, {})
+        node[None] = {}
+
+    def emit(node: dict) -> str:
+        branches = [(r"[\s-]*" if token is SEPARATOR else re.escape(token)) + emit(child)
+                    for token, child in node.items() if token is not None]
+        if not branches:
+            return ""
+        if len(branches) == 1 and None not in node:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if None in node else group
+
+    return emit(trie)
+
+
+US_STATES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA",
+    "colorado": "CO", "connecticut": "CT", "delaware": "DE", "florida": "FL", "georgia": "GA",
+    "hawaii": "HI", "idaho": "ID", "illinois": "IL", "indiana": "IN", "iowa": "IA",
+    "kansas": "KS", "kentucky": "KY", "louisiana": "LA", "maine": "ME", "maryland": "MD",
+    "massachusetts": "MA", "michigan": "MI", "minnesota": "MN", "mississippi": "MS", "missouri": "MO",
+    "montana": "MT", "nebraska": "NE", "nevada": "NV", "new hampshire": "NH", "new jersey": "NJ",
+    "new mexico": "NM", "new york": "NY", "north carolina": "NC", "north dakota": "ND", "ohio": "OH",
+    "oklahoma": "OK", "oregon": "OR", "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC",
+    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT",
+    "virginia": "VA", "washington": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+    "district of columbia": "DC", "washington dc": "DC", "washington d.c.": "DC"
+}
+STATE_CODES = frozenset(US_STATES.values())
+
+# Abbreviations that are also common words; only accepted after "in" or a comma and at the end of a clause ("Boston, MA")
+AMBIGUOUS_CODES = frozenset({"IN", "OR", "ME", "OK", "HI", "OH", "DE", "PA", "LA", "CO", "ID", "MO", "AL", "MA", "MD"})
+
+# Longer names win, so "west virginia" beats "virginia" and "washington dc" beats "washington"
+# A name ending a sentence ("Columbus, Ohio.") counts; one running into a dotted word does not
+STATE_NAME_PATTERN = re.compile(r"\b(" + trie_pattern(US_STATES) + r")(?!\w|\.\w)", re.IGNORECASE)
+STATE_CODE_PATTERN = re.compile(r"(?:\b(in|,)\s*)?\b([A-Z]{2})\b")
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+    "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16,
+    "seventeen": 17, "eighteen": 18, "nineteen": 19, "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90, "hundred": 100, "a hundred": 100,
+    "a thousand": 1000, "dozen": 12, "a dozen": 12
+}
+NUMBER_PATTERN = r"(\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?\s*k\b|\d+|" + trie_pattern(NUMBER_WORDS) + r")"
+HEADCOUNT_NOUNS = r"(?:full[- ]time\s+)?(?:employees|employee|employe|people|persons|staff|workers|members|folks|heads|ftes?|team members)"
+
+# "120 employees", "a team of 40", "headcount is 1,200", "we employ 75"
+SIZE_PATTERNS = [
+    # Not inside a word, a larger number or an amount ("$450 per employee")
+    re.compile(r"(?<![\w$.,])" + NUMBER_PATTERN + r"\s+(?:\w+\s+)?" + HEADCOUNT_NOUNS + r"\b", re.IGNORECASE),
+    re.compile(r"\b(?:team|staff|company|business|workforce|group) of\s+(?:about\s+|around\s+|roughly\s+)?" + NUMBER_PATTERN, re.IGNORECASE),
+    re.compile(r"\b(?:headcount|employee count|size)\s+(?:is|of|=)?\s*(?:about\s+|around\s+|roughly\s+)?" + NUMBER_PATTERN, re.IGNORECASE),
+    # "have"/"has" only count with a headcount noun (first pattern); "we have 2 questions" is not a size
+    re.compile(r"\bemploys?\s+(?:about\s+|around\s+|roughly\s+)?" + NUMBER_PATTERN + r"\b(?!\s*(?:states|locations|offices|years))", re.IGNORECASE),
+]
+# A reply that is only a number ("about 250"), accepted when the business size is still missing
+BARE_NUMBER_PATTERN = re.compile(r"^\W*(?:about|around|roughly|approximately|we have|it's|its)?\s*" + NUMBER_PATTERN + r"\W*$", re.IGNORECASE)
+SOLO_PATTERN = re.compile(r"\b(?:just me|only me|just myself|only myself|sole proprietor|one-person|one person (?:business|company|shop)|solopreneur)\b", re.IGNORECASE)
+
+NATIONAL_PATTERN = re.compile(r"\b(?:national(?:ly)?|nationwide|nation-wide|across the (?:country|us|u\.s\.)|all over the (?:country|us|usa|u\.s\.)|multiple states|coast to coast)\b", re.IGNORECASE)
+LOCAL_PATTERN = re.compile(r"\b(?:local(?:ly)?|regional|in-state|in state|close to home|nearby)\b", re.IGNORECASE)
+
+# Signals that the deterministic reading may be wrong and the model should decide
+UNCERTAIN_PATTERN = re.compile(
+    r"\b(?:not sure|unsure|don'?t know|no idea|maybe|either|between|or\b|depends|not in (?:the )?(?:us|usa|u\.s\.|america|united states)|outside (?:the )?(?:us|usa|u\.s\.|america|united states)|abroad)\b",
+    re.IGNORECASE
+)
+# A question needs an answer the canned acknowledgement cannot give ("...national coverage. What does PPO mean?")
+QUESTION_PATTERN = re.compile(
+    r"\?|(?:^|[.!;]\s*)(?:what|how|why|which|who|where|when|can|could|does|do|is|are|should|would|will)\b",
+    re.IGNORECASE
+)
+NEGATION_PATTERN = re.compile(r"\b(?:not|n't|no|never|rather than|instead of)\s+(?:\w+\s+)?(?:local|national|nationwide)\b", re.IGNORECASE)
+
+
+def parse_number(text: str) -> int | None:
+    text = text.strip().lower()
+    if text in NUMBER_WORDS:
+        return NUMBER_WORDS[text]
+    if text.endswith("k"):
+        return int(float(text[:-1].strip()) * 1000)
+    try:
+        return int(float(text.replace(",", "")))
+    except ValueError:
+        return None
+
+
+def extract_business_size(text: str, expecting_size: bool = False) -> tuple[int | None, bool]:
+    """Employee count in the text and whether several different counts were found"""
+    if SOLO_PATTERN.search(text):
+        return 1, False
+
+    values = set()
+    for pattern in SIZE_PATTERNS:
+        for match in pattern.finditer(text):
+            value = parse_number(match.group(1))
+            if value is not None and value > 0:
+                values.add(value)
+
+    if not values and expecting_size:
+        match = BARE_NUMBER_PATTERN.match(text)
+        if match:
+            value = parse_number(match.group(1))
+            if value is not None and value > 0:
+                values.add(value)
+
+    if len(values) == 1:
+        return values.pop(), False
+    return None, len(values) > 1
+
+
+def find_states(text: str) -> list[tuple[str, str, tuple[int, int]]]:
+    """Every state mention in the text as (text as written, two-letter code, span)"""
+    mentions = []
+    covered = []
+    for match in STATE_NAME_PATTERN.finditer(text):
+        mentions.append((match.group(1), US_STATES[match.group(1).lower()], match.span(1)))
+        covered.append(match.span())
+
+    for match in STATE_CODE_PATTERN.finditer(text):
+        prefix, code = match.group(1), match.group(2)
+        if code not in STATE_CODES or any(start <= match.start(2) < end for start, end in covered):
+            continue
+        if code in AMBIGUOUS_CODES:
+            # "in OK shape" is not a location, "based in OK." and "Tulsa, OK" are
+            following = text[match.end(2):].lstrip()
+            if not prefix or (following and following[0] not in ".,!?;"):
+                continue
+        mentions.append((code, code, match.span(2)))
+    return mentions
+
+
+def extract_location(text: str) -> tuple[str | None, bool]:
+    """Two-letter state code in the text and whether several different states were found"""
+    states = {code for _, code, _ in find_states(text)}
+
+    if len(states) == 1:
+        return states.pop(), False
+    return None, len(states) > 1
+
+
+def extract_coverage_preference(text: str) -> tuple[str | None, bool]:
+    """"National" or "Local" and whether the preference is unclear"""
+    national = bool(NATIONAL_PATTERN.search(text))
+    local = bool(LOCAL_PATTERN.search(text))
+    if national and local:
+        return None, True
+    if (national or local) and NEGATION_PATTERN.search(text):
+        return None, True
+    if national:
+        return "National", False
+    if local:
+        return "Local", False
+    return None, False
+
+
+def extract_slots(text: str, current: dict | None = None) -> tuple[dict, bool]:
+    """
+    Slots stated in one user message, as a dict of the PlanDiscoveryAnswers fields that were found,
+    and whether the message is ambiguous or asks something and needs the model.
+    current holds the answers collected so far and lets a bare number answer a pending size question.
+    """
+    current = current or {}
+    size, size_conflict = extract_business_size(text, expecting_size=current.get("business_size") is None)
+    location, location_conflict = extract_location(text)
+    coverage, coverage_conflict = extract_coverage_preference(text)
+
+    slots = {}
+    if size is not None:
+        slots["business_size"] = size
+    if location is not None:
+        slots["location"] = location
+    if coverage is not None:
+        slots["coverage_preference"] = coverage
+
+    ambiguous = (size_conflict or location_conflict or coverage_conflict or bool(UNCERTAIN_PATTERN.search(text))
+                 or bool(QUESTION_PATTERN.search(text)))
+    return slots, ambiguous
@@ -0,0 +1,138 @@
+"""History summarizers for manage_token_limit: local extractive (default) or gpt-4o-mini, selected by SUMMARIZER"""
+
+import re
+from abc import ABC, abstractmethod
+
+from controller.context_packer import count_tokens
+from controller.slot_extractor import US_STATES
+from models.schemas import SummaryResponse
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+NUMBER_PATTERN = re.compile(r"\$?\d[\d,]*(?:\.\d+)?%?")
+DOMAIN_TERMS = re.compile(
+    r"\b(hmo|ppo|epo|pos|hsa|hra|fsa|hdhp|deductibles?|copays?|coinsurance|premiums?|out[- ]of[- ]network|"
+    r"in[- ]network|networks?|employees?|staff|workers|national|local|nationwide|referrals?|pcp|"
+    r"primary care|pharmacy|prescriptions?|dental|vision|coverage|plans?|budget)\b",
+    re.IGNORECASE
+)
+STATE_NAMES = re.compile(r"\b(" + "|".join(re.escape(name) for name in sorted(US_STATES, key=len, reverse=True)) + r")\b", re.IGNORECASE)
+# Pleasantries and filler that never carry profile information
+FILLER = re.compile(r"^(hi|hello|hey|thanks|thank you|ok|okay|sure|great|sounds good|got it|perfect)\b[\s!.,]*$", re.IGNORECASE)
+
+# Sentence score weights
+ENTITY_WEIGHT = 3.0
+NUMBER_WEIGHT = 2.0
+STATE_WEIGHT = 3.0
+TERM_WEIGHT = 1.0
+MAX_TERMS = 2
+# Users state facts about their business; assistant turns are mostly questions and explanations
+USER_WEIGHT = 1.5
+SUMMARY_WEIGHT = 1.5
+SUMMARY_PREFIX = "[CONVERSATION SUMMARY]"
+QUESTION_PENALTY = 0.5
+
+
+class Summarizer(ABC):
+    """Interface shared by all summarizers"""
+
+    @abstractmethod
+    def summarize(self, messages: list[dict], entities: list[dict], user_id: str | None = None) -> str:
+        ...
+
+
+class LLMSummarizer(Summarizer):
+    def __init__(self, client, model: str = "gpt-4o-mini"):
+        self.client = client
+        self.model = model
+
+    def summarize(self, messages: list[dict], entities: list[dict], user_id: str | None = None) -> str:
+        conversation_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
+
+        # Create summarization prompt
+        summary_prompt = f"""Summarize the following conversation while preserving key insurance-related information, preferences, and business details:
+
+{conversation_text}
+
+Provide a concise summary that maintains important context for insurance discussions."""
+
+        response = self.client.responses.parse(
+            node="summarize_history",
+            model=self.model,
+            input=[{"role": "system", "content": summary_prompt}],
+            user=user_id,
+            text_format=SummaryResponse
+        )
+        return response.output_parsed.summary
+
+
+class ExtractiveSummarizer(Summarizer):
+    """
+    Keeps the highest-scoring sentences within ratio of the input's tokens (at least min_tokens).
+    Sentences of an earlier summary in the chunk compete with the rest, with a bonus, so facts survive
+    repeated compaction while the summary stays within budget.
+    """
+
+    def __init__(self, ratio: float = 0.5, min_tokens: int = 60):
+        self.ratio = ratio
+        self.min_tokens = min_tokens
+
+    def score(self, sentence: str, role: str, entity_texts: list[str]) -> float:
+        lowered = sentence.lower()
+        score = ENTITY_WEIGHT * sum(1 for text in entity_texts if text in lowered)
+        score += NUMBER_WEIGHT * len(NUMBER_PATTERN.findall(sentence))
+        score += STATE_WEIGHT * len(STATE_NAMES.findall(sentence))
+        # Capped so term-dense explanations do not outrank the user's own facts
+        score += TERM_WEIGHT * min(MAX_TERMS, len(DOMAIN_TERMS.findall(sentence)))
+        if role == "user":
+            score *= USER_WEIGHT
+        elif role == "summary":
+            score *= SUMMARY_WEIGHT
+        if sentence.rstrip().endswith("?"):
+            score *= QUESTION_PENALTY
+        # Prefer dense sentences over long ones with the same facts
+        return score / (1 + count_tokens(sentence) / 40)
+
+    def summarize(self, messages: list[dict], entities: list[dict], user_id: str | None = None) -> str:
+        entity_texts = sorted({entity["text"].lower().strip() for entity in entities if len(entity["text"].strip()) > 1})
+
+        candidates, seen = [], set()
+        for message in messages:
+            role, content = message["role"], message["content"]
+            if content.startswith(SUMMARY_PREFIX):
+                role, content = "summary", content.removeprefix(SUMMARY_PREFIX)
+            for sentence in SENTENCE_SPLIT.split(content):
+                sentence = sentence.strip()
+                key = sentence.lower()
+                if not sentence or FILLER.match(sentence) or key in seen:
+                    continue
+                seen.add(key)
+                candidates.append((len(candidates), role, sentence))
+
+        input_tokens = count_tokens("\n".join(f"{m['role']}: {m['content']}" for m in messages))
+        budget = max(self.min_tokens, int(input_tokens * self.ratio))
+
+        scored = sorted(((self.score(sentence, role, entity_texts), position, role, sentence)
+                         for position, role, sentence in candidates), key=lambda c: c[0], reverse=True)
+        chosen, used = [], 0
+        for score, position, role, sentence in scored:
+            # Sentences from an earlier summary already read as a summary
+            text = sentence if role == "summary" else f"{role.capitalize()}: {sentence}"
+            tokens = count_tokens(text)
+            if used + tokens > budget:
+                continue
+            if score <= 0 and chosen:
+                break
+            chosen.append((position, text))
+            used += tokens
+
+        chosen.sort()
+        return " ".join(text for _, text in chosen)
+
+
+def create_summarizer(name: str, client=None) -> Summarizer:
+    """Build the summarizer selected by SUMMARIZER"""
+    if name == "extractive":
+        return ExtractiveSummarizer()
+    if name == "llm":
+        return LLMSummarizer(client)
+    raise ValueError(f"Unknown summarizer: {name}")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, HttpUrl
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from enum import Enum
 from datetime import datetime
 from models.schemas import PlanDiscoveryAnswers
@@ -56,8 +56,12 @@ class ScrapeRequest(BaseModel):
 
 class ProcessRequest(BaseModel):
     job_name: Optional[str] = None
+    extraction_mode: Literal["separate", "combined"] = "separate"  # "combined" extracts metadata and summary in one call
+    batch_mode: bool = False  # Run extraction through the Batch API instead of one request at a time
 
 
 class ScrapeAndProcessRequest(BaseModel):
     urls: Optional[List[HttpUrl]] = None  # If None, use default plan_links
-    job_name: Optional[str] = None
\ No newline at end of file
+    job_name: Optional[str] = None
+    extraction_mode: Literal["separate", "combined"] = "separate"
+    batch_mode: bool = False  # Run extraction through the Batch API instead of one request at a time
\ No newline at end of file
@@ -1,6 +1,8 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from typing import List, Optional
 import uvicorn
 from datetime import datetime
 from pathlib import Path
@@ -10,8 +12,14 @@ from controller.insurance_agent import (
     SessionState, 
     ask_rag_bot, 
     plan_discovery_node,
-    search_eligible_plans,
-    reason_about_plans
+    search_eligible_plan_documents,
+    summaries_by_plan,
+    reason_about_plans,
+    get_speculative_stats,
+    router_stats,
+    discovery_stats,
+    single_flight,
+    get_prompt_cache_stats
 )
 from models.api_models import (
     ChatRequest,
@@ -29,24 +37,30 @@ from controller.session_manager import (
     jobs_store,
     create_session_id,
     get_session,
+    session_lock,
+    delete_session_state,
     create_job,
     update_job_status,
     get_job_info
 )
 
+from controller.admission import admission, AdmissionRejected
+from controller.idempotency import idempotency_cache, fingerprint
+from controller.llm_gateway import get_gateway_stats
+from controller.http_transport import HTTP_PREWARM, prewarm, get_transport_stats
 import data_processing.smart_scraper as smart_scraper
 from data_processing.generate_insurance_plans import (
     plan_analysis, 
     process_pages_to_mongodb, 
-    generate_pydantic_models,
+    model_registry,
     mongo_client,
     collection,
     models_collection,
     plan_links,
     check_models_exist_in_mongodb,
-    load_models_from_mongodb,
     upload_local_models_to_mongodb
 )
+from data_processing.batch_extraction import process_pages_in_batch
 
 app = FastAPI(
     title="Health Insurance Chatbot API",
@@ -66,6 +80,13 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def prewarm_connections():
+    """Open the OpenAI and Pinecone connections before the first request needs them"""
+    if HTTP_PREWARM:
+        await asyncio.to_thread(prewarm)
+
+
 @app.get("/")
 async def root():
     return {"message": "Cigna Insurance Chatbot API is running"}
@@ -85,82 +106,125 @@ async def create_session():
         "message": "Session created successfully"
     }
 
+@asynccontextmanager
+async def session_turn(session_id: str):
+    """
+    Run one turn of a session after the session's earlier turns have finished. The turn's model calls
+    are admitted one by one; a rejected call ends the turn with 429/503 and Retry-After.
+    """
+    session = get_session(session_id)
+    async with session_lock(session_id):
+        try:
+            yield session
+        except AdmissionRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
 @app.post("/chat/{session_id}", response_model=ChatResponse)
-async def chat_endpoint(session_id: str, request: ChatRequest):
+async def chat_endpoint(session_id: str, request: ChatRequest, response: Response,
+                        idempotency_key: Optional[str] = Header(None)):
     """General chat endpoint using RAG"""
-    try:
-        session = get_session(session_id)
-        response = ask_rag_bot(request.message, session)
-        
-        return ChatResponse(
-            response=response,
-            session_id=session_id
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
+    async def compute():
+        async with session_turn(session_id) as session:
+            try:
+                # Model calls block, so they run off the event loop
+                answer = await asyncio.to_thread(ask_rag_bot, request.message, session)
+                
+                return ChatResponse(
+                    response=answer,
+                    session_id=session_id
+                )
+            except AdmissionRejected:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
+
+    # Retries with the same Idempotency-Key get the first request's answer
+    result, replayed = await idempotency_cache.run(f"chat:{session_id}", idempotency_key, fingerprint(request.message), compute)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
 @app.post("/plan-discovery/{session_id}", response_model=PlanDiscoveryResponseModel)
-async def plan_discovery_endpoint(session_id: str, request: PlanDiscoveryRequest):
+async def plan_discovery_endpoint(session_id: str, request: PlanDiscoveryRequest, response: Response,
+                                  idempotency_key: Optional[str] = Header(None)):
     """Plan discovery endpoint to collect business profile information"""
-    try:
-        session = get_session(session_id)
-        response = plan_discovery_node(request.message, session)
-        
-        # Check if plan discovery is complete
-        is_complete = (
-            session.plan_discovery_answers is not None and
-            session.plan_discovery_answers.business_size is not None and
-            session.plan_discovery_answers.location is not None and
-            session.plan_discovery_answers.coverage_preference is not None
-        )
-        
-        return PlanDiscoveryResponseModel(
-            response=response,
-            session_id=session_id,
-            plan_discovery_answers=session.plan_discovery_answers,
-            is_complete=is_complete
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Plan discovery error: {str(e)}")
+    async def compute():
+        async with session_turn(session_id) as session:
+            try:
+                answer = await asyncio.to_thread(plan_discovery_node, request.message, session)
+                
+                # Check if plan discovery is complete
+                is_complete = (
+                    session.plan_discovery_answers is not None and
+                    session.plan_discovery_answers.business_size is not None and
+                    session.plan_discovery_answers.location is not None and
+                    session.plan_discovery_answers.coverage_preference is not None
+                )
+                
+                return PlanDiscoveryResponseModel(
+                    response=answer,
+                    session_id=session_id,
+                    plan_discovery_answers=session.plan_discovery_answers,
+                    is_complete=is_complete
+                )
+            except AdmissionRejected:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Plan discovery error: {str(e)}")
+
+    result, replayed = await idempotency_cache.run(f"plan-discovery:{session_id}", idempotency_key, fingerprint(request.message), compute)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
 @app.post("/analyze-plans/{session_id}", response_model=PlanAnalysisResponse)
-async def analyze_plans_endpoint(session_id: str):
+async def analyze_plans_endpoint(session_id: str, response: Response, idempotency_key: Optional[str] = Header(None)):
     """Analyze and rank eligible plans based on collected business profile"""
-    try:
-        session = get_session(session_id)
-        
-        if not session.plan_discovery_answers:
-            raise HTTPException(status_code=400, detail="Plan discovery not completed")
-        
-        # Check if all required fields are present
-        if not all([
-            session.plan_discovery_answers.business_size,
-            session.plan_discovery_answers.location,
-            session.plan_discovery_answers.coverage_preference
-        ]):
-            raise HTTPException(status_code=400, detail="Incomplete plan discovery information")
-        
-        # Search for eligible plans
-        eligible_plans = search_eligible_plans(session.plan_discovery_answers)
-        
-        if not eligible_plans:
-            return PlanAnalysisResponse(
-                analysis="No eligible plans found for your business profile. Please contact us directly for assistance.",
-                eligible_plans_count=0,
-                session_id=session_id
-            )
-        
-        # Analyze and rank the plans
-        analysis_result = reason_about_plans(eligible_plans, session.plan_discovery_answers)
-        
-        return PlanAnalysisResponse(
-            analysis=analysis_result,
-            eligible_plans_count=len(eligible_plans),
-            session_id=session_id
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Plan analysis error: {str(e)}")
+    async def compute():
+        async with session_turn(session_id) as session:
+            try:
+                if not session.plan_discovery_answers:
+                    raise HTTPException(status_code=400, detail="Plan discovery not completed")
+            
+                # Check if all required fields are present
+                if not all([
+                    session.plan_discovery_answers.business_size,
+                    session.plan_discovery_answers.location,
+                    session.plan_discovery_answers.coverage_preference
+                ]):
+                    raise HTTPException(status_code=400, detail="Incomplete plan discovery information")
+            
+                # Search for eligible plans
+                plan_documents = await asyncio.to_thread(search_eligible_plan_documents, session.plan_discovery_answers)
+                eligible_plans = summaries_by_plan(plan_documents)
+            
+                if not eligible_plans:
+                    return PlanAnalysisResponse(
+                        analysis="No eligible plans found for your business profile. Please contact us directly for assistance.",
+                        eligible_plans_count=0,
+                        session_id=session_id
+                    )
+            
+                # Analyze and rank the plans
+                analysis_result = await asyncio.to_thread(
+                    reason_about_plans, eligible_plans, session.plan_discovery_answers, plan_documents
+                )
+            
+                return PlanAnalysisResponse(
+                    analysis=analysis_result,
+                    eligible_plans_count=len(eligible_plans),
+                    session_id=session_id
+                )
+            
+            except AdmissionRejected:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Plan analysis error: {str(e)}")
+
+    result, replayed = await idempotency_cache.run(f"analyze-plans:{session_id}", idempotency_key, fingerprint(), compute)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
 @app.get("/session/{session_id}")
 async def get_session_info(session_id: str):
@@ -171,6 +235,7 @@ async def get_session_info(session_id: str):
         "user_id": session.user_id,
         "chat_history_length": len(session.chat_history),
         "extracted_entities_count": len(session.extracted_entities),
+        "last_prompt_budget": session.last_prompt_budget,
         "plan_discovery_answers": session.plan_discovery_answers,
         "plan_discovery_complete": (
             session.plan_discovery_answers is not None and
@@ -188,7 +253,7 @@ async def delete_session(session_id: str):
     if session_id not in sessions:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    del sessions[session_id]
+    delete_session_state(session_id)
     return {"message": "Session deleted successfully"}
 
 @app.get("/sessions")
@@ -199,6 +264,21 @@ async def list_sessions():
         "session_ids": list(sessions.keys())
     }
 
+@app.get("/metrics/retrieval")
+async def retrieval_metrics():
+    """Report how often speculative retrieval results were used, how turns were routed, how many LLM calls were coalesced and how much of each prompt hit the provider cache"""
+    return {
+        "speculative": get_speculative_stats(),
+        "router": router_stats.snapshot(),
+        "discovery": discovery_stats.snapshot(),
+        "single_flight": single_flight.get_stats(),
+        "prompt_cache": get_prompt_cache_stats(),
+        "admission": admission.get_stats(),
+        "llm_gateway": get_gateway_stats(),
+        "transport": get_transport_stats(),
+        "idempotency": idempotency_cache.get_stats()
+    }
+
 # ==================== DATA PROCESSING ENDPOINTS ====================
 
 @app.post("/data/scrape")
@@ -216,7 +296,7 @@ async def scrape_plans(request: ScrapeRequest, background_tasks: BackgroundTasks
     
     return {"job_id": job_id, "status": "started", "message": f"Scraping {len(urls)} URLs"}
 
-async def _scrape_task(job_id: str, urls: List[str]):
+def _scrape_task(job_id: str, urls: List[str]):
     """Background task for scraping and cleaning"""
     try:
         update_job_status(job_id, JobStatus.RUNNING, progress="Scraping and cleaning URLs...")
@@ -243,12 +323,15 @@ async def process_plans(request: ProcessRequest, background_tasks: BackgroundTas
     """
     job_id = create_job(request.job_name)
     
-    background_tasks.add_task(_process_task, job_id)
+    background_tasks.add_task(_process_task, job_id, request.extraction_mode, request.batch_mode)
     
     return {"job_id": job_id, "status": "started", "message": "Processing insurance plans"}
 
-async def _process_task(job_id: str):
-    """Background task for processing with intelligent MongoDB model checking"""
+def _process_task(job_id: str, extraction_mode: str = "separate", batch_mode: bool = False):
+    """
+    Background task for processing with intelligent MongoDB model checking.
+    A plain function so Starlette runs it in its threadpool: batch mode blocks while polling the batch.
+    """
     try:
         update_job_status(job_id, JobStatus.RUNNING, progress="Loading scraped and cleaned data...")
         
@@ -265,21 +348,23 @@ async def _process_task(job_id: str):
             models_existed = True
         
         update_job_status(job_id, JobStatus.RUNNING, progress="Loading model definitions from MongoDB...")
-        data = load_models_from_mongodb()
-        
-        DynamicInsurancePlanModel, DynamicMetaDataTags = generate_pydantic_models(
-            required_fields=data["required_fields"],
-            key_differences=data["key_differences"]
-        )
+        models = model_registry.get()
         
-        update_job_status(job_id, JobStatus.RUNNING, progress="Processing and uploading to MongoDB...")
-        uploaded_count = process_pages_to_mongodb(cleaned_data)
+        if batch_mode:
+            update_job_status(job_id, JobStatus.RUNNING, progress="Submitting extraction batch and waiting for results...")
+            uploaded_count = process_pages_in_batch(cleaned_data, models, extraction_mode)
+        else:
+            update_job_status(job_id, JobStatus.RUNNING, progress="Processing and uploading to MongoDB...")
+            uploaded_count = process_pages_to_mongodb(cleaned_data, models, extraction_mode)
         
         result = {
             "processed_count": len(cleaned_data),
             "uploaded_count": uploaded_count,
             "collection": "cigna_insurance.insurance_plans",
-            "models_existed": models_existed
+            "models_existed": models_existed,
+            "models_version": models.version,
+            "extraction_mode": extraction_mode,
+            "batch_mode": batch_mode
         }
         
         update_job_status(job_id, JobStatus.COMPLETED, result=result)
@@ -298,11 +383,11 @@ async def scrape_and_process(request: ScrapeAndProcessRequest, background_tasks:
     # Use provided URLs or default plan_links
     urls = [str(url) for url in request.urls] if request.urls else plan_links
     
-    background_tasks.add_task(_scrape_and_process_task, job_id, urls)
+    background_tasks.add_task(_scrape_and_process_task, job_id, urls, request.extraction_mode, request.batch_mode)
     
     return {"job_id": job_id, "status": "started", "message": f"Full processing of {len(urls)} URLs"}
 
-async def _scrape_and_process_task(job_id: str, urls: List[str]):
+def _scrape_and_process_task(job_id: str, urls: List[str], extraction_mode: str = "separate", batch_mode: bool = False):
     """Combined scrape and process task"""
     try:
         # Step 1: Scrape and Clean (now combined)
@@ -316,22 +401,23 @@ async def _scrape_and_process_task(job_id: str, urls: List[str]):
         
         # Step 3: Load models from MongoDB
         update_job_status(job_id, JobStatus.RUNNING, progress="Step 3: Loading model inputs from MongoDB...")
-        data = load_models_from_mongodb()
-        
-        DynamicInsurancePlanModel, DynamicMetaDataTags = generate_pydantic_models(
-            required_fields=data["required_fields"],
-            key_differences=data["key_differences"]
-        )
+        models = model_registry.get()
         
         # Step 4: Process and upload
-        update_job_status(job_id, JobStatus.RUNNING, progress="Step 4: Processing and uploading to MongoDB...")
-        uploaded_count = process_pages_to_mongodb(cleaned_data)
+        if batch_mode:
+            update_job_status(job_id, JobStatus.RUNNING, progress="Step 4: Submitting extraction batch and waiting for results...")
+            uploaded_count = process_pages_in_batch(cleaned_data, models, extraction_mode)
+        else:
+            update_job_status(job_id, JobStatus.RUNNING, progress="Step 4: Processing and uploading to MongoDB...")
+            uploaded_count = process_pages_to_mongodb(cleaned_data, models, extraction_mode)
         
         result = {
             "scraped_and_cleaned_count": len(cleaned_data),
             "uploaded_count": uploaded_count,
             "urls": urls,
-            "collection": "cigna_insurance.insurance_plans"
+            "collection": "cigna_insurance.insurance_plans",
+            "extraction_mode": extraction_mode,
+            "batch_mode": batch_mode
         }
         
         update_job_status(job_id, JobStatus.COMPLETED, result=result)